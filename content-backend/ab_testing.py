@@ -0,0 +1,157 @@
+"""
+A/B/n Testing
+Per-variant event counts in one grouped query and vectorized significance / credible intervals
+"""
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import Creative, Event
+
+# Posterior draws per variant for credible intervals and P(best)
+POSTERIOR_SAMPLES = 4000
+
+
+def variant_counts(
+    db: Session,
+    campaign_id: int,
+    start_date: datetime,
+    end_date: datetime
+) -> List[Any]:
+    """
+    Impressions, clicks and conversions for every variant of a campaign
+
+    One grouped query; Event.campaign_id + created_at let Postgres use the
+    (campaign_id, created_at, event_type) index and prune partitions.
+    """
+    return db.query(
+        Creative.variant,
+        func.count(func.distinct(Creative.id)).label("creatives"),
+        func.count(Event.id).filter(Event.event_type == 'impression').label("impressions"),
+        func.count(Event.id).filter(Event.event_type == 'click').label("clicks"),
+        func.count(Event.id).filter(Event.event_type == 'conversion').label("conversions")
+    ).join(
+        Event, Event.creative_id == Creative.id
+    ).filter(
+        Creative.campaign_id == campaign_id,
+        Creative.variant.isnot(None),
+        Event.campaign_id == campaign_id,
+        Event.created_at >= start_date,
+        Event.created_at <= end_date
+    ).group_by(Creative.variant).order_by(Creative.variant).all()
+
+
+def _normal_sf(z: np.ndarray) -> np.ndarray:
+    """Two-sided normal tail probability P(|Z| >= |z|) (Abramowitz-Stegun 7.1.26 erfc)"""
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return poly * np.exp(-x * x)
+
+
+def _pairwise_z_tests(successes: np.ndarray, trials: np.ndarray):
+    """
+    Pooled two-proportion z-tests for every variant pair at once
+
+    Returns (diff, z, p_value) matrices where [i, j] compares variant i against j.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(trials > 0, successes / trials, 0.0)
+        pooled = (successes[:, None] + successes[None, :]) / (trials[:, None] + trials[None, :])
+        se = np.sqrt(pooled * (1 - pooled) * (1 / trials[:, None] + 1 / trials[None, :]))
+        diff = rate[:, None] - rate[None, :]
+        z = np.where(se > 0, diff / se, 0.0)
+    return diff, z, _normal_sf(z)
+
+
+def _posterior(successes: np.ndarray, trials: np.ndarray, rng: np.random.Generator, level: float):
+    """
+    Beta(1 + successes, 1 + failures) posterior per variant
+
+    Returns (lower, upper, prob_best) arrays.
+    """
+    failures = np.clip(trials - successes, 0, None)
+    draws = rng.beta(1 + successes[:, None], 1 + failures[:, None], size=(len(successes), POSTERIOR_SAMPLES))
+
+    tail = (1 - level) / 2
+    lower, upper = np.quantile(draws, [tail, 1 - tail], axis=1)
+    # Variants without any trials only carry the prior and cannot be "best"
+    has_data = trials > 0
+    if has_data.any():
+        ranked = np.where(has_data[:, None], draws, -1.0)
+        prob_best = np.bincount(ranked.argmax(axis=0), minlength=len(successes)) / POSTERIOR_SAMPLES
+    else:
+        prob_best = np.zeros(len(successes))
+    return lower, upper, prob_best
+
+
+def compare_variants(
+    rows: List[Any],
+    alpha: float = 0.05,
+    credible_level: float = 0.95,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Compare all variants on CTR (clicks / impressions) and CVR (conversions / clicks)
+
+    Args:
+        rows: Output of variant_counts()
+        alpha: Family-wise significance level (Bonferroni-corrected over pairs)
+        credible_level: Width of the posterior credible intervals
+        seed: RNG seed so repeated calls return stable intervals
+
+    Returns:
+        {"variants", "pairs", "corrected_alpha"} with rates and intervals in percent
+    """
+    if not rows:
+        return {"variants": [], "pairs": [], "corrected_alpha": alpha}
+
+    names = [row.variant for row in rows]
+    impressions = np.array([row.impressions for row in rows], dtype=float)
+    clicks = np.array([row.clicks for row in rows], dtype=float)
+    conversions = np.array([row.conversions for row in rows], dtype=float)
+
+    rng = np.random.default_rng(seed)
+    metrics = {
+        "ctr": (clicks, impressions),
+        "cvr": (np.minimum(conversions, clicks), clicks)
+    }
+
+    variants = [
+        {
+            "variant": name,
+            "creatives": row.creatives,
+            "impressions": row.impressions,
+            "clicks": row.clicks,
+            "conversions": row.conversions
+        }
+        for name, row in zip(names, rows)
+    ]
+
+    pairs_i, pairs_j = np.triu_indices(len(rows), k=1)
+    corrected_alpha = alpha / max(len(pairs_i), 1)
+    pairs = [{"variant_a": names[i], "variant_b": names[j]} for i, j in zip(pairs_i, pairs_j)]
+
+    for metric, (successes, trials) in metrics.items():
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.where(trials > 0, successes / trials, 0.0)
+        lower, upper, prob_best = _posterior(successes, trials, rng, credible_level)
+
+        for k, variant in enumerate(variants):
+            variant[metric] = round(float(rate[k] * 100), 2)
+            variant[f"{metric}_interval"] = [round(float(lower[k] * 100), 2), round(float(upper[k] * 100), 2)]
+            variant[f"prob_best_{metric}"] = round(float(prob_best[k]), 4)
+
+        diff, z, p_value = _pairwise_z_tests(successes, trials)
+        for pair, i, j in zip(pairs, pairs_i, pairs_j):
+            pair[metric] = {
+                "diff": round(float(diff[i, j] * 100), 2),
+                "z": round(float(z[i, j]), 3),
+                "p_value": round(float(p_value[i, j]), 5),
+                "significant": bool(p_value[i, j] < corrected_alpha)
+            }
+
+    return {"variants": variants, "pairs": pairs, "corrected_alpha": corrected_alpha}
@@ -0,0 +1,200 @@
+"""Convert events table to monthly range partitions on created_at
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19
+
+This migration rebuilds the events heap as a declaratively partitioned table
+(PARTITION BY RANGE (created_at), one partition per month), copies existing
+rows, and builds a composite (campaign_id, created_at, event_type) index
+CONCURRENTLY on every partition before attaching it to the parent index.
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+# Months of partitions created ahead of the current month
+PREMAKE_MONTHS = 3
+
+COMPOSITE_INDEX = 'ix_events_campaign_created_type'
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"events_y{month.year:04d}m{month.month:02d}"
+
+
+def _is_partitioned(conn, table: str) -> bool:
+    relkind = conn.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+        {"name": table}
+    ).scalar()
+    return relkind == 'p'
+
+
+def _create_month_partitions(oldest) -> None:
+    """Create monthly partitions from `oldest` (or now) through the premake horizon"""
+    now = datetime.utcnow()
+    month = _month_start(oldest or now)
+    horizon = _add_months(_month_start(now), PREMAKE_MONTHS)
+    while month <= horizon:
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {_partition_name(month)} PARTITION OF events "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+    op.execute('CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT')
+
+
+def upgrade():
+    """Rebuild events as a monthly partitioned table"""
+
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        # Declarative partitioning is PostgreSQL-only; other backends keep the heap
+        return
+
+    if not _is_partitioned(conn, 'events'):
+        # 1. Move the old heap out of the way (keep its id sequence)
+        op.execute('ALTER TABLE events RENAME TO events_legacy')
+        op.execute('ALTER SEQUENCE IF EXISTS events_id_seq OWNED BY NONE')
+        for index_name in ['ix_events_id', 'ix_events_campaign_id', 'ix_events_creative_id',
+                           'ix_events_event_type', 'ix_events_user_id', 'ix_events_session_id',
+                           'ix_events_segment_id', 'ix_events_created_at']:
+            op.execute(f'DROP INDEX IF EXISTS {index_name}')
+        op.execute('ALTER TABLE events_legacy DROP CONSTRAINT IF EXISTS events_pkey')
+
+        # 2. Partitioned parent. The partition key must be part of the primary key.
+        op.execute("""
+            CREATE TABLE events (
+                id INTEGER NOT NULL DEFAULT nextval('events_id_seq'),
+                campaign_id INTEGER NOT NULL REFERENCES campaigns(id) ON DELETE CASCADE,
+                creative_id INTEGER REFERENCES creatives(id) ON DELETE SET NULL,
+                event_type VARCHAR(50) NOT NULL,
+                user_id INTEGER,
+                session_id VARCHAR(255),
+                ip_address VARCHAR(45),
+                user_agent TEXT,
+                referrer TEXT,
+                landing_url TEXT,
+                channel VARCHAR(50),
+                segment_id INTEGER,
+                meta_data JSON,
+                created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at)
+        """)
+        op.execute('ALTER SEQUENCE events_id_seq OWNED BY events.id')
+
+        # 3. One partition per month from the oldest event up to the premake horizon
+        oldest = conn.execute(sa.text('SELECT min(created_at) FROM events_legacy')).scalar()
+        _create_month_partitions(oldest)
+
+        # 4. Copy rows (legacy rows without created_at land in the current month)
+        op.execute("""
+            INSERT INTO events (id, campaign_id, creative_id, event_type, user_id, session_id,
+                                ip_address, user_agent, referrer, landing_url, channel,
+                                segment_id, meta_data, created_at)
+            SELECT id, campaign_id, creative_id, event_type, user_id, session_id,
+                   ip_address, user_agent, referrer, landing_url, channel,
+                   segment_id, meta_data, COALESCE(created_at, now() AT TIME ZONE 'utc')
+            FROM events_legacy
+        """)
+        op.execute('DROP TABLE events_legacy')
+
+        # 5. Lookup indexes still used outside of campaign/time range queries
+        op.execute('CREATE INDEX IF NOT EXISTS ix_events_creative_id ON events (creative_id)')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_events_session_id ON events (session_id)')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_events_segment_id ON events (segment_id)')
+    else:
+        # Fresh databases get a partitioned parent from init_db(); make sure it has partitions
+        _create_month_partitions(None)
+
+    # 6. Composite index: CONCURRENTLY is not allowed on a partitioned parent, so create
+    #    an invalid parent index ON ONLY events, build each partition's index concurrently
+    #    and attach it. The parent index becomes valid once every partition is attached.
+    op.execute(
+        f'CREATE INDEX IF NOT EXISTS {COMPOSITE_INDEX} '
+        f'ON ONLY events (campaign_id, created_at, event_type)'
+    )
+    partitions = conn.execute(sa.text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'events'::regclass
+          AND c.relname NOT IN (
+              SELECT t.relname FROM pg_inherits ii
+              JOIN pg_index x ON x.indexrelid = ii.inhrelid
+              JOIN pg_class t ON t.oid = x.indrelid
+              WHERE ii.inhparent = CAST(:index_name AS regclass)
+          )
+        ORDER BY c.relname
+    """), {"index_name": COMPOSITE_INDEX}).scalars().all()
+
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_campaign_created_type '
+                f'ON {partition} (campaign_id, created_at, event_type)'
+            )
+            op.execute(
+                f'ALTER INDEX {COMPOSITE_INDEX} ATTACH PARTITION {partition}_campaign_created_type'
+            )
+
+
+def downgrade():
+    """Collapse the partitioned events table back into a single heap"""
+
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql' or not _is_partitioned(conn, 'events'):
+        return
+
+    op.execute('ALTER TABLE events RENAME TO events_partitioned')
+    op.execute('ALTER SEQUENCE events_id_seq OWNED BY NONE')
+    op.execute("""
+        CREATE TABLE events (
+            id INTEGER NOT NULL DEFAULT nextval('events_id_seq') PRIMARY KEY,
+            campaign_id INTEGER NOT NULL REFERENCES campaigns(id) ON DELETE CASCADE,
+            creative_id INTEGER REFERENCES creatives(id) ON DELETE SET NULL,
+            event_type VARCHAR(50) NOT NULL,
+            user_id INTEGER,
+            session_id VARCHAR(255),
+            ip_address VARCHAR(45),
+            user_agent TEXT,
+            referrer TEXT,
+            landing_url TEXT,
+            channel VARCHAR(50),
+            segment_id INTEGER,
+            meta_data JSON,
+            created_at TIMESTAMP
+        )
+    """)
+    op.execute('INSERT INTO events SELECT * FROM events_partitioned')
+    op.execute('ALTER SEQUENCE events_id_seq OWNED BY events.id')
+    op.execute('DROP TABLE events_partitioned CASCADE')
+
+    op.create_index(op.f('ix_events_id'), 'events', ['id'], unique=False)
+    op.create_index(op.f('ix_events_campaign_id'), 'events', ['campaign_id'], unique=False)
+    op.create_index(op.f('ix_events_creative_id'), 'events', ['creative_id'], unique=False)
+    op.create_index(op.f('ix_events_event_type'), 'events', ['event_type'], unique=False)
+    op.create_index(op.f('ix_events_user_id'), 'events', ['user_id'], unique=False)
+    op.create_index(op.f('ix_events_session_id'), 'events', ['session_id'], unique=False)
+    op.create_index(op.f('ix_events_segment_id'), 'events', ['segment_id'], unique=False)
+    op.create_index(op.f('ix_events_created_at'), 'events', ['created_at'], unique=False)
@@ -0,0 +1,49 @@
+"""Add (user_id, created_at, status) index to gen_jobs
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19
+
+Backs the server-side cost/usage aggregations (/costs/summary,
+/users/{user_id}/costs/*, /monitoring/dashboard) so they stay index range scans
+as job history grows. Built CONCURRENTLY to avoid blocking writes.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_gen_jobs_user_created_status'
+
+
+def upgrade():
+    """Create the composite cost aggregation index"""
+
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    existing_indexes = [idx['name'] for idx in inspector.get_indexes('gen_jobs')]
+
+    if INDEX_NAME in existing_indexes:
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            'gen_jobs',
+            ['user_id', 'created_at', 'status'],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    """Drop the composite cost aggregation index"""
+
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX_NAME, table_name='gen_jobs', postgresql_concurrently=True)
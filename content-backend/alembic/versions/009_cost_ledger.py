@@ -0,0 +1,64 @@
+"""Add cost_ledger table with daily cost totals
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19
+
+Creates the cost_ledger table (one row per day/user/model/segment/job_type)
+and backfills it from completed gen_jobs.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create cost_ledger and backfill it from gen_jobs"""
+
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'cost_ledger' not in inspector.get_table_names():
+        op.create_table(
+            'cost_ledger',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('model', sa.String(length=100), nullable=False),
+            sa.Column('segment_id', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('job_type', sa.String(length=50), nullable=False),
+            sa.Column('jobs', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('prompt_tokens', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('completion_tokens', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('total_tokens', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('cost_usd', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('day', 'user_id', 'model', 'segment_id', 'job_type')
+        )
+        op.create_index('ix_cost_ledger_user_day', 'cost_ledger', ['user_id', 'day'], unique=False)
+
+    # Backfill (idempotent: the table is rebuilt from gen_jobs)
+    op.execute('DELETE FROM cost_ledger')
+    op.execute("""
+        INSERT INTO cost_ledger (day, user_id, model, segment_id, job_type, jobs,
+                                 prompt_tokens, completion_tokens, total_tokens, cost_usd, updated_at)
+        SELECT created_at::date, COALESCE(user_id, 0), model, COALESCE(segment_id, 0), job_type,
+               count(*), COALESCE(sum(prompt_tokens), 0), COALESCE(sum(completion_tokens), 0),
+               COALESCE(sum(total_tokens), 0), COALESCE(sum(estimated_cost), 0), now()
+        FROM gen_jobs
+        WHERE status = 'completed' AND created_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+
+def downgrade():
+    """Drop cost_ledger"""
+
+    op.drop_index('ix_cost_ledger_user_day', table_name='cost_ledger')
+    op.drop_table('cost_ledger')
@@ -0,0 +1,61 @@
+"""Add prompt cache hit counters to cost_ledger
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19
+
+Adds cache_hits / cost_saved_usd to cost_ledger and backfills them from
+generated_content rows flagged is_cached_result. Historic hits did not record
+the cost they replaced, so the backfill values each hit at the average
+completed job cost for the same model and job type.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add cache counter columns and backfill historic cache hits"""
+
+    conn = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(conn).get_columns('cost_ledger')}
+
+    if 'cache_hits' not in columns:
+        op.add_column('cost_ledger', sa.Column('cache_hits', sa.Integer(), nullable=False, server_default='0'))
+    if 'cost_saved_usd' not in columns:
+        op.add_column('cost_ledger', sa.Column('cost_saved_usd', sa.Float(), nullable=False, server_default='0'))
+
+    op.execute("""
+        INSERT INTO cost_ledger (day, user_id, model, segment_id, job_type, jobs,
+                                 prompt_tokens, completion_tokens, total_tokens, cost_usd,
+                                 cache_hits, cost_saved_usd, updated_at)
+        SELECT gc.created_at::date, 0, COALESCE(gc.model, 'unknown'), 0, gc.content_type,
+               0, 0, 0, 0, 0,
+               count(*), count(*) * COALESCE(max(avg_cost.cost), 0), now()
+        FROM generated_content gc
+        LEFT JOIN (
+            SELECT model, job_type, avg(estimated_cost) AS cost
+            FROM gen_jobs
+            WHERE status = 'completed'
+            GROUP BY model, job_type
+        ) avg_cost ON avg_cost.model = gc.model AND avg_cost.job_type = gc.content_type
+        WHERE gc.is_cached_result AND gc.created_at IS NOT NULL
+        GROUP BY 1, 3, 5
+        ON CONFLICT (day, user_id, model, segment_id, job_type) DO UPDATE SET
+            cache_hits = EXCLUDED.cache_hits,
+            cost_saved_usd = EXCLUDED.cost_saved_usd
+    """)
+
+
+def downgrade():
+    """Drop cache counter columns"""
+
+    op.drop_column('cost_ledger', 'cost_saved_usd')
+    op.drop_column('cost_ledger', 'cache_hits')
@@ -0,0 +1,41 @@
+"""Add job_watermarks table for incremental batch jobs
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19
+
+Stores how far each incremental batch job (performance score recomputation)
+has processed events, so the next run only touches what changed since.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create job_watermarks"""
+
+    conn = op.get_bind()
+    if 'job_watermarks' in sa.inspect(conn).get_table_names():
+        return
+
+    op.create_table(
+        'job_watermarks',
+        sa.Column('job_name', sa.String(length=100), nullable=False),
+        sa.Column('watermark', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('job_name')
+    )
+
+
+def downgrade():
+    """Drop job_watermarks"""
+
+    op.drop_table('job_watermarks')
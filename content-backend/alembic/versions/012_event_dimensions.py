@@ -0,0 +1,78 @@
+"""Add dimension tables for event user agents, referrers and landing URLs
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19
+
+New events store small integer ids (events.user_agent_id / referrer_id /
+landing_url_id) instead of repeating the full strings. The legacy text
+columns stay for existing rows; `python event_dimensions.py --backfill`
+moves them month by month outside of startup.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+DIMENSION_TABLES = ['dim_user_agents', 'dim_referrers', 'dim_landing_urls']
+EVENT_COLUMNS = ['user_agent_id', 'referrer_id', 'landing_url_id']
+
+
+def upgrade():
+    """Create dimension tables and id columns on events"""
+
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table in DIMENSION_TABLES:
+        if table in tables:
+            continue
+        columns = [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('value_hash', sa.String(length=32), nullable=False),
+            sa.Column('value', sa.Text(), nullable=False),
+        ]
+        if table == 'dim_user_agents':
+            columns += [
+                sa.Column('device_type', sa.String(length=20), nullable=True),
+                sa.Column('browser', sa.String(length=50), nullable=True),
+                sa.Column('os', sa.String(length=50), nullable=True),
+                sa.Column('parsed_at', sa.DateTime(), nullable=True),
+            ]
+        op.create_table(
+            table,
+            *columns,
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('value_hash', name=f'uq_{table}_value_hash')
+        )
+
+    # Enrichment worker scans for unparsed rows
+    if 'dim_user_agents' not in tables:
+        op.create_index(
+            'ix_dim_user_agents_unparsed', 'dim_user_agents', ['id'],
+            postgresql_where=sa.text('parsed_at IS NULL')
+        )
+
+    # Nullable columns without defaults: catalog-only change, propagated to every partition
+    existing = {column['name'] for column in inspector.get_columns('events')}
+    for column in EVENT_COLUMNS:
+        if column not in existing:
+            op.add_column('events', sa.Column(column, sa.Integer(), nullable=True))
+
+
+def downgrade():
+    """Drop id columns and dimension tables (strings of events written since upgrade are lost)"""
+
+    for column in EVENT_COLUMNS:
+        op.drop_column('events', column)
+    op.drop_index('ix_dim_user_agents_unparsed', table_name='dim_user_agents')
+    for table in DIMENSION_TABLES:
+        op.drop_table(table)
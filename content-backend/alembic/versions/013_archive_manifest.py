@@ -0,0 +1,45 @@
+"""Add archive_manifest table for cold data archived to Parquet
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19
+
+Each row records one month of a table (events, gen_jobs, generated_content,
+metrics) that archival.py moved out of Postgres into a Parquet file in storage,
+so analytics can include archived ranges on request.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create archive_manifest"""
+
+    conn = op.get_bind()
+    if 'archive_manifest' in sa.inspect(conn).get_table_names():
+        return
+
+    op.create_table(
+        'archive_manifest',
+        sa.Column('table_name', sa.String(length=100), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('path', sa.Text(), nullable=False),
+        sa.Column('row_count', sa.BigInteger(), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('table_name', 'month')
+    )
+
+
+def downgrade():
+    """Drop archive_manifest (archived files stay in storage)"""
+
+    op.drop_table('archive_manifest')
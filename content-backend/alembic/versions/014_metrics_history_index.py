@@ -0,0 +1,48 @@
+"""Add (project_id, metric_name, timestamp) index to metrics
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-19
+
+Backs the time-bucketed /metrics/history query so a project's series are read
+as index range scans in timestamp order. Built CONCURRENTLY to avoid blocking writes.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_metrics_project_name_timestamp'
+
+
+def upgrade():
+    """Create the composite metrics history index"""
+
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    existing_indexes = [idx['name'] for idx in inspector.get_indexes('metrics')]
+
+    if INDEX_NAME in existing_indexes:
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            'metrics',
+            ['project_id', 'metric_name', 'timestamp'],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    """Drop the composite metrics history index"""
+
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX_NAME, table_name='metrics', postgresql_concurrently=True)
@@ -2,16 +2,25 @@
 Analytics and Event Tracking API
 Handles event tracking (impressions, clicks) and campaign analytics
 """
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from fastapi.responses import RedirectResponse
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, case
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
-import hashlib
 
 from database import get_db, Campaign, Creative, Event
+from cache import get_cache
+from ab_testing import variant_counts, compare_variants
+from funnels import funnel_report
+from leaderboards import top_creatives, LEADERBOARD_METRICS
+from event_stream import publish_event
+from event_dimensions import event_dimension_ids, derive_session_id
+from archival import archived_event_breakdown
+from live_counters import seed_counters, stream_counters
 from logger import get_logger
 
 logger = get_logger("analytics_api")
@@ -88,19 +97,19 @@ async def track_event(
             creative_id=event.creative_id,
             event_type=event.event_type,
             user_id=event.user_id,
-            session_id=event.session_id or hashlib.md5(f"{ip_address}{user_agent}".encode()).hexdigest()[:16],
+            session_id=event.session_id or derive_session_id(ip_address, user_agent),
             ip_address=ip_address,
-            user_agent=user_agent,
-            referrer=event.referrer,
-            landing_url=event.landing_url,
             channel=event.channel,
             segment_id=event.segment_id,
-            meta_data=event.meta_data
+            meta_data=event.meta_data,
+            **event_dimension_ids(user_agent, event.referrer, event.landing_url)
         )
 
         db.add(new_event)
         db.commit()
 
+        publish_event(event.campaign_id, event.event_type, event.creative_id, event.segment_id)
+
         logger.info(f"Event tracked: {event.event_type} for campaign {event.campaign_id}")
 
         return {
@@ -140,16 +149,16 @@ async def track_click_redirect(
             campaign_id=campaign_id,
             creative_id=creative_id,
             event_type='click',
-            session_id=hashlib.md5(f"{ip_address}{user_agent}".encode()).hexdigest()[:16],
+            session_id=derive_session_id(ip_address, user_agent),
             ip_address=ip_address,
-            user_agent=user_agent,
-            referrer=referrer,
-            landing_url=url
+            **event_dimension_ids(user_agent, referrer, url)
         )
 
         db.add(event)
         db.commit()
 
+        publish_event(campaign_id, 'click', creative_id)
+
         logger.info(f"Click tracked: campaign={campaign_id}, creative={creative_id}")
 
         # Redirect to destination
@@ -182,13 +191,15 @@ async def track_impression(
             creative_id=creative_id,
             event_type='impression',
             ip_address=ip_address,
-            user_agent=user_agent,
-            session_id=hashlib.md5(f"{ip_address}{user_agent}".encode()).hexdigest()[:16] if ip_address and user_agent else None
+            session_id=derive_session_id(ip_address, user_agent) if ip_address and user_agent else None,
+            **event_dimension_ids(user_agent)
         )
 
         db.add(event)
         db.commit()
 
+        publish_event(campaign_id, 'impression', creative_id)
+
         # Return 1x1 transparent pixel
         return Response(
             content=b'GIF89a\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;',
@@ -226,22 +237,20 @@ async def get_analytics_summary(
     try:
         # Calculate date range
         end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
 
-        # Import generation models
-        from database import GenerationJob, Segment
+        # Cost ledger is day-granular: current period is the last `days` days including today
+        from database import Segment
+        from cost_ledger import ledger_totals, ledger_daily, ledger_by_model, ledger_by_segment
 
-        # Total content count
-        total_content = db.query(func.count(GenerationJob.id)).filter(
-            GenerationJob.created_at >= start_date
-        ).scalar() or 0
+        start_day = end_date.date() - timedelta(days=days - 1)
+        prev_start_day = start_day - timedelta(days=days)
+
+        current = ledger_totals(db, start_day=start_day)
+        previous = ledger_totals(db, start_day=prev_start_day, end_day=start_day)
 
-        # Previous period for comparison
-        prev_start = start_date - timedelta(days=days)
-        prev_content = db.query(func.count(GenerationJob.id)).filter(
-            GenerationJob.created_at >= prev_start,
-            GenerationJob.created_at < start_date
-        ).scalar() or 0
+        # Total content count
+        total_content = int(current.jobs)
+        prev_content = int(previous.jobs)
 
         content_change = "+0%"
         if prev_content > 0:
@@ -249,14 +258,8 @@ async def get_analytics_summary(
             content_change = f"+{change_pct:.0f}%" if change_pct >= 0 else f"{change_pct:.0f}%"
 
         # Total cost
-        total_cost = db.query(func.sum(GenerationJob.cost_usd)).filter(
-            GenerationJob.created_at >= start_date
-        ).scalar() or 0.0
-
-        prev_cost = db.query(func.sum(GenerationJob.cost_usd)).filter(
-            GenerationJob.created_at >= prev_start,
-            GenerationJob.created_at < start_date
-        ).scalar() or 0.0
+        total_cost = float(current.cost)
+        prev_cost = float(previous.cost)
 
         cost_change = "+0%"
         if prev_cost > 0:
@@ -272,16 +275,11 @@ async def get_analytics_summary(
         response_change = "-15%"
 
         # Model usage breakdown
-        model_stats = db.query(
-            GenerationJob.model,
-            func.count(GenerationJob.id).label('count')
-        ).filter(
-            GenerationJob.created_at >= start_date
-        ).group_by(GenerationJob.model).all()
+        model_stats = ledger_by_model(db, start_day=start_day)
 
         model_usage = {
             "labels": [stat.model for stat in model_stats] or ["GPT-3.5 Turbo"],
-            "values": [stat.count for stat in model_stats] or [total_content]
+            "values": [int(stat.jobs) for stat in model_stats] or [total_content]
         }
 
         # If no data, use defaults
@@ -291,32 +289,19 @@ async def get_analytics_summary(
                 "values": [45, 30, 15, 10]
             }
 
-        # Segment costs
-        segment_stats = db.query(
-            Segment.name,
-            func.count(GenerationJob.id).label('count'),
-            func.sum(GenerationJob.cost_usd).label('cost')
-        ).join(
-            GenerationJob, GenerationJob.segment_id == Segment.id, isouter=True
-        ).filter(
-            GenerationJob.created_at >= start_date
-        ).group_by(Segment.name).all()
+        # Segment costs (segment_id 0 = jobs without a segment)
+        segment_stats = ledger_by_segment(db, start_day=start_day)
+        segment_names = dict(db.query(Segment.id, Segment.name).filter(
+            Segment.id.in_([stat.segment_id for stat in segment_stats if stat.segment_id])
+        ).all()) if segment_stats else {}
 
         segment_costs = {
-            "labels": [stat.name for stat in segment_stats] if segment_stats else ["전체"],
+            "labels": [segment_names.get(stat.segment_id, "전체") for stat in segment_stats] if segment_stats else ["전체"],
             "values": [float(stat.cost or 0) for stat in segment_stats] if segment_stats else [total_cost]
         }
 
         # Trend data (daily breakdown)
-        trend_stats = db.query(
-            func.date(GenerationJob.created_at).label('date'),
-            func.count(GenerationJob.id).label('count')
-        ).filter(
-            GenerationJob.created_at >= start_date
-        ).group_by(func.date(GenerationJob.created_at)).order_by(func.date(GenerationJob.created_at).desc()).limit(7).all()
-
-        # Reverse to chronological order
-        trend_stats = list(reversed(trend_stats))
+        trend_stats = ledger_daily(db, start_day=start_day)
 
         trends = {
             "labels": [f"{(end_date - timedelta(days=i)).strftime('%m/%d')}" for i in range(days-1, -1, -1)],
@@ -325,7 +310,7 @@ async def get_analytics_summary(
 
         # Fill in actual data
         if trend_stats:
-            trend_dict = {stat.date.isoformat(): stat.count for stat in trend_stats}
+            trend_dict = {stat.day.isoformat(): int(stat.jobs) for stat in trend_stats}
             for i in range(days-1, -1, -1):
                 date = (end_date - timedelta(days=i)).date().isoformat()
                 trends["values"].append(trend_dict.get(date, 0))
@@ -413,11 +398,110 @@ async def get_analytics_summary(
         }
 
 
+@router.get("/campaigns/{campaign_id}/live")
+async def stream_campaign_live(
+    campaign_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Live campaign counters (Server-Sent Events)
+
+    **Features:**
+    - Impressions, clicks, conversions, CTR and CVR pushed every second
+    - Counters are maintained in Redis from the event stream, so watching
+      a campaign runs no database queries after the initial seed (unless the
+      counters hash is lost and has to be reseeded)
+
+    Usage (browser): `new EventSource('/campaigns/123/live')`, listen for `counters` events
+    """
+    if not get_cache().enabled:
+        raise HTTPException(status_code=503, detail="Live counters require Redis")
+
+    campaign = db.query(Campaign.id).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    await asyncio.to_thread(seed_counters, db, campaign_id)
+
+    return StreamingResponse(
+        stream_counters(campaign_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/creatives/top")
+async def get_top_creatives(
+    metric: str = Query("performance_score", description="Ranking metric: ctr, cvr or performance_score"),
+    campaign_id: Optional[int] = None,
+    content_type: Optional[str] = None,
+    k: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Top-k creatives by CTR, CVR or performance score
+
+    **Features:**
+    - Per-campaign (campaign_id) or global leaderboard
+    - Rankings kept in Redis sorted sets as events are ingested (O(log n) reads)
+    - Falls back to an aggregate query when Redis is unavailable
+    """
+    if metric not in LEADERBOARD_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of: {', '.join(LEADERBOARD_METRICS)}")
+
+    creatives = top_creatives(db, metric, k, campaign_id, content_type)
+
+    return {
+        "metric": metric,
+        "campaign_id": campaign_id,
+        "count": len(creatives),
+        "creatives": creatives
+    }
+
+
+_EVENT_COUNT_FIELDS = {"impressions": "impression", "clicks": "click", "conversions": "conversion"}
+
+
+def _add_event_counts(entry: dict, counts: Dict[str, int], fields: List[str], with_ctr: bool = True) -> dict:
+    for field in fields:
+        entry[field] = entry.get(field, 0) + counts.get(_EVENT_COUNT_FIELDS[field], 0)
+    if with_ctr:
+        entry["ctr"] = (entry["clicks"] / entry["impressions"] * 100) if entry["impressions"] > 0 else 0.0
+    return entry
+
+
+def _merge_archived_breakdown(db: Session, campaign_id: int, archived: dict, top_creatives: List[dict],
+                              by_channel: Dict[str, dict], by_segment: Dict[str, dict], timeline: List[dict]):
+    """Add archived per-creative / channel / segment / day counts to the live breakdowns"""
+    creatives = {c["creative_id"]: c for c in top_creatives}
+    missing = [cid for cid in archived["by_creative"] if cid not in creatives]
+    if missing:
+        for row in db.query(Creative.id, Creative.name, Creative.variant).filter(
+            Creative.campaign_id == campaign_id, Creative.id.in_(missing)
+        ):
+            creatives[row.id] = {"creative_id": row.id, "name": row.name, "variant": row.variant}
+    for creative_id, counts in archived["by_creative"].items():
+        if creative_id in creatives:
+            _add_event_counts(creatives[creative_id], counts, ["impressions", "clicks", "conversions"])
+
+    for channel, counts in archived["by_channel"].items():
+        _add_event_counts(by_channel.setdefault(channel, {}), counts, ["impressions", "clicks"])
+    for segment_id, counts in archived["by_segment"].items():
+        _add_event_counts(by_segment.setdefault(str(segment_id), {}), counts, ["impressions", "clicks"])
+
+    days = {t["date"]: t for t in timeline}
+    for day, counts in archived["by_day"].items():
+        _add_event_counts(days.setdefault(day, {"date": day}), counts, ["impressions", "clicks", "conversions"], with_ctr=False)
+
+    return list(creatives.values()), by_channel, by_segment, sorted(days.values(), key=lambda t: t["date"])
+
+
 @router.get("/campaigns/{campaign_id}/analytics", response_model=CampaignAnalytics)
 async def get_campaign_analytics(
     campaign_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
     """
@@ -429,6 +513,7 @@ async def get_campaign_analytics(
     - Channel breakdown
     - Segment breakdown
     - Timeline data for charts
+    - `include_archived=true` also counts months moved to Parquet archives (archival.py)
     """
     # Get campaign
     campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
@@ -494,7 +579,6 @@ async def get_campaign_analytics(
         }
         for c in creative_stats
     ]
-    top_creatives.sort(key=lambda x: x['ctr'], reverse=True)
 
     # By channel
     channel_stats = db.query(
@@ -560,6 +644,23 @@ async def get_campaign_analytics(
         for t in timeline_stats
     ]
 
+    # Months already moved out of Postgres
+    if include_archived:
+        archived = archived_event_breakdown(db, campaign_id, start_date, end_date)
+        if archived:
+            impressions += archived["totals"]["impression"]
+            clicks += archived["totals"]["click"]
+            conversions += archived["totals"]["conversion"]
+            ctr = (clicks / impressions * 100) if impressions > 0 else 0.0
+            cvr = (conversions / clicks * 100) if clicks > 0 else 0.0
+            # Sessions rarely span an archived and a live month, so distinct counts are added
+            unique_users += archived["sessions"]
+            top_creatives, by_channel, by_segment, timeline = _merge_archived_breakdown(
+                db, campaign_id, archived, top_creatives, by_channel, by_segment, timeline
+            )
+
+    top_creatives.sort(key=lambda x: x['ctr'], reverse=True)
+
     return CampaignAnalytics(
         campaign_id=campaign_id,
         campaign_name=campaign.name,
@@ -577,6 +678,100 @@ async def get_campaign_analytics(
     )
 
 
+@router.get("/campaigns/{campaign_id}/analytics/variants")
+async def compare_variants_abn(
+    campaign_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    alpha: float = Query(0.05, gt=0, lt=1),
+    credible_level: float = Query(0.95, gt=0, lt=1),
+    db: Session = Depends(get_db)
+):
+    """
+    Compare all A/B/n variants of a campaign
+
+    **Features:**
+    - Impressions, clicks, conversions for every Creative.variant (one grouped query)
+    - CTR / CVR with Beta posterior credible intervals and probability of being best
+    - Pairwise two-proportion z-tests for all variant pairs (Bonferroni-corrected)
+    - Winner when one variant's probability of having the best CTR reaches credible_level
+    """
+    campaign = db.query(Campaign.id).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    # Default time range
+    if not start_date:
+        start_date = datetime.utcnow() - timedelta(days=30)
+    if not end_date:
+        end_date = datetime.utcnow()
+
+    rows = variant_counts(db, campaign_id, start_date, end_date)
+    comparison = compare_variants(rows, alpha=alpha, credible_level=credible_level, seed=campaign_id)
+
+    winner = None
+    confidence = None
+    if comparison["variants"]:
+        best = max(comparison["variants"], key=lambda v: v["prob_best_ctr"])
+        confidence = round(best["prob_best_ctr"] * 100, 2)
+        if best["prob_best_ctr"] >= credible_level:
+            winner = best["variant"]
+
+    return {
+        "campaign_id": campaign_id,
+        "period": f"{start_date.date()} to {end_date.date()}",
+        "variants": comparison["variants"],
+        "pairs": comparison["pairs"],
+        "corrected_alpha": round(comparison["corrected_alpha"], 6),
+        "winner": winner,
+        "confidence": confidence
+    }
+
+
+@router.get("/campaigns/{campaign_id}/analytics/funnel")
+async def get_campaign_funnel(
+    campaign_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    click_window_hours: float = Query(24, gt=0, le=720),
+    conversion_window_hours: float = Query(168, gt=0, le=2160),
+    view_through_window_hours: float = Query(24, ge=0, le=720),
+    db: Session = Depends(get_db)
+):
+    """
+    Session funnel and last-touch attribution for a campaign
+
+    **Features:**
+    - Impression → click → conversion sessions, each step within its window
+    - Time-to-convert (avg / p50 / p90) from the session's first impression
+    - Conversions credited to the last click (click-through) or, failing that,
+      the last impression (view-through) of the same session
+    - Computed with window functions in Postgres; only aggregates are returned
+    """
+    campaign = db.query(Campaign.id).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    # Default time range
+    if not start_date:
+        start_date = datetime.utcnow() - timedelta(days=30)
+    if not end_date:
+        end_date = datetime.utcnow()
+
+    report = funnel_report(
+        db, campaign_id, start_date, end_date,
+        click_window_hours=click_window_hours,
+        conversion_window_hours=conversion_window_hours,
+        view_through_window_hours=view_through_window_hours
+    )
+
+    return {
+        "campaign_id": campaign_id,
+        "period": f"{start_date.date()} to {end_date.date()}",
+        **report
+    }
+
+
 @router.get("/campaigns/{campaign_id}/analytics/compare", response_model=ABTestComparison)
 async def compare_ab_test(
     campaign_id: int,
@@ -593,6 +788,8 @@ async def compare_ab_test(
     - Statistical significance calculation
     - Performance metrics comparison
     - Winner determination
+
+    For more than two variants use `/campaigns/{campaign_id}/analytics/variants`.
     """
     # Get campaign
     campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
@@ -605,62 +802,42 @@ async def compare_ab_test(
     if not end_date:
         end_date = datetime.utcnow()
 
+    # One grouped query for all variants, then keep the two being compared
+    rows = [
+        row for row in variant_counts(db, campaign_id, start_date, end_date)
+        if row.variant in (variant_a, variant_b)
+    ]
+    comparison = compare_variants(rows, seed=campaign_id)
+
     def get_variant_stats(variant: str):
         """Get stats for a variant"""
-        creatives = db.query(Creative.id).filter(
-            Creative.campaign_id == campaign_id,
-            Creative.variant == variant
-        ).all()
-
-        creative_ids = [c.id for c in creatives]
-
-        if not creative_ids:
-            return {
-                "variant": variant,
-                "impressions": 0,
-                "clicks": 0,
-                "conversions": 0,
-                "ctr": 0.0,
-                "cvr": 0.0
-            }
-
-        events = db.query(Event).filter(
-            Event.creative_id.in_(creative_ids),
-            Event.created_at >= start_date,
-            Event.created_at <= end_date
-        )
-
-        impressions = events.filter(Event.event_type == 'impression').count()
-        clicks = events.filter(Event.event_type == 'click').count()
-        conversions = events.filter(Event.event_type == 'conversion').count()
-
-        ctr = (clicks / impressions * 100) if impressions > 0 else 0.0
-        cvr = (conversions / clicks * 100) if clicks > 0 else 0.0
-
+        for stats in comparison["variants"]:
+            if stats["variant"] == variant:
+                return stats
         return {
             "variant": variant,
-            "impressions": impressions,
-            "clicks": clicks,
-            "conversions": conversions,
-            "ctr": round(ctr, 2),
-            "cvr": round(cvr, 2)
+            "impressions": 0,
+            "clicks": 0,
+            "conversions": 0,
+            "ctr": 0.0,
+            "cvr": 0.0
         }
 
     # Get stats for both variants
     stats_a = get_variant_stats(variant_a)
     stats_b = get_variant_stats(variant_b)
 
-    # Determine winner (simple comparison by CTR)
+    # Winner by CTR; confidence = posterior probability (%) that it has the higher CTR
     winner = None
     confidence = None
 
     if stats_a["impressions"] > 0 and stats_b["impressions"] > 0:
         if stats_a["ctr"] > stats_b["ctr"]:
             winner = variant_a
-            confidence = min(abs(stats_a["ctr"] - stats_b["ctr"]) / max(stats_a["ctr"], stats_b["ctr"]) * 100, 100)
+            confidence = stats_a["prob_best_ctr"] * 100
         elif stats_b["ctr"] > stats_a["ctr"]:
             winner = variant_b
-            confidence = min(abs(stats_b["ctr"] - stats_a["ctr"]) / max(stats_a["ctr"], stats_b["ctr"]) * 100, 100)
+            confidence = stats_b["prob_best_ctr"] * 100
         else:
             winner = "tie"
             confidence = 0.0
@@ -0,0 +1,325 @@
+"""
+Cold Data Archival
+Moves whole months of old gen_jobs / generated_content / metrics / events rows into
+zstd-compressed Parquet files in storage, tracked by archive_manifest, and scans them
+back with pyarrow when analytics ask for archived ranges
+"""
+import os
+import zlib
+import asyncio
+import tempfile
+from collections import Counter
+from datetime import datetime
+from typing import BinaryIO, Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from dotenv import load_dotenv
+
+from database import SessionLocal, ArchiveManifest
+from exports import EXPORT_DATASETS, export_query, export_chunk_size, iter_chunks, encode_chunks
+from event_partitions import month_start, add_months, partition_name, list_partitions, PARENT_TABLE
+from storage_client import get_storage_client
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("archival")
+
+ARCHIVE_HORIZON_MONTHS = int(os.getenv("ARCHIVE_HORIZON_MONTHS", "12"))  # 0 = disabled
+ARCHIVE_STORAGE_BUCKET = os.getenv("ARCHIVE_STORAGE_BUCKET", "artify-archive")
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "86400"))  # daily
+ARCHIVE_TABLES = ("events", "gen_jobs", "generated_content", "metrics")
+
+# Serializes archival of a (table, month) across workers/replicas: transaction-level
+# two-key lock (ADVISORY_LOCK_KEY, archive_lock_id(table, month))
+ADVISORY_LOCK_KEY = 72026038
+
+
+def archive_path(table_name: str, month: datetime) -> str:
+    """Hive-style object path of one archived month"""
+    return (
+        f"archive/{table_name}/year={month.year:04d}/month={month.month:02d}/"
+        f"{table_name}_{month.year:04d}_{month.month:02d}.parquet"
+    )
+
+
+def archive_lock_id(table_name: str, month: datetime) -> int:
+    """Second advisory lock key of one (table, month)"""
+    return zlib.crc32(f"{table_name}:{month:%Y-%m}".encode("utf-8")) & 0x7FFFFFFF
+
+
+def _time_column(table_name: str):
+    model, time_column, _ = EXPORT_DATASETS[table_name]
+    return model.__table__.c[time_column]
+
+
+def pending_months(db: Session, table_name: str, horizon_months: int = ARCHIVE_HORIZON_MONTHS) -> List[datetime]:
+    """Months from the oldest row up to the horizon that are not in the manifest yet"""
+    if horizon_months <= 0:
+        return []
+
+    oldest = db.query(func.min(_time_column(table_name))).scalar()
+    if oldest is None:
+        return []
+
+    cutoff = add_months(month_start(datetime.utcnow()), -horizon_months)
+    archived = {
+        row.month for row in db.query(ArchiveManifest.month).filter(ArchiveManifest.table_name == table_name)
+    }
+
+    months = []
+    month = month_start(oldest)
+    while month < cutoff:
+        if month.date() not in archived:
+            months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def _write_parquet(table_name: str, month: datetime, spool: BinaryIO) -> int:
+    """Stream one month into a compressed Parquet file; returns the row count"""
+    stmt = export_query(table_name, start_date=month).where(_time_column(table_name) < add_months(month, 1))
+
+    row_count = 0
+
+    def counted(chunks):
+        nonlocal row_count
+        for rows in chunks:
+            row_count += len(rows)
+            yield rows
+
+    for part in encode_chunks("parquet", list(stmt.selected_columns), counted(iter_chunks(stmt, export_chunk_size(table_name)))):
+        spool.write(part)
+    return row_count
+
+
+def _delete_month(db: Session, table_name: str, month: datetime, expected_rows: int) -> None:
+    """
+    Remove an archived month from Postgres
+
+    Events drop the whole monthly partition when it exists (no dead tuples);
+    other tables DELETE the range. Raises if the row count changed since export.
+    """
+    lower, upper = month, add_months(month, 1)
+    column = _time_column(table_name)
+    table = column.table.name
+
+    if table_name == "events" and partition_name(month) in list_partitions(db.connection()):
+        name = partition_name(month)
+        rows = db.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        if rows != expected_rows:
+            raise RuntimeError(f"{name} has {rows} rows, archived {expected_rows}")
+        db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        db.execute(text(f"DROP TABLE {name}"))
+        return
+
+    result = db.execute(
+        text(f"DELETE FROM {table} WHERE {column.name} >= :lower AND {column.name} < :upper"),
+        {"lower": lower, "upper": upper}
+    )
+    if result.rowcount != expected_rows:
+        raise RuntimeError(f"{table} {lower:%Y-%m}: deleted {result.rowcount} rows, archived {expected_rows}")
+
+
+def archive_month(db: Session, table_name: str, month: datetime) -> Optional[Dict[str, Any]]:
+    """
+    Archive one month: write Parquet, upload, record it in the manifest, delete the rows
+
+    The manifest row and the delete commit together after the upload succeeded, so a
+    failure at any step leaves the rows in Postgres (a retry overwrites the file).
+    Returns None when the month is empty or another worker holds the archival lock.
+    """
+    locked = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key, :month_key)"),
+        {"key": ADVISORY_LOCK_KEY, "month_key": archive_lock_id(table_name, month)}
+    ).scalar()
+    already_archived = db.query(ArchiveManifest.path).filter(
+        ArchiveManifest.table_name == table_name,
+        ArchiveManifest.month == month.date()
+    ).first()
+    if not locked or already_archived:
+        db.rollback()
+        return None
+
+    path = archive_path(table_name, month)
+    # Spooled to disk and uploaded from the file, so a month is never held in memory
+    with tempfile.TemporaryFile() as spool:
+        row_count = _write_parquet(table_name, month, spool)
+        if row_count == 0:
+            db.rollback()
+            return None
+        size_bytes = spool.tell()
+        spool.seek(0)
+        ok, error = get_storage_client().put_object(
+            path, spool, "application/vnd.apache.parquet", bucket=ARCHIVE_STORAGE_BUCKET
+        )
+    if not ok:
+        raise RuntimeError(f"Upload of {path} failed: {error}")
+
+    _delete_month(db, table_name, month, row_count)
+
+    stmt = insert(ArchiveManifest).values(
+        table_name=table_name, month=month.date(), path=path,
+        row_count=row_count, size_bytes=size_bytes, created_at=datetime.utcnow()
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ArchiveManifest.table_name, ArchiveManifest.month],
+        set_={"path": stmt.excluded.path, "row_count": stmt.excluded.row_count,
+              "size_bytes": stmt.excluded.size_bytes, "created_at": stmt.excluded.created_at}
+    ))
+    db.commit()
+
+    logger.info(f"Archived {table_name} {month:%Y-%m}: {row_count} rows, {size_bytes} bytes -> {path}")
+    return {"table": table_name, "month": month.strftime("%Y-%m"), "rows": row_count, "bytes": size_bytes}
+
+
+def run_archival(horizon_months: int = ARCHIVE_HORIZON_MONTHS, tables=ARCHIVE_TABLES) -> Dict[str, Any]:
+    """Archive every pending month of every table (one transaction per month)"""
+    db = SessionLocal()
+    try:
+        archived = []
+        for table_name in tables:
+            months = pending_months(db, table_name, horizon_months)
+            db.rollback()
+            for month in months:
+                try:
+                    result = archive_month(db, table_name, month)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Archival of {table_name} {month:%Y-%m} failed: {e}", exc_info=True)
+                    continue
+                if result:
+                    archived.append(result)
+
+        return {"archived": archived}
+    finally:
+        db.close()
+
+
+async def archival_loop(interval: int = ARCHIVE_INTERVAL):
+    """Background loop started from the FastAPI startup hook"""
+    if ARCHIVE_HORIZON_MONTHS <= 0:
+        return
+    while True:
+        try:
+            result = await asyncio.to_thread(run_archival)
+            if result["archived"]:
+                logger.info(f"Archival: {len(result['archived'])} months archived")
+        except Exception as e:
+            logger.error(f"Archival failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+# ---------- reading archived ranges ----------
+
+def archived_months(db: Session, table_name: str, start: datetime, end: datetime) -> List[ArchiveManifest]:
+    """Manifest entries overlapping [start, end]"""
+    return db.query(ArchiveManifest).filter(
+        ArchiveManifest.table_name == table_name,
+        ArchiveManifest.month >= month_start(start).date(),
+        ArchiveManifest.month <= end.date()
+    ).order_by(ArchiveManifest.month).all()
+
+
+def scan_archive(
+    db: Session,
+    table_name: str,
+    start: datetime,
+    end: datetime,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Tuple[str, str, Any]]] = None
+):
+    """
+    Archived rows in [start, end] as one pyarrow Table (None when nothing is archived)
+
+    Each month is downloaded to a temporary file and read batch by batch; only the
+    requested and filtered columns are decoded, and `filters` ([(column, op, value)])
+    are applied per batch so only matching rows are kept in memory.
+    """
+    entries = archived_months(db, table_name, start, end)
+    if not entries:
+        return None
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    time_column = _time_column(table_name).name
+    row_filters = [(time_column, ">=", start), (time_column, "<=", end)] + list(filters or [])
+    expression = pq.filters_to_expression(row_filters)
+
+    storage = get_storage_client()
+    tables = []
+    for entry in entries:
+        with tempfile.TemporaryFile() as spool:
+            if not storage.download_object(entry.path, spool, bucket=ARCHIVE_STORAGE_BUCKET):
+                logger.warning(f"Archived file missing: {entry.path}")
+                continue
+            spool.seek(0)
+
+            parquet = pq.ParquetFile(spool)
+            wanted = columns or parquet.schema_arrow.names
+            read_columns = list(dict.fromkeys(list(wanted) + [column for column, _, _ in row_filters]))
+            for batch in parquet.iter_batches(columns=read_columns):
+                matched = pa.Table.from_batches([batch]).filter(expression)
+                if matched.num_rows:
+                    tables.append(matched.select(wanted))
+
+    return pa.concat_tables(tables) if tables else None
+
+
+def archived_event_breakdown(db: Session, campaign_id: int, start: datetime, end: datetime) -> Optional[Dict[str, Any]]:
+    """
+    Event counts of a campaign from archived months
+
+    Returns:
+        {"totals", "by_creative", "by_channel", "by_segment", "by_day"} of
+        Counter(event_type -> count) plus "sessions" (distinct session ids), or None
+    """
+    table = scan_archive(
+        db, "events", start, end,
+        columns=["id", "creative_id", "event_type", "session_id", "channel", "segment_id", "created_at"],
+        filters=[("campaign_id", "=", campaign_id)]
+    )
+    if table is None or table.num_rows == 0:
+        return None
+
+    import pyarrow.compute as pc
+
+    table = table.append_column("day", pc.strftime(table["created_at"], format="%Y-%m-%d"))
+
+    def counts(key: Optional[str]) -> Dict[Any, Counter]:
+        keys = [key, "event_type"] if key else ["event_type"]
+        grouped: Dict[Any, Counter] = {}
+        for row in table.group_by(keys).aggregate([("id", "count")]).to_pylist():
+            if key and row[key] is None:
+                continue
+            grouped.setdefault(row[key] if key else None, Counter())[row["event_type"]] += row["id_count"]
+        return grouped
+
+    return {
+        "totals": counts(None).get(None, Counter()),
+        "by_creative": counts("creative_id"),
+        "by_channel": counts("channel"),
+        "by_segment": counts("segment_id"),
+        "by_day": counts("day"),
+        "sessions": pc.count_distinct(table["session_id"]).as_py()
+    }
+
+
+def main():
+    """Run archival once (cron / manual use)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive old rows to Parquet files in storage")
+    parser.add_argument("--horizon-months", type=int, default=ARCHIVE_HORIZON_MONTHS)
+    parser.add_argument("--table", choices=list(ARCHIVE_TABLES), action="append", help="Limit to these tables")
+    args = parser.parse_args()
+
+    result = run_archival(args.horizon_months, tuple(args.table or ARCHIVE_TABLES))
+    logger.info(f"✅ Archival finished: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Bandit Creative Allocator
+Thompson sampling / UCB creative selection from in-memory Beta posteriors,
+fed by the event stream and synced across workers through Redis
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from database import SessionLocal, Creative, Event
+from cache import get_cache
+from event_stream import StreamEntry, last_stream_id, run_consumer
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("bandit")
+
+BANDIT_GROUP = "bandit"
+BANDIT_SYNC_INTERVAL = float(os.getenv("BANDIT_SYNC_INTERVAL", "2.0"))
+BANDIT_ARMS_REFRESH = float(os.getenv("BANDIT_ARMS_REFRESH", "60"))  # seconds between creative list reloads
+BANDIT_STATE_TTL = int(os.getenv("BANDIT_STATE_TTL", "604800"))  # 7 days
+BANDIT_MAX_CAMPAIGNS = int(os.getenv("BANDIT_MAX_CAMPAIGNS", "1000"))  # campaigns held per worker (LRU)
+SERVE_STRATEGIES = ("thompson", "ucb")
+
+# Add deltas only while the hash exists (a missing hash is reseeded from events instead),
+# and only for entries newer than the seed point (older ones were counted by the seed).
+# ARGV: ttl, field, entry ID, field, entry ID, ...
+_FLUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+local seed = redis.call('HGET', KEYS[1], 'seed_id') or '0-0'
+local seed_ms, seed_seq = string.match(seed, '(%d+)-(%d+)')
+seed_ms, seed_seq = tonumber(seed_ms), tonumber(seed_seq)
+local deltas = {}
+for i = 2, #ARGV, 2 do
+    local ms, seq = string.match(ARGV[i + 1], '(%d+)-(%d+)')
+    ms, seq = tonumber(ms), tonumber(seq)
+    if ms > seed_ms or (ms == seed_ms and seq > seed_seq) then
+        deltas[ARGV[i]] = (deltas[ARGV[i]] or 0) + 1
+    end
+end
+for field, delta in pairs(deltas) do
+    redis.call('HINCRBY', KEYS[1], field, delta)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+_SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def state_key(campaign_id: int) -> str:
+    """Redis hash with `{creative_id}:imp` / `{creative_id}:clk` totals"""
+    return f"bandit:campaign:{campaign_id}"
+
+
+class CampaignArms:
+    """Servable creatives of one campaign and their impression/click totals"""
+
+    def __init__(self, creatives: List[Dict[str, Any]]):
+        self.creatives = creatives
+        self.index = {creative["id"]: i for i, creative in enumerate(creatives)}
+        self.impressions = np.zeros(len(creatives))
+        self.clicks = np.zeros(len(creatives))
+        self.loaded_at = time.monotonic()
+
+    def set_totals(self, totals: Dict[int, Dict[str, int]]) -> None:
+        for creative_id, i in self.index.items():
+            self.impressions[i] = totals.get(creative_id, {}).get("imp", 0)
+            self.clicks[i] = totals.get(creative_id, {}).get("clk", 0)
+
+
+class BanditAllocator:
+    """
+    Per-worker bandit state
+
+    Decisions only read numpy arrays held in memory. The `bandit` stream consumer
+    (one worker per event) accumulates deltas; sync() flushes them to Redis with
+    HINCRBY and pulls the merged totals back, so every worker converges within
+    BANDIT_SYNC_INTERVAL. At most BANDIT_MAX_CAMPAIGNS campaigns are held, least
+    recently served first out.
+    """
+
+    def __init__(self, max_campaigns: int = BANDIT_MAX_CAMPAIGNS):
+        self.max_campaigns = max_campaigns
+        self._campaigns: "OrderedDict[int, CampaignArms]" = OrderedDict()
+        # campaign_id -> [(field, stream entry ID)] not yet flushed
+        self._pending: Dict[int, List[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+
+    # ---------- loading ----------
+
+    def _load_creatives(self, db: Session, campaign_ids: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Servable (non-rejected) creatives for several campaigns in one query"""
+        rows = db.query(
+            Creative.id, Creative.campaign_id, Creative.name, Creative.content_type,
+            Creative.content_text, Creative.asset_url, Creative.thumbnail_url, Creative.variant
+        ).filter(
+            Creative.campaign_id.in_(list(campaign_ids)),
+            func.coalesce(Creative.status, 'draft') != 'rejected'
+        ).order_by(Creative.id).all()
+
+        creatives: Dict[int, List[Dict[str, Any]]] = {campaign_id: [] for campaign_id in campaign_ids}
+        for row in rows:
+            creatives[row.campaign_id].append({
+                "id": row.id,
+                "name": row.name,
+                "content_type": row.content_type,
+                "content_text": row.content_text,
+                "asset_url": row.asset_url,
+                "thumbnail_url": row.thumbnail_url,
+                "variant": row.variant
+            })
+        return creatives
+
+    def _count_events(self, db: Session, campaign_id: int) -> Dict[int, Dict[str, int]]:
+        """Impression/click totals per creative from one grouped query"""
+        rows = db.query(
+            Event.creative_id,
+            func.count(Event.id).filter(Event.event_type == 'impression').label("imp"),
+            func.count(Event.id).filter(Event.event_type == 'click').label("clk")
+        ).filter(
+            Event.campaign_id == campaign_id,
+            Event.creative_id.isnot(None),
+            Event.event_type.in_(['impression', 'click'])
+        ).group_by(Event.creative_id).all()
+        return {row.creative_id: {"imp": row.imp, "clk": row.clk} for row in rows}
+
+    def _read_totals(self, db: Session, campaign_id: int) -> Dict[int, Dict[str, int]]:
+        """
+        Totals from Redis, seeding the hash from Postgres when it is missing
+
+        The seed records the stream position read after the COUNT (as live counters
+        do); flushed deltas of entries at or before it are dropped, so an event is
+        never counted by both the seed and the consumer.
+        """
+        cache = get_cache()
+        if not cache.enabled:
+            return self._count_events(db, campaign_id)
+
+        raw = cache.client.hgetall(state_key(campaign_id))
+        if not raw:
+            totals = self._count_events(db, campaign_id)
+            fields = ["seed_id", last_stream_id()]
+            for creative_id, counts in totals.items():
+                fields += [f"{creative_id}:imp", counts["imp"], f"{creative_id}:clk", counts["clk"]]
+            cache.client.eval(_SEED_SCRIPT, 1, state_key(campaign_id), BANDIT_STATE_TTL, *fields)
+            return totals
+
+        totals: Dict[int, Dict[str, int]] = {}
+        for field, value in raw.items():
+            creative_id, _, kind = field.partition(":")
+            if kind:
+                totals.setdefault(int(creative_id), {})[kind] = int(value)
+        return totals
+
+    def get_arms(self, db: Session, campaign_id: int) -> CampaignArms:
+        """Arms for a campaign, loading them on first use"""
+        with self._lock:
+            arms = self._campaigns.get(campaign_id)
+            if arms is not None:
+                self._campaigns.move_to_end(campaign_id)
+                return arms
+
+        arms = CampaignArms(self._load_creatives(db, [campaign_id])[campaign_id])
+        arms.set_totals(self._read_totals(db, campaign_id))
+        with self._lock:
+            self._campaigns[campaign_id] = arms
+            while len(self._campaigns) > self.max_campaigns:
+                self._campaigns.popitem(last=False)
+        return arms
+
+    # ---------- decisions ----------
+
+    def choose(self, db: Session, campaign_id: int, strategy: str = "thompson") -> Optional[Dict[str, Any]]:
+        """
+        Pick a creative for one impression
+
+        Args:
+            strategy: 'thompson' (sample each Beta(1 + clicks, 1 + non-clicks) posterior)
+                      or 'ucb' (UCB1 on CTR, untried arms first)
+
+        Returns:
+            The chosen creative with its posterior mean CTR, or None if the campaign has no creatives
+        """
+        arms = self.get_arms(db, campaign_id)
+        if not arms.creatives:
+            return None
+
+        with self._lock:
+            impressions = arms.impressions.copy()
+            clicks = np.minimum(arms.clicks, impressions)
+
+        if strategy == "ucb":
+            total = max(impressions.sum(), 1.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(
+                    impressions > 0,
+                    clicks / impressions + np.sqrt(2 * np.log(total) / impressions),
+                    np.inf
+                )
+        else:
+            scores = self._rng.beta(1 + clicks, 1 + impressions - clicks)
+
+        choice = int(np.argmax(scores))
+        creative = dict(arms.creatives[choice])
+        creative["expected_ctr"] = round(float((1 + clicks[choice]) / (2 + impressions[choice])), 6)
+        creative["impressions"] = int(impressions[choice])
+        creative["clicks"] = int(clicks[choice])
+        return creative
+
+    # ---------- updates ----------
+
+    def apply_events(self, entries: List[StreamEntry]) -> None:
+        """Stream handler: add impressions/clicks to local posteriors and pending deltas"""
+        with self._lock:
+            for entry_id, fields in entries:
+                kind = {"impression": "imp", "click": "clk"}.get(fields.get("event_type"))
+                if not kind or not fields.get("creative_id") or not fields.get("campaign_id"):
+                    continue
+
+                campaign_id = int(fields["campaign_id"])
+                creative_id = int(fields["creative_id"])
+                self._pending.setdefault(campaign_id, []).append((f"{creative_id}:{kind}", entry_id))
+
+                arms = self._campaigns.get(campaign_id)
+                if arms is not None and creative_id in arms.index:
+                    counts = arms.impressions if kind == "imp" else arms.clicks
+                    counts[arms.index[creative_id]] += 1
+
+    def sync(self) -> None:
+        """Flush pending deltas to Redis, pull merged totals, refresh stale creative lists"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            loaded_at = {campaign_id: arms.loaded_at for campaign_id, arms in self._campaigns.items()}
+            campaign_ids = list(loaded_at)
+
+        cache = get_cache()
+        if cache.enabled and (pending or campaign_ids):
+            pipe = cache.client.pipeline(transaction=False)
+            for campaign_id, deltas in pending.items():
+                fields = []
+                for field, entry_id in deltas:
+                    fields += [field, entry_id]
+                pipe.eval(_FLUSH_SCRIPT, 1, state_key(campaign_id), BANDIT_STATE_TTL, *fields)
+            pipe.execute()
+
+        if not campaign_ids:
+            return
+
+        stale = [
+            campaign_id for campaign_id in campaign_ids
+            if time.monotonic() - loaded_at[campaign_id] >= BANDIT_ARMS_REFRESH
+        ]
+
+        db = SessionLocal()
+        try:
+            reloaded = self._load_creatives(db, stale) if stale else {}
+            for campaign_id in campaign_ids:
+                # Without Redis, totals only move when arms are reloaded from Postgres
+                if not cache.enabled and campaign_id not in reloaded:
+                    continue
+                arms = CampaignArms(reloaded[campaign_id]) if campaign_id in reloaded else None
+                totals = self._read_totals(db, campaign_id)
+                with self._lock:
+                    current = self._campaigns.get(campaign_id)
+                    if current is None:
+                        continue  # evicted meanwhile
+                    target = arms or current
+                    target.set_totals(totals)
+                    if arms is not None:
+                        self._campaigns[campaign_id] = arms
+        finally:
+            db.close()
+
+
+# Global allocator instance (one per worker process)
+_allocator: Optional[BanditAllocator] = None
+
+
+def get_allocator() -> BanditAllocator:
+    """Get or create the allocator"""
+    global _allocator
+    if _allocator is None:
+        _allocator = BanditAllocator()
+    return _allocator
+
+
+async def bandit_consumer():
+    """Background stream consumer started from the FastAPI startup hook"""
+    await run_consumer(BANDIT_GROUP, get_allocator().apply_events)
+
+
+async def bandit_sync_loop(interval: float = BANDIT_SYNC_INTERVAL):
+    """Background loop syncing posteriors with Redis, started from the FastAPI startup hook"""
+    while True:
+        try:
+            await asyncio.to_thread(get_allocator().sync)
+        except Exception as e:
+            logger.error(f"Bandit sync failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
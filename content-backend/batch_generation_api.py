@@ -21,6 +21,7 @@ from database import (
 )
 from openai_client import generate_text, generate_image
 from storage_client import get_storage_client
+from counter_service import increment, PROMPT_TEMPLATE_USAGE, CREATIVE_TEMPLATE_USAGE
 from logger import get_logger
 
 logger = get_logger("batch_generation_api")
@@ -128,6 +129,7 @@ async def process_batch_job(job_id: int, db_session_factory):
             ).first()
             if prompt_template:
                 base_prompt = prompt_template.template
+                increment(PROMPT_TEMPLATE_USAGE, prompt_template.id)
 
                 # Inject segment data into prompt
                 if segment_data:
@@ -215,6 +217,8 @@ async def process_batch_job(job_id: int, db_session_factory):
                 db.refresh(creative)
 
                 creative_ids.append(creative.id)
+                if creative_template:
+                    increment(CREATIVE_TEMPLATE_USAGE, creative_template.id)
                 job.completed_items += 1
                 job.progress = int((job.completed_items / job.total_items) * 100)
                 db.commit()
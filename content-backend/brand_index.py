@@ -0,0 +1,134 @@
+"""
+Brand Guideline Index
+Per-brand in-memory matrix of guideline embeddings: cosine top-k is one NumPy
+matrix-vector product instead of a filtered HNSW query on the shared collection
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("brand_index")
+
+BRAND_INDEX_MAX_BRANDS = int(os.getenv("BRAND_INDEX_MAX_BRANDS", "256"))
+# Other workers see added guidelines after at most this long (the adding worker immediately)
+BRAND_INDEX_TTL = float(os.getenv("BRAND_INDEX_TTL", "300"))
+
+
+class BrandGuidelineIndex:
+    """Guidelines of one brand with their L2-normalized embeddings (one row per guideline)"""
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], embeddings):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.categories = np.array([metadata.get("category", "general") for metadata in metadatas], dtype=object)
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            matrix = matrix.reshape(0, 0)  # brand without guidelines
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.maximum(norms, 1e-12)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def top_k(self, query_embedding: List[float], k: int, category: Optional[str] = None) -> List[Tuple[int, float]]:
+        """(row, cosine similarity) of the k most similar guidelines, best first"""
+        if not len(self.ids):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        if category:
+            scores = np.where(self.categories == category, scores, -np.inf)
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows])]
+        return [(int(row), float(scores[row])) for row in rows]
+
+    def rows(self, category: Optional[str] = None, limit: Optional[int] = None) -> List[int]:
+        """Rows in stored order, optionally of one category"""
+        rows = [i for i in range(len(self.ids)) if not category or self.categories[i] == category]
+        return rows[:limit] if limit is not None else rows
+
+
+class BrandIndexCache:
+    """
+    Lazily loaded BrandGuidelineIndex per brand, bounded LRU
+
+    A brand is loaded with one `get(where={"brand_id": ...})` including embeddings.
+    Documents repeated under different ids (guidelines added before ids were
+    content hashes) are kept once.
+    """
+
+    def __init__(self, collection, max_brands: int = BRAND_INDEX_MAX_BRANDS, ttl: float = BRAND_INDEX_TTL):
+        self.collection = collection
+        self.max_brands = max_brands
+        self.ttl = ttl
+        self._indexes: "OrderedDict[int, BrandGuidelineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def _load(self, brand_id: int) -> BrandGuidelineIndex:
+        data = self.collection.get(where={"brand_id": brand_id}, include=["documents", "metadatas", "embeddings"])
+        keep, seen = [], set()
+        for i, document in enumerate(data["documents"]):
+            if document not in seen:
+                seen.add(document)
+                keep.append(i)
+
+        embeddings = data["embeddings"]
+        index = BrandGuidelineIndex(
+            ids=[data["ids"][i] for i in keep],
+            documents=[data["documents"][i] for i in keep],
+            metadatas=[data["metadatas"][i] or {} for i in keep],
+            embeddings=[embeddings[i] for i in keep]
+        )
+        logger.debug(f"Loaded {len(index)} guidelines of brand {brand_id}")
+        return index
+
+    def get(self, brand_id: int) -> BrandGuidelineIndex:
+        """Index of a brand (loaded on first use or after BRAND_INDEX_TTL)"""
+        with self._lock:
+            index = self._indexes.get(brand_id)
+            if index is not None and time.monotonic() - index.loaded_at < self.ttl:
+                self._indexes.move_to_end(brand_id)
+                self.hits += 1
+                return index
+
+        # Loaded outside the lock; concurrent first requests of a brand may both load
+        index = self._load(brand_id)
+        with self._lock:
+            self._indexes[brand_id] = index
+            self._indexes.move_to_end(brand_id)
+            while len(self._indexes) > self.max_brands:
+                self._indexes.popitem(last=False)
+            self.loads += 1
+        return index
+
+    def invalidate(self, brand_id: int) -> None:
+        """Drop a brand so its next use reloads it (call after adding guidelines)"""
+        with self._lock:
+            self._indexes.pop(brand_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "brands": len(self._indexes),
+                "guidelines": sum(len(index) for index in self._indexes.values()),
+                "loads": self.loads,
+                "hits": self.hits
+            }
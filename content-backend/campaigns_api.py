@@ -2,7 +2,7 @@
 Campaign Management API
 Handles campaign CRUD, creative management, and event tracking
 """
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
 from pydantic import BaseModel, Field
@@ -12,6 +12,8 @@ import base64
 
 from database import get_db, Campaign, Creative, Event
 from storage_client import get_storage_client
+from bandit import get_allocator, SERVE_STRATEGIES
+from leaderboards import remove_creative
 from logger import get_logger
 
 logger = get_logger("campaigns_api")
@@ -353,6 +355,38 @@ async def get_campaign_creatives(
     return creatives
 
 
+@router.get("/{campaign_id}/serve")
+async def serve_creative(
+    campaign_id: int,
+    strategy: str = Query("thompson", description="Allocation strategy: thompson or ucb"),
+    db: Session = Depends(get_db)
+):
+    """
+    Pick a creative to show for one impression (multi-armed bandit)
+
+    **Features:**
+    - Thompson sampling (default) or UCB1 over each creative's click-through posterior
+    - Posteriors live in memory and follow the impression/click event stream,
+      so traffic shifts to winning creatives automatically
+    - No database access per decision (only the first one for a campaign on each worker)
+
+    Report the impression with `/track/impression?campaign_id=..&creative_id=..`
+    so the allocator learns from it.
+    """
+    if strategy not in SERVE_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy: {strategy}. Use one of: {', '.join(SERVE_STRATEGIES)}")
+
+    creative = get_allocator().choose(db, campaign_id, strategy)
+    if creative is None:
+        raise HTTPException(status_code=404, detail="No servable creatives for this campaign")
+
+    return {
+        "campaign_id": campaign_id,
+        "strategy": strategy,
+        "creative": creative
+    }
+
+
 @router.delete("/{campaign_id}/creatives/{creative_id}")
 async def delete_creative(
     campaign_id: int,
@@ -378,6 +412,8 @@ async def delete_creative(
     db.delete(creative)
     db.commit()
 
+    remove_creative(creative_id, campaign_id)
+
     logger.info(f"Creative deleted: {creative_id}")
 
     return {"success": True, "message": f"Creative {creative_id} deleted"}
@@ -0,0 +1,421 @@
+"""
+Cost Ledger
+Daily pre-aggregated generation cost totals, written when each job completes,
+plus prompt cache hit/miss/cost-saved counters mirrored in Redis
+"""
+import os
+from datetime import date, datetime
+from typing import Optional, List, Dict, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from dotenv import load_dotenv
+
+from database import CostLedger, GenerationJob, UserQuota
+from cache import get_cache
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("cost_ledger")
+
+# Redis mirror of the all-time cache counters (reseeded from the ledger when it expires)
+CACHE_COUNTERS_KEY = "cache_counters"
+CACHE_COUNTERS_TTL = int(os.getenv("CACHE_COUNTERS_TTL", "3600"))
+CACHE_JOB_TYPES = ("text", "image")
+
+# Increment only while the hash exists, so a missing hash is never rebuilt from partial counts
+_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':hits', ARGV[2])
+redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':misses', ARGV[3])
+redis.call('HINCRBYFLOAT', KEYS[1], ARGV[1] .. ':saved_usd', ARGV[4])
+return 1
+"""
+
+# Seed the hash from ledger totals unless another worker already did
+_SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def _bump_cache_counters(job_type: str, hits: int = 0, misses: int = 0, saved_usd: float = 0.0) -> None:
+    """Best-effort increment of the Redis counters (the ledger stays the source of truth)"""
+    cache = get_cache()
+    if not cache.enabled:
+        return
+
+    try:
+        cache.client.eval(_INCR_SCRIPT, 1, CACHE_COUNTERS_KEY, job_type, hits, misses, repr(float(saved_usd)))
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to update cache counters: {e}")
+
+
+def record_job_cost(db: Session, job: GenerationJob) -> None:
+    """
+    Add a completed job to its daily ledger row
+
+    Runs in the caller's transaction (commit together with the job status update)
+    so the ledger never diverges from gen_jobs. Every completed generation also
+    counts as a prompt cache miss.
+    """
+    day = (job.created_at or datetime.utcnow()).date()
+
+    stmt = insert(CostLedger).values(
+        day=day,
+        user_id=job.user_id or 0,
+        model=job.model,
+        segment_id=job.segment_id or 0,
+        job_type=job.job_type,
+        jobs=1,
+        prompt_tokens=job.prompt_tokens or 0,
+        completion_tokens=job.completion_tokens or 0,
+        total_tokens=job.total_tokens or 0,
+        cost_usd=job.estimated_cost or 0.0,
+        updated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            CostLedger.day, CostLedger.user_id, CostLedger.model,
+            CostLedger.segment_id, CostLedger.job_type
+        ],
+        set_={
+            "jobs": CostLedger.jobs + stmt.excluded.jobs,
+            "prompt_tokens": CostLedger.prompt_tokens + stmt.excluded.prompt_tokens,
+            "completion_tokens": CostLedger.completion_tokens + stmt.excluded.completion_tokens,
+            "total_tokens": CostLedger.total_tokens + stmt.excluded.total_tokens,
+            "cost_usd": CostLedger.cost_usd + stmt.excluded.cost_usd,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    db.execute(stmt)
+
+    _bump_cache_counters(job.job_type, misses=1)
+
+
+def record_cache_hit(
+    db: Session,
+    job_type: str,
+    model: str,
+    cost_saved: float,
+    user_id: Optional[int] = None,
+    segment_id: Optional[int] = None
+) -> None:
+    """
+    Count a prompt cache hit and the generation cost it avoided
+
+    Runs in the caller's transaction like record_job_cost().
+
+    Args:
+        cost_saved: Cost of the original generation (cost_usd stored with the cache entry)
+    """
+    stmt = insert(CostLedger).values(
+        day=datetime.utcnow().date(),
+        user_id=user_id or 0,
+        model=model or "unknown",
+        segment_id=segment_id or 0,
+        job_type=job_type,
+        jobs=0,
+        prompt_tokens=0,
+        completion_tokens=0,
+        total_tokens=0,
+        cost_usd=0.0,
+        cache_hits=1,
+        cost_saved_usd=cost_saved or 0.0,
+        updated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            CostLedger.day, CostLedger.user_id, CostLedger.model,
+            CostLedger.segment_id, CostLedger.job_type
+        ],
+        set_={
+            "cache_hits": CostLedger.cache_hits + stmt.excluded.cache_hits,
+            "cost_saved_usd": CostLedger.cost_saved_usd + stmt.excluded.cost_saved_usd,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    db.execute(stmt)
+
+    _bump_cache_counters(job_type, hits=1, saved_usd=cost_saved or 0.0)
+
+
+def aggregate_job_costs(db: Session, *filters):
+    """
+    Aggregate gen_jobs counts, costs and tokens in a single SQL query
+
+    Uses COUNT/SUM ... FILTER so only the aggregated columns are read; no
+    GenerationJob rows (or prompts) are loaded into Python.
+    """
+    is_text = GenerationJob.job_type == "text"
+    is_image = GenerationJob.job_type == "image"
+    is_completed = GenerationJob.status == "completed"
+
+    return db.query(
+        func.count(GenerationJob.id).label("jobs"),
+        func.count(GenerationJob.id).filter(is_completed).label("completed_jobs"),
+        func.count(GenerationJob.id).filter(GenerationJob.status == "failed").label("failed_jobs"),
+        func.coalesce(func.sum(GenerationJob.estimated_cost), 0.0).label("cost"),
+        func.coalesce(func.sum(GenerationJob.total_tokens), 0).label("tokens"),
+        func.count(GenerationJob.id).filter(is_text).label("text_jobs"),
+        func.count(GenerationJob.id).filter(is_text, is_completed).label("text_completed"),
+        func.coalesce(func.sum(GenerationJob.estimated_cost).filter(is_text), 0.0).label("text_cost"),
+        func.coalesce(func.sum(GenerationJob.total_tokens).filter(is_text), 0).label("text_tokens"),
+        func.count(GenerationJob.id).filter(is_image).label("image_jobs"),
+        func.count(GenerationJob.id).filter(is_image, is_completed).label("image_completed"),
+        func.coalesce(func.sum(GenerationJob.estimated_cost).filter(is_image), 0.0).label("image_cost"),
+    ).filter(*filters).one()
+
+
+def _ledger_filters(start_day: Optional[date], end_day: Optional[date], user_id: Optional[int]) -> list:
+    filters = []
+    if start_day:
+        filters.append(CostLedger.day >= start_day)
+    if end_day:
+        filters.append(CostLedger.day < end_day)
+    if user_id is not None:
+        filters.append(CostLedger.user_id == user_id)
+    return filters
+
+
+def ledger_totals(
+    db: Session,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    user_id: Optional[int] = None
+):
+    """
+    Totals over [start_day, end_day) with text/image breakdown
+
+    Returns a row with jobs, cost, tokens, text_jobs, text_cost, text_tokens,
+    image_jobs and image_cost (same field names as aggregate_job_costs).
+    """
+    is_text = CostLedger.job_type == "text"
+    is_image = CostLedger.job_type == "image"
+
+    return db.query(
+        func.coalesce(func.sum(CostLedger.jobs), 0).label("jobs"),
+        func.coalesce(func.sum(CostLedger.cost_usd), 0.0).label("cost"),
+        func.coalesce(func.sum(CostLedger.total_tokens), 0).label("tokens"),
+        func.coalesce(func.sum(CostLedger.jobs).filter(is_text), 0).label("text_jobs"),
+        func.coalesce(func.sum(CostLedger.cost_usd).filter(is_text), 0.0).label("text_cost"),
+        func.coalesce(func.sum(CostLedger.total_tokens).filter(is_text), 0).label("text_tokens"),
+        func.coalesce(func.sum(CostLedger.jobs).filter(is_image), 0).label("image_jobs"),
+        func.coalesce(func.sum(CostLedger.cost_usd).filter(is_image), 0.0).label("image_cost"),
+    ).filter(*_ledger_filters(start_day, end_day, user_id)).one()
+
+
+def ledger_daily(
+    db: Session,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    user_id: Optional[int] = None
+) -> List:
+    """Per-day jobs and cost, ordered by day"""
+    return db.query(
+        CostLedger.day,
+        func.sum(CostLedger.jobs).label("jobs"),
+        func.sum(CostLedger.cost_usd).label("cost")
+    ).filter(
+        *_ledger_filters(start_day, end_day, user_id)
+    ).group_by(CostLedger.day).order_by(CostLedger.day).all()
+
+
+def ledger_by_model(
+    db: Session,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    user_id: Optional[int] = None
+) -> List:
+    """Jobs and cost per model, most used first"""
+    jobs = func.sum(CostLedger.jobs).label("jobs")
+    return db.query(
+        CostLedger.model,
+        jobs,
+        func.sum(CostLedger.cost_usd).label("cost")
+    ).filter(
+        *_ledger_filters(start_day, end_day, user_id)
+    ).group_by(CostLedger.model).having(jobs > 0).order_by(jobs.desc()).all()
+
+
+def ledger_by_segment(
+    db: Session,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    user_id: Optional[int] = None
+) -> List:
+    """Jobs and cost per segment_id (0 = no segment)"""
+    return db.query(
+        CostLedger.segment_id,
+        func.sum(CostLedger.jobs).label("jobs"),
+        func.sum(CostLedger.cost_usd).label("cost")
+    ).filter(
+        *_ledger_filters(start_day, end_day, user_id)
+    ).group_by(CostLedger.segment_id).all()
+
+
+def _ledger_cache_counters(db: Session, user_id: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """Cache counters per job type from one grouped ledger query"""
+    filters = _ledger_filters(None, None, user_id)
+    rows = db.query(
+        CostLedger.job_type,
+        func.sum(CostLedger.cache_hits).label("hits"),
+        func.sum(CostLedger.jobs).label("misses"),
+        func.sum(CostLedger.cost_saved_usd).label("saved_usd")
+    ).filter(*filters).group_by(CostLedger.job_type).all()
+
+    counters = {job_type: {"hits": 0, "misses": 0, "saved_usd": 0.0} for job_type in CACHE_JOB_TYPES}
+    for row in rows:
+        counters[row.job_type] = {
+            "hits": int(row.hits or 0),
+            "misses": int(row.misses or 0),
+            "saved_usd": float(row.saved_usd or 0.0)
+        }
+    return counters
+
+
+def cache_counters(db: Session, user_id: Optional[int] = None) -> Tuple[Dict[str, Dict[str, float]], str]:
+    """
+    All-time prompt cache counters: {job_type: {"hits", "misses", "saved_usd"}}
+
+    Platform-wide totals come from the Redis hash; per-user totals, or a missing
+    hash, fall back to one grouped query over the ledger (which also reseeds Redis).
+
+    Returns:
+        (counters, source) where source is 'redis' or 'ledger'
+    """
+    cache = get_cache()
+
+    if user_id is None and cache.enabled:
+        try:
+            raw = cache.client.hgetall(CACHE_COUNTERS_KEY)
+            if raw:
+                counters = {
+                    job_type: {
+                        "hits": int(raw.get(f"{job_type}:hits", 0)),
+                        "misses": int(raw.get(f"{job_type}:misses", 0)),
+                        "saved_usd": float(raw.get(f"{job_type}:saved_usd", 0.0))
+                    }
+                    for job_type in CACHE_JOB_TYPES
+                }
+                return counters, "redis"
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to read cache counters: {e}")
+
+    counters = _ledger_cache_counters(db, user_id)
+
+    if user_id is None and cache.enabled:
+        fields = []
+        for job_type, values in counters.items():
+            fields += [f"{job_type}:hits", values["hits"],
+                       f"{job_type}:misses", values["misses"],
+                       f"{job_type}:saved_usd", repr(values["saved_usd"])]
+        try:
+            cache.client.eval(_SEED_SCRIPT, 1, CACHE_COUNTERS_KEY, CACHE_COUNTERS_TTL, *fields)
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to seed cache counters: {e}")
+
+    return counters, "ledger"
+
+
+def reconcile_quota(db: Session, quota: UserQuota) -> float:
+    """
+    Reset quota.monthly_cost_used to the ledger total since the last monthly reset
+
+    Ledger rows are daily, so the reset day itself is counted in full.
+
+    Returns:
+        The drift that was corrected (ledger total - previous value)
+    """
+    since = (quota.last_monthly_reset or datetime.utcnow()).date()
+    totals = ledger_totals(db, start_day=since, user_id=quota.user_id)
+
+    drift = float(totals.cost) - (quota.monthly_cost_used or 0.0)
+    quota.monthly_cost_used = float(totals.cost)
+    db.commit()
+
+    if abs(drift) > 1e-6:
+        logger.info(f"Quota reconciled for user {quota.user_id}: drift={drift:+.6f} USD")
+    return drift
+
+
+def rebuild_ledger(db: Session, since: Optional[date] = None) -> int:
+    """
+    Rebuild the job columns of ledger rows from gen_jobs (completed jobs only)
+
+    Used to repair the ledger; recomputes every day >= since (or everything).
+    Cache hit columns are kept, since they have no other source of truth.
+
+    Returns:
+        Number of ledger rows written
+    """
+    params = {"since": since}
+    day_filter = "AND created_at >= :since" if since else ""
+    ledger_filter = "WHERE day >= :since" if since else ""
+
+    db.execute(text(f"""
+        UPDATE cost_ledger
+        SET jobs = 0, prompt_tokens = 0, completion_tokens = 0, total_tokens = 0, cost_usd = 0
+        {ledger_filter}
+    """), params)
+
+    result = db.execute(text(f"""
+        INSERT INTO cost_ledger (day, user_id, model, segment_id, job_type, jobs,
+                                 prompt_tokens, completion_tokens, total_tokens, cost_usd,
+                                 cache_hits, cost_saved_usd, updated_at)
+        SELECT created_at::date, COALESCE(user_id, 0), model, COALESCE(segment_id, 0), job_type,
+               count(*), COALESCE(sum(prompt_tokens), 0), COALESCE(sum(completion_tokens), 0),
+               COALESCE(sum(total_tokens), 0), COALESCE(sum(estimated_cost), 0), 0, 0, now()
+        FROM gen_jobs
+        WHERE status = 'completed' AND created_at IS NOT NULL {day_filter}
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (day, user_id, model, segment_id, job_type) DO UPDATE SET
+            jobs = EXCLUDED.jobs,
+            prompt_tokens = EXCLUDED.prompt_tokens,
+            completion_tokens = EXCLUDED.completion_tokens,
+            total_tokens = EXCLUDED.total_tokens,
+            cost_usd = EXCLUDED.cost_usd,
+            updated_at = EXCLUDED.updated_at
+    """), params)
+
+    db.execute(text(f"""
+        DELETE FROM cost_ledger
+        WHERE jobs = 0 AND cache_hits = 0 {"AND day >= :since" if since else ""}
+    """), params)
+    db.commit()
+
+    # Redis counters are reseeded from the ledger on next read
+    cache = get_cache()
+    if cache.enabled:
+        cache.delete(CACHE_COUNTERS_KEY)
+
+    return result.rowcount
+
+
+def main():
+    """Rebuild the cost ledger from gen_jobs"""
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily cost ledger from gen_jobs")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="First day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = rebuild_ledger(db, args.since)
+        logger.info(f"✅ Cost ledger rebuilt: {rows} rows")
+    except Exception as e:
+        logger.error(f"❌ Error rebuilding cost ledger: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Counter Service
+Write-coalescing counters: hot-path increments are collected in Redis (HINCRBY) or in
+process memory and flushed as one bulk update per target (template usage counts in
+Postgres, prompt cache hit counts in Chroma)
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Any
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from dotenv import load_dotenv
+
+from database import SessionLocal, engine
+from cache import get_cache
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("counter_service")
+
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "10"))
+# 'redis' shares pending deltas between workers (falls back to memory when Redis is down)
+COUNTER_BACKEND = os.getenv("COUNTER_BACKEND", "redis")  # 'redis' or 'memory'
+
+PROMPT_TEMPLATE_USAGE = "prompt_template_usage"
+CREATIVE_TEMPLATE_USAGE = "creative_template_usage"
+PROMPT_CACHE_HITS = "prompt_cache_hits"
+
+# Serializes flushes of the shared Redis hashes across workers/replicas (session-level lock)
+ADVISORY_LOCK_KEY = 72026047
+
+# Deltas of this process not yet flushed (memory backend / Redis unavailable)
+_local: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+_local_lock = threading.Lock()
+
+
+def pending_key(target: str) -> str:
+    """Redis hash collecting increments of a target"""
+    return f"counters:pending:{target}"
+
+
+def flushing_key(target: str) -> str:
+    """Redis hash being applied by a flush (left behind if the flush failed)"""
+    return f"counters:flushing:{target}"
+
+
+def _redis():
+    cache = get_cache()
+    if COUNTER_BACKEND == "redis" and cache.enabled:
+        return cache.client
+    return None
+
+
+def increment(target: str, key: Any, delta: int = 1) -> int:
+    """
+    Add `delta` to a counter; applied to the store on the next flush
+
+    Returns:
+        Pending delta of the counter after the increment
+    """
+    client = _redis()
+    if client is not None:
+        try:
+            return client.hincrby(pending_key(target), str(key), delta)
+        except Exception as e:
+            logger.warning(f"Counter HINCRBY failed, keeping delta in memory: {e}")
+
+    with _local_lock:
+        _local[target][str(key)] += delta
+        return _local[target][str(key)]
+
+
+def pending(target: str, keys: Iterable[Any]) -> Dict[str, int]:
+    """
+    Unflushed deltas of `keys` (pending + in-flight Redis hashes and this process)
+
+    Add them to the stored value to read an up-to-date count.
+    """
+    keys = [str(key) for key in keys]
+    deltas = {key: 0 for key in keys}
+    if not keys:
+        return deltas
+
+    client = _redis()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.hmget(pending_key(target), keys)
+            pipe.hmget(flushing_key(target), keys)
+            for values in pipe.execute():
+                for key, value in zip(keys, values):
+                    deltas[key] += int(value or 0)
+        except Exception as e:
+            logger.warning(f"Counter HMGET failed: {e}")
+
+    with _local_lock:
+        local = _local.get(target, {})
+        for key in keys:
+            deltas[key] += local.get(key, 0)
+    return deltas
+
+
+def merge_pending(target: str, rows: List[Any], attribute: str = "usage_count") -> List[Any]:
+    """Add unflushed deltas to loaded ORM rows (without marking them dirty)"""
+    deltas = pending(target, [row.id for row in rows])
+    for row in rows:
+        set_committed_value(row, attribute, (getattr(row, attribute) or 0) + deltas[str(row.id)])
+    return rows
+
+
+# ==========================================
+# Flush targets
+# ==========================================
+
+def _flush_usage_count(table: str) -> Callable[[Session, Dict[str, int]], int]:
+    def flush(db: Session, deltas: Dict[str, int]) -> int:
+        ids = [int(key) for key in deltas]
+        result = db.execute(text(f"""
+            UPDATE {table} AS t
+            SET usage_count = COALESCE(t.usage_count, 0) + d.delta
+            FROM unnest(CAST(:ids AS integer[]), CAST(:deltas AS integer[])) AS d(id, delta)
+            WHERE t.id = d.id
+        """), {"ids": ids, "deltas": [deltas[str(id_)] for id_ in ids]})
+        return result.rowcount
+    return flush
+
+
+def _flush_prompt_cache_hits(db: Session, deltas: Dict[str, int]) -> int:
+    """
+    Add hit counts to prompt cache entries (one get + one update)
+
+    last_hit_ts is set to the flush time, i.e. it lags real hits by at most
+    COUNTER_FLUSH_INTERVAL, far below the LRU eviction granularity. Entries
+    removed since the hit (merged / evicted) are skipped.
+    """
+    from vector_client import get_vector_client
+
+    collection = get_vector_client().prompt_cache_collection
+    current = collection.get(ids=list(deltas), include=["metadatas"])
+    if not current["ids"]:
+        return 0
+
+    now = time.time()
+    last_hit_at = datetime.now().isoformat()
+    collection.update(
+        ids=current["ids"],
+        metadatas=[
+            {
+                "hit_count": (metadata or {}).get("hit_count", 0) + deltas[doc_id],
+                "last_hit_at": last_hit_at,
+                "last_hit_ts": now
+            }
+            for doc_id, metadata in zip(current["ids"], current["metadatas"])
+        ]
+    )
+    return len(current["ids"])
+
+
+FLUSH_TARGETS: Dict[str, Callable[[Session, Dict[str, int]], int]] = {
+    PROMPT_TEMPLATE_USAGE: _flush_usage_count("prompt_templates"),
+    CREATIVE_TEMPLATE_USAGE: _flush_usage_count("creative_templates"),
+    PROMPT_CACHE_HITS: _flush_prompt_cache_hits,
+}
+
+
+def _take_local(target: str) -> Dict[str, int]:
+    with _local_lock:
+        deltas = _local.pop(target, {})
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def _restore_local(target: str, deltas: Dict[str, int]) -> None:
+    with _local_lock:
+        for key, delta in deltas.items():
+            _local[target][key] += delta
+
+
+def flush_counters(db: Session) -> Dict[str, int]:
+    """
+    Apply pending deltas of every target
+
+    Redis: the pending hash is renamed to the flushing hash (new increments start
+    a fresh one), applied, then deleted. A flushing hash left by a failed run is
+    applied first. Both hashes are only touched under a session-level advisory
+    lock held on its own connection until the flushing hash is deleted, i.e. past
+    each target's commit, so no other worker can apply the same hash twice.
+    Readers of pending() may over-count by one flush between commit and delete.
+    Local deltas are additive and flushed by every process on its own.
+
+    Returns:
+        Rows / entries updated per target
+    """
+    client = _redis()
+    with engine.connect() as lock_conn:
+        locked = client is not None and lock_conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+        ).scalar()
+        try:
+            return _flush_targets(db, client if locked else None)
+        finally:
+            if locked:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+
+def _flush_targets(db: Session, client) -> Dict[str, int]:
+    """Flush every target; `client` is None unless this process holds the flush lock"""
+    updated = {}
+    for target, flush in FLUSH_TARGETS.items():
+        local = _take_local(target)
+        shared = {}
+        if client is not None:
+            if not client.exists(flushing_key(target)) and client.exists(pending_key(target)):
+                client.rename(pending_key(target), flushing_key(target))
+            shared = {key: int(delta) for key, delta in client.hgetall(flushing_key(target)).items()}
+
+        deltas = dict(shared)
+        for key, delta in local.items():
+            deltas[key] = deltas.get(key, 0) + delta
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        try:
+            if deltas:
+                updated[target] = flush(db, deltas)
+            db.commit()
+        except Exception:
+            db.rollback()
+            _restore_local(target, local)
+            raise
+        if client is not None:
+            client.delete(flushing_key(target))
+
+    return updated
+
+
+def run_counter_flush() -> Dict[str, int]:
+    """Flush once with its own session"""
+    db = SessionLocal()
+    try:
+        return flush_counters(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def counter_flush_loop(interval: float = COUNTER_FLUSH_INTERVAL):
+    """Background loop started from the FastAPI startup hook"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            updated = await asyncio.to_thread(run_counter_flush)
+            if updated:
+                logger.debug(f"Counters flushed: {updated}")
+        except Exception as e:
+            logger.error(f"Counter flush failed: {e}", exc_info=True)
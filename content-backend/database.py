@@ -1,7 +1,7 @@
 """
 Database configuration and models for Content Backend
 """
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, JSON, text
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Text, Date, DateTime, Float, Boolean, ForeignKey, JSON, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -86,6 +86,10 @@ class GeneratedContent(Base):
 class Metric(Base):
     """Analytics metrics"""
     __tablename__ = "metrics"
+    __table_args__ = (
+        # Time-bucketed history per project/metric (migration 014)
+        Index('ix_metrics_project_name_timestamp', 'project_id', 'metric_name', 'timestamp'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, nullable=True)
@@ -97,6 +101,10 @@ class Metric(Base):
 class GenerationJob(Base):
     """AI Generation jobs tracking for cost monitoring"""
     __tablename__ = "gen_jobs"
+    __table_args__ = (
+        # Per-user cost/usage aggregation over a time range (migration 008)
+        Index('ix_gen_jobs_user_created_status', 'user_id', 'created_at', 'status'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=True)
@@ -114,6 +122,57 @@ class GenerationJob(Base):
     completed_at = Column(DateTime, nullable=True)
 
 
+class CostLedger(Base):
+    """
+    Daily cost totals per (day, user, model, segment, job_type)
+
+    Rows are only ever incremented (INSERT ... ON CONFLICT DO UPDATE, see cost_ledger.py)
+    when a generation job completes or a prompt cache hit is served, so cost reads are
+    O(days) instead of O(jobs). `jobs` counts generations (cache misses); cache hits
+    carry the cost of the original generation they replaced in `cost_saved_usd`.
+    user_id / segment_id use 0 for "none" so they can be part of the primary key.
+    """
+    __tablename__ = "cost_ledger"
+    __table_args__ = (
+        Index('ix_cost_ledger_user_day', 'user_id', 'day'),
+    )
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True, default=0)
+    model = Column(String(100), primary_key=True)
+    segment_id = Column(Integer, primary_key=True, default=0)
+    job_type = Column(String(50), primary_key=True)  # 'text' or 'image'
+    jobs = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+    cache_hits = Column(Integer, nullable=False, default=0)
+    cost_saved_usd = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class JobWatermark(Base):
+    """Progress marker of an incremental batch job (e.g. events processed up to `watermark`)"""
+    __tablename__ = "job_watermarks"
+
+    job_name = Column(String(100), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ArchiveManifest(Base):
+    """One archived month of a table: a Parquet file in storage (see archival.py)"""
+    __tablename__ = "archive_manifest"
+
+    table_name = Column(String(100), primary_key=True)  # 'events', 'gen_jobs', 'generated_content', 'metrics'
+    month = Column(Date, primary_key=True)  # First day of the archived month
+    path = Column(Text, nullable=False)  # Object path inside ARCHIVE_STORAGE_BUCKET
+    row_count = Column(BigInteger, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class UserQuota(Base):
     """User quota tracking for cost and usage limits"""
     __tablename__ = "user_quotas"
@@ -181,29 +240,75 @@ class Creative(Base):
 
 
 class Event(Base):
-    """Event tracking for impressions, clicks, and conversions"""
+    """Event tracking for impressions, clicks, and conversions
+
+    Partitioned by month on created_at (see migration 007 and event_partitions.py),
+    so the partition key is part of the primary key.
+    """
     __tablename__ = "events"
+    __table_args__ = (
+        Index('ix_events_campaign_created_type', 'campaign_id', 'created_at', 'event_type'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
     creative_id = Column(Integer, ForeignKey('creatives.id'), nullable=True, index=True)
-    event_type = Column(String(50), nullable=False, index=True)  # 'impression', 'click', 'conversion'
-    user_id = Column(Integer, nullable=True, index=True)
+    event_type = Column(String(50), nullable=False)  # 'impression', 'click', 'conversion'
+    user_id = Column(Integer, nullable=True)
     session_id = Column(String(255), nullable=True, index=True)
     ip_address = Column(String(45), nullable=True)  # IPv4 or IPv6
+    # Legacy free-text columns; new rows store dimension ids instead (event_dimensions.py)
     user_agent = Column(Text, nullable=True)
     referrer = Column(Text, nullable=True)
     landing_url = Column(Text, nullable=True)
+    user_agent_id = Column(Integer, nullable=True)  # dim_user_agents.id
+    referrer_id = Column(Integer, nullable=True)  # dim_referrers.id
+    landing_url_id = Column(Integer, nullable=True)  # dim_landing_urls.id
     channel = Column(String(50), nullable=True)  # Track channel at event level
     segment_id = Column(Integer, nullable=True, index=True)  # User segment
     meta_data = Column(JSON, nullable=True)  # Additional event data
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
 
     # Relationships
     campaign = relationship("Campaign", back_populates="events")
     creative = relationship("Creative", back_populates="events")
 
 
+class DimUserAgent(Base):
+    """Distinct User-Agent strings, enriched in the background with device/browser/os"""
+    __tablename__ = "dim_user_agents"
+
+    id = Column(Integer, primary_key=True)
+    value_hash = Column(String(32), nullable=False, unique=True)  # md5(value), keeps the unique index small
+    value = Column(Text, nullable=False)
+    device_type = Column(String(20), nullable=True)  # 'desktop', 'mobile', 'tablet', 'bot'
+    browser = Column(String(50), nullable=True)
+    os = Column(String(50), nullable=True)
+    parsed_at = Column(DateTime, nullable=True)  # NULL until enriched
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DimReferrer(Base):
+    """Distinct referrer URLs"""
+    __tablename__ = "dim_referrers"
+
+    id = Column(Integer, primary_key=True)
+    value_hash = Column(String(32), nullable=False, unique=True)
+    value = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DimLandingUrl(Base):
+    """Distinct landing URLs"""
+    __tablename__ = "dim_landing_urls"
+
+    id = Column(Integer, primary_key=True)
+    value_hash = Column(String(32), nullable=False, unique=True)
+    value = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class PromptTemplate(Base):
     """Reusable prompt templates for content generation"""
     __tablename__ = "prompt_templates"
@@ -0,0 +1,226 @@
+"""
+Embedding Micro-Batcher
+Coalesces single-text embedding calls from concurrent requests into one multi-input
+embeddings request per short window, with batch-size and wait-time histograms
+"""
+import os
+import time
+import queue
+import threading
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("embedding_batcher")
+
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "8"))  # 0 = disabled
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "256"))
+EMBEDDING_BATCH_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_BATCH_MAX_IN_FLIGHT", "4"))
+# Seconds a caller waits for its batch (queueing + provider request)
+EMBEDDING_BATCH_TIMEOUT = float(os.getenv("EMBEDDING_BATCH_TIMEOUT", "60"))
+# Per-model overrides: "model:window_ms:max_size,..."
+EMBEDDING_BATCHER_MODELS = os.getenv("EMBEDDING_BATCHER_MODELS", "")
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+WAIT_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500)
+
+
+@dataclass(frozen=True)
+class BatcherConfig:
+    window_ms: float = EMBEDDING_BATCH_WINDOW_MS
+    max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE
+    max_in_flight: int = EMBEDDING_BATCH_MAX_IN_FLIGHT
+
+
+def _parse_model_overrides(raw: str) -> Dict[str, BatcherConfig]:
+    overrides = {}
+    for entry in filter(None, (part.strip() for part in raw.split(","))):
+        try:
+            model, window_ms, max_size = entry.rsplit(":", 2)
+            overrides[model] = BatcherConfig(float(window_ms), int(max_size))
+        except ValueError:
+            logger.warning(f"Ignoring malformed EMBEDDING_BATCHER_MODELS entry: {entry}")
+    return overrides
+
+
+MODEL_CONFIGS = _parse_model_overrides(EMBEDDING_BATCHER_MODELS)
+
+
+def batcher_config(model: str) -> BatcherConfig:
+    """Window / batch size for a model (EMBEDDING_BATCHER_MODELS override or defaults)"""
+    return MODEL_CONFIGS.get(model, BatcherConfig())
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram (Prometheus-style upper bounds)"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+                "buckets": {
+                    **{f"le_{bound}": n for bound, n in zip(self.buckets, self.counts)},
+                    "inf": self.counts[-1]
+                }
+            }
+
+
+class EmbeddingBatcher:
+    """
+    Collects embed() calls from many threads and sends them as multi-input requests
+
+    The first text to arrive opens a window; the batch is dispatched when the window
+    (window_ms) closes or max_batch_size texts are waiting, whichever comes first.
+    Identical texts within a batch are embedded once. Up to max_in_flight batches
+    are dispatched concurrently; every caller gets its own vector (or the error).
+    """
+
+    def __init__(self, model: str, embed_fn: Callable[[List[str]], List[List[float]]], config: Optional[BatcherConfig] = None):
+        self.model = model
+        self.embed_fn = embed_fn
+        self.config = config or batcher_config(model)
+
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_in_flight, thread_name_prefix=f"embed-{model}"
+        )
+        self._in_flight = threading.BoundedSemaphore(self.config.max_in_flight)
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.window_ms > 0 and self.config.max_batch_size > 1
+
+    def embed(self, text: str) -> List[float]:
+        """Embedding of one text, batched with concurrent callers (TimeoutError after EMBEDDING_BATCH_TIMEOUT)"""
+        if not self.enabled:
+            return self.embed_fn([text])[0]
+        return self.submit(text).result(timeout=EMBEDDING_BATCH_TIMEOUT)
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def _ensure_started(self) -> None:
+        if self._started:
+            return
+        with self._start_lock:
+            if not self._started:
+                threading.Thread(target=self._collect_loop, name=f"embed-batcher-{self.model}", daemon=True).start()
+                self._started = True
+
+    def _collect_loop(self) -> None:
+        window = self.config.window_ms / 1000
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + window
+            while len(batch) < self.config.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Backpressure: with max_in_flight requests outstanding, keep collecting
+            # into the next (larger) batch instead of opening more connections
+            self._in_flight.acquire()
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[Tuple[str, Future, float]]) -> None:
+        try:
+            dispatched_at = time.perf_counter()
+            positions: Dict[str, int] = {}
+            for text, _, enqueued_at in batch:
+                positions.setdefault(text, len(positions))
+                self.wait_ms.observe((dispatched_at - enqueued_at) * 1000)
+
+            self.batch_sizes.observe(len(positions))
+
+            embeddings = self.embed_fn(list(positions))
+            if len(embeddings) != len(positions):
+                raise ValueError(f"{self.model} returned {len(embeddings)} embeddings for {len(positions)} texts")
+            for text, future, _ in batch:
+                future.set_result(embeddings[positions[text]])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Never leave a caller waiting (e.g. BaseException in embed_fn)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError(f"{self.model} embedding batch was not completed"))
+            self._in_flight.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "enabled": self.enabled,
+            "window_ms": self.config.window_ms,
+            "max_batch_size": self.config.max_batch_size,
+            "requests": self.batch_sizes.count,
+            "texts_embedded": int(self.batch_sizes.sum),
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot()
+        }
+
+
+# 모델별 배처 (프로세스당 하나)
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(
+    key: str,
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    default_window_ms: Optional[float] = None,
+    model: Optional[str] = None
+) -> EmbeddingBatcher:
+    """
+    Get or create the batcher of an embedding provider
+
+    `key` identifies the batcher (e.g. "openai:text-embedding-ada-002"); the
+    EMBEDDING_BATCHER_MODELS override is looked up by `model` (default: key).
+    default_window_ms applies without an override.
+    """
+    with _batchers_lock:
+        if key not in _batchers:
+            config = MODEL_CONFIGS.get(model or key)
+            if config is None and default_window_ms is not None:
+                config = BatcherConfig(window_ms=default_window_ms)
+            _batchers[key] = EmbeddingBatcher(key, embed_fn, config)
+        return _batchers[key]
+
+
+def embedding_batcher_stats() -> List[Dict[str, Any]]:
+    """Histograms and counters of every batcher"""
+    return [batcher.stats() for batcher in list(_batchers.values())]
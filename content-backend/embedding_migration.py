@@ -0,0 +1,64 @@
+"""
+Embedding Migration
+Re-embeds an existing Chroma collection with another embedding provider: documents and
+metadata are copied page by page into a staging collection that replaces the original
+"""
+from typing import Dict, Any
+
+from dotenv import load_dotenv
+
+from embedding_providers import get_embedding_provider, EMBEDDING_PROVIDERS
+from vector_client import get_vector_client, VectorDBClient
+from vector_index import rebuild_collection, hnsw_metadata
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("embedding_migration")
+
+
+def migrate_collection(name: str, provider_name: str, batch_size: int = 500) -> Dict[str, Any]:
+    """
+    Re-embed every document of a collection with `provider_name`
+
+    Vectors of different providers have different dimensions, so they cannot be
+    updated in place: see vector_index.rebuild_collection. The rebuilt collection
+    also picks up the configured HNSW settings.
+
+    Raises:
+        RuntimeError: Source changed during the migration
+    """
+    client = get_vector_client().client
+    provider = get_embedding_provider(provider_name)
+
+    metadata = dict(client.get_collection(name).metadata or {})
+    if metadata.get("embedding_provider") == provider.name and metadata.get("embedding_model") == provider.model:
+        logger.info(f"{name} is already embedded with {provider.key}")
+        return {"collection": name, "provider": provider.key, "documents": 0, "skipped": True}
+
+    result = rebuild_collection(
+        client, name,
+        {**metadata, **hnsw_metadata(name), "embedding_provider": provider.name, "embedding_model": provider.model},
+        embed=provider.embed,
+        batch_size=batch_size
+    )
+    return {**result, "provider": provider.key}
+
+
+def main():
+    """Re-embed collections (restart the API workers afterwards)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-embed Chroma collections with another embedding provider")
+    parser.add_argument("--collection", choices=list(VectorDBClient.COLLECTIONS), action="append", help="Collections to migrate (default: all)")
+    parser.add_argument("--provider", choices=list(EMBEDDING_PROVIDERS), required=True)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    for name in args.collection or VectorDBClient.COLLECTIONS:
+        result = migrate_collection(name, args.provider, args.batch_size)
+        logger.info(f"✅ {result}")
+
+
+if __name__ == "__main__":
+    main()
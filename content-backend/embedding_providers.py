@@ -0,0 +1,204 @@
+"""
+Embedding Providers
+Pluggable text embedding backends: OpenAI (network) and a local CPU sentence-transformers
+model, selectable per Chroma collection
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("embedding_providers")
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# One embeddings request carries at most 2048 inputs; stay well under the per-request token cap
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+# Default provider and per-collection overrides ("collection:provider,...")
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_COLLECTION_PROVIDERS = os.getenv("EMBEDDING_COLLECTION_PROVIDERS", "")
+
+# Local model: a sentence-transformers directory (e.g. paraphrase-multilingual-MiniLM-L12-v2)
+LOCAL_EMBEDDING_MODEL_PATH = os.getenv("LOCAL_EMBEDDING_MODEL_PATH", "./models/paraphrase-multilingual-MiniLM-L12-v2")
+LOCAL_EMBEDDING_BACKEND = os.getenv("LOCAL_EMBEDDING_BACKEND", "torch")  # 'torch' or 'onnx'
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))
+# Local inference is ~ms per text, so the micro-batch window is kept short
+LOCAL_EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("LOCAL_EMBEDDING_BATCH_WINDOW_MS", "2"))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Upper-bound token estimate without a tokenizer
+
+    cl100k averages ~4 bytes per token for English and ~1 token per 3-byte Hangul
+    syllable, so UTF-8 bytes / 3 rarely undercounts.
+    """
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def embedding_batches(
+    texts: List[str],
+    max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+    max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS
+) -> List[tuple]:
+    """Split texts into consecutive (start, end) ranges within the request limits"""
+    batches = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= max_inputs or tokens + cost > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+class EmbeddingProvider:
+    """Interface: embed(texts) -> vectors in the order of texts"""
+
+    name: str = ""
+    model: str = ""
+    # Micro-batch window for single-text calls (None = EMBEDDING_BATCH_WINDOW_MS)
+    batch_window_ms: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        """Identifier recorded on collections embedded by this provider"""
+        return f"{self.name}:{self.model}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API with token-aware batching and concurrent requests"""
+
+    name = "openai"
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        from openai import OpenAI
+
+        self.model = model
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            logger.warning("OpenAI API key not found. Embeddings will fail.")
+        self.client = OpenAI(api_key=api_key) if api_key else None
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        # The API tags every embedding with the position of its input
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many texts with as few requests as possible
+
+        Texts are split into token-aware batches (EMBEDDING_BATCH_MAX_INPUTS /
+        EMBEDDING_BATCH_MAX_TOKENS) that are sent concurrently.
+        """
+        if not self.client:
+            raise ValueError("OpenAI client not initialized")
+        if not texts:
+            return []
+
+        batches = [texts[start:end] for start, end in embedding_batches(texts)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+
+        with ThreadPoolExecutor(max_workers=min(EMBEDDING_CONCURRENCY, len(batches))) as executor:
+            results = list(executor.map(self._embed_batch, batches))
+        return [embedding for batch in results for embedding in batch]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    sentence-transformers model loaded from a local directory, run on CPU
+
+    Requires the optional `sentence-transformers` package (plus `onnxruntime` for the
+    onnx backend). Inference releases the GIL, so calls run in the caller's worker
+    thread; LOCAL_EMBEDDING_WORKERS bounds how many encode at once so the CPU is not
+    oversubscribed. Vectors are L2-normalized.
+    """
+
+    name = "local"
+    batch_window_ms = LOCAL_EMBEDDING_BATCH_WINDOW_MS
+
+    def __init__(self, model_path: str = LOCAL_EMBEDDING_MODEL_PATH, backend: str = LOCAL_EMBEDDING_BACKEND):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = os.path.basename(os.path.normpath(model_path))
+        kwargs = {"backend": backend} if backend != "torch" else {}
+        self._model = SentenceTransformer(model_path, device="cpu", **kwargs)
+        self._slots = threading.BoundedSemaphore(LOCAL_EMBEDDING_WORKERS)
+        logger.info(f"Loaded local embedding model {self.model} ({backend}, dim={self._model.get_sentence_embedding_dimension()})")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        with self._slots:
+            vectors = self._model.encode(
+                texts,
+                batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return vectors.tolist()
+
+
+EMBEDDING_PROVIDERS = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    LocalEmbeddingProvider.name: LocalEmbeddingProvider,
+}
+
+
+def _parse_collection_providers(raw: str) -> Dict[str, str]:
+    overrides = {}
+    for entry in filter(None, (part.strip() for part in raw.split(","))):
+        collection, _, provider = entry.partition(":")
+        if provider not in EMBEDDING_PROVIDERS:
+            logger.warning(f"Ignoring EMBEDDING_COLLECTION_PROVIDERS entry with unknown provider: {entry}")
+            continue
+        overrides[collection] = provider
+    return overrides
+
+
+COLLECTION_PROVIDERS = _parse_collection_providers(EMBEDDING_COLLECTION_PROVIDERS)
+
+
+def configured_provider(collection_name: str) -> str:
+    """Provider name configured for a collection (override or EMBEDDING_PROVIDER)"""
+    return COLLECTION_PROVIDERS.get(collection_name, EMBEDDING_PROVIDER)
+
+
+# 프로바이더 인스턴스 (프로세스당 하나, 로컬 모델은 한 번만 로드)
+_providers: Dict[str, EmbeddingProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Get or create a provider instance
+
+    Raises:
+        ValueError: Unknown provider name
+    """
+    name = name or EMBEDDING_PROVIDER
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{name}' (expected one of {', '.join(EMBEDDING_PROVIDERS)})")
+
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = EMBEDDING_PROVIDERS[name]()
+        return _providers[name]
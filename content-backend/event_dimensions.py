@@ -0,0 +1,277 @@
+"""
+Event Dimensions
+Dictionary encoding of repetitive event strings (user agent, referrer, landing URL)
+into small integer ids, with per-process LRU interning and background user-agent parsing
+"""
+import os
+import re
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional
+
+from sqlalchemy import select, update, text, func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from dotenv import load_dotenv
+
+from database import engine, SessionLocal, Event, DimUserAgent, DimReferrer, DimLandingUrl
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("event_dimensions")
+
+DIM_CACHE_SIZE = int(os.getenv("DIM_CACHE_SIZE", "10000"))  # entries per dimension, per worker
+UA_ENRICH_INTERVAL = int(os.getenv("UA_ENRICH_INTERVAL", "60"))
+UA_ENRICH_BATCH_SIZE = int(os.getenv("UA_ENRICH_BATCH_SIZE", "1000"))
+
+# events.<name> (legacy text) / events.<name>_id -> dimension table
+EVENT_DIMENSIONS = {
+    "user_agent": DimUserAgent,
+    "referrer": DimReferrer,
+    "landing_url": DimLandingUrl,
+}
+
+
+def value_hash(value: str) -> str:
+    """md5 hex digest; matches Postgres md5(text) for the backfill"""
+    return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=DIM_CACHE_SIZE)
+def derive_session_id(ip_address: Optional[str], user_agent: Optional[str]) -> str:
+    """Fallback session id from IP + User-Agent (memoized; same values as before)"""
+    return hashlib.md5(f"{ip_address}{user_agent}".encode()).hexdigest()[:16]
+
+
+class InternCache:
+    """
+    LRU map of string -> id for one dimension table
+
+    A miss inserts the value (or finds the existing row) in its own short
+    transaction, so ids handed out never depend on the caller's commit.
+    """
+
+    def __init__(self, model, maxsize: int = DIM_CACHE_SIZE):
+        self.table = model.__table__
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup_or_insert(self, value: str) -> int:
+        digest = value_hash(value)
+        with engine.begin() as conn:
+            dim_id = conn.execute(
+                insert(self.table)
+                .values(value_hash=digest, value=value, created_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=["value_hash"])
+                .returning(self.table.c.id)
+            ).scalar()
+            if dim_id is None:
+                dim_id = conn.execute(
+                    select(self.table.c.id).where(self.table.c.value_hash == digest)
+                ).scalar_one()
+        return dim_id
+
+    def intern(self, value: Optional[str]) -> Optional[int]:
+        """Id for a string, creating the dimension row on first sight"""
+        if not value:
+            return None
+
+        with self._lock:
+            dim_id = self._ids.get(value)
+            if dim_id is not None:
+                self._ids.move_to_end(value)
+                self.hits += 1
+                return dim_id
+            self.misses += 1
+
+        dim_id = self._lookup_or_insert(value)
+
+        with self._lock:
+            self._ids[value] = dim_id
+            self._ids.move_to_end(value)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+        return dim_id
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._ids), "hits": self.hits, "misses": self.misses}
+
+
+_caches = {name: InternCache(model) for name, model in EVENT_DIMENSIONS.items()}
+
+
+def event_dimension_ids(
+    user_agent: Optional[str] = None,
+    referrer: Optional[str] = None,
+    landing_url: Optional[str] = None
+) -> Dict[str, Optional[int]]:
+    """Event column values (`user_agent_id`, `referrer_id`, `landing_url_id`) for the given strings"""
+    return {
+        "user_agent_id": _caches["user_agent"].intern(user_agent),
+        "referrer_id": _caches["referrer"].intern(referrer),
+        "landing_url_id": _caches["landing_url"].intern(landing_url),
+    }
+
+
+def intern_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+# ---------- user-agent enrichment ----------
+
+_BOT_RE = re.compile(r"bot|crawl|spider|slurp|facebookexternalhit|headless|preview", re.I)
+_TABLET_RE = re.compile(r"iPad|Tablet|PlayBook|Silk|Kindle", re.I)
+_MOBILE_RE = re.compile(r"Mobi|iPhone|iPod|Android|Windows Phone", re.I)
+
+# First match wins, so more specific tokens come first
+_BROWSERS = [
+    ("Edge", re.compile(r"Edg(e|A|iOS)?/")),
+    ("Opera", re.compile(r"OPR/|Opera")),
+    ("Samsung Internet", re.compile(r"SamsungBrowser/")),
+    ("Chrome", re.compile(r"Chrome/|CriOS/")),
+    ("Firefox", re.compile(r"Firefox/|FxiOS/")),
+    ("Safari", re.compile(r"Safari/")),
+    ("Internet Explorer", re.compile(r"MSIE |Trident/")),
+]
+_OPERATING_SYSTEMS = [
+    ("iOS", re.compile(r"iPhone|iPad|iPod")),
+    ("Android", re.compile(r"Android")),
+    ("Windows", re.compile(r"Windows")),
+    ("macOS", re.compile(r"Mac OS X|Macintosh")),
+    ("ChromeOS", re.compile(r"CrOS")),
+    ("Linux", re.compile(r"Linux")),
+]
+
+
+def parse_user_agent(value: str) -> Dict[str, Optional[str]]:
+    """Coarse device type, browser family and OS family of a User-Agent string"""
+    if _BOT_RE.search(value):
+        device_type = "bot"
+    elif _TABLET_RE.search(value) or ("Android" in value and "Mobile" not in value):
+        device_type = "tablet"
+    elif _MOBILE_RE.search(value):
+        device_type = "mobile"
+    else:
+        device_type = "desktop"
+
+    browser = next((name for name, pattern in _BROWSERS if pattern.search(value)), None)
+    os_name = next((name for name, pattern in _OPERATING_SYSTEMS if pattern.search(value)), None)
+    return {"device_type": device_type, "browser": browser, "os": os_name}
+
+
+def enrich_user_agents(db: Session, batch_size: int = UA_ENRICH_BATCH_SIZE) -> int:
+    """Parse one batch of not-yet-parsed user agents; returns the number parsed"""
+    rows = db.query(DimUserAgent.id, DimUserAgent.value).filter(
+        DimUserAgent.parsed_at.is_(None)
+    ).order_by(DimUserAgent.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not rows:
+        return 0
+
+    now = datetime.utcnow()
+    db.execute(update(DimUserAgent), [
+        {"id": row.id, "parsed_at": now, **parse_user_agent(row.value)}
+        for row in rows
+    ])
+    db.commit()
+    return len(rows)
+
+
+def run_user_agent_enrichment(batch_size: int = UA_ENRICH_BATCH_SIZE) -> int:
+    """Parse all pending user agents in batches with its own session"""
+    db = SessionLocal()
+    try:
+        total = 0
+        while True:
+            parsed = enrich_user_agents(db, batch_size)
+            total += parsed
+            if parsed < batch_size:
+                return total
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def user_agent_enrichment_loop(interval: int = UA_ENRICH_INTERVAL):
+    """Background loop started from the FastAPI startup hook"""
+    while True:
+        try:
+            parsed = await asyncio.to_thread(run_user_agent_enrichment)
+            if parsed:
+                logger.info(f"Parsed {parsed} new user agents")
+        except Exception as e:
+            logger.error(f"User agent enrichment failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+# ---------- backfill of legacy rows ----------
+
+def backfill_month(db: Session, month_start: datetime, month_end: datetime) -> int:
+    """
+    Move one month of legacy text columns into the dimension tables
+
+    Returns:
+        Number of events rewritten
+    """
+    params = {"start": month_start, "end": month_end}
+    for name, model in EVENT_DIMENSIONS.items():
+        db.execute(text(f"""
+            INSERT INTO {model.__tablename__} (value_hash, value, created_at)
+            SELECT DISTINCT ON (md5({name})) md5({name}), {name}, now()
+            FROM events
+            WHERE {name} IS NOT NULL AND created_at >= :start AND created_at < :end
+            ON CONFLICT (value_hash) DO NOTHING
+        """), params)
+
+    assignments = ",\n".join(
+        f"{name}_id = COALESCE({name}_id, "
+        f"(SELECT id FROM {model.__tablename__} WHERE value_hash = md5(events.{name}))), {name} = NULL"
+        for name, model in EVENT_DIMENSIONS.items()
+    )
+    result = db.execute(text(f"""
+        UPDATE events SET {assignments}
+        WHERE created_at >= :start AND created_at < :end
+          AND (user_agent IS NOT NULL OR referrer IS NOT NULL OR landing_url IS NOT NULL)
+    """), params)
+    db.commit()
+    return result.rowcount
+
+
+def main():
+    """Backfill dimension ids for events written before dictionary encoding (one month per transaction)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Event dimension maintenance")
+    parser.add_argument("--backfill", action="store_true", help="Move legacy user_agent/referrer/landing_url text into dimension tables")
+    parser.add_argument("--enrich", action="store_true", help="Parse pending user agents now")
+    args = parser.parse_args()
+
+    if args.backfill:
+        db = SessionLocal()
+        try:
+            oldest, newest = db.query(func.min(Event.created_at), func.max(Event.created_at)).one()
+            month = oldest.replace(day=1, hour=0, minute=0, second=0, microsecond=0) if oldest else None
+            while month is not None and month <= newest:
+                next_month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+                rewritten = backfill_month(db, month, next_month)
+                logger.info(f"Backfilled {month:%Y-%m}: {rewritten} events")
+                month = next_month
+        finally:
+            db.close()
+        logger.info("✅ Backfill finished; run VACUUM (or pg_repack) on events partitions to reclaim space")
+
+    if args.enrich or args.backfill:
+        logger.info(f"✅ Parsed {run_user_agent_enrichment()} user agents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Event Partition Management
+Creates future monthly partitions of the events table and applies retention to old ones
+"""
+import os
+import re
+import asyncio
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Set
+
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+from database import engine
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("event_partitions")
+
+# Partition settings
+EVENTS_PARTITION_PREMAKE_MONTHS = int(os.getenv("EVENTS_PARTITION_PREMAKE_MONTHS", "3"))
+EVENTS_RETENTION_MONTHS = int(os.getenv("EVENTS_RETENTION_MONTHS", "13"))  # 0 = keep forever
+EVENTS_RETENTION_MODE = os.getenv("EVENTS_RETENTION_MODE", "archive")  # 'archive', 'detach', 'drop'
+EVENTS_ARCHIVE_SCHEMA = os.getenv("EVENTS_ARCHIVE_SCHEMA", "events_archive")
+EVENTS_PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("EVENTS_PARTITION_MAINTENANCE_INTERVAL", "21600"))  # 6 hours
+
+PARENT_TABLE = "events"
+DEFAULT_PARTITION = "events_default"
+PARTITION_NAME_RE = re.compile(r"^events_y(\d{4})m(\d{2})$")
+
+# Serializes maintenance across workers/replicas
+ADVISORY_LOCK_KEY = 72026001
+
+
+def month_start(value: datetime) -> datetime:
+    """Truncate a datetime to the first instant of its month"""
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """Shift a month-start datetime by N months"""
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    """Partition table name for a month (events_yYYYYmMM)"""
+    return f"events_y{month.year:04d}m{month.month:02d}"
+
+
+def parse_partition_month(name: str) -> Optional[datetime]:
+    """Inverse of partition_name(); None for the default partition or foreign tables"""
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned(conn) -> bool:
+    """True if the events table is a partitioned parent"""
+    if conn.dialect.name != "postgresql":
+        return False
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+        {"name": PARENT_TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(conn) -> List[str]:
+    """Names of partitions currently attached to events"""
+    return conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'events'::regclass
+        ORDER BY c.relname
+    """)).scalars().all()
+
+
+def _create_partition(conn, month: datetime, has_default: bool) -> None:
+    """
+    Create one monthly partition
+
+    Rows already sitting in the default partition for this range would make
+    CREATE ... PARTITION OF fail, so they are moved into the new partition first.
+    """
+    name = partition_name(month)
+    lower = month.isoformat()
+    upper = add_months(month, 1).isoformat()
+
+    stray_rows = 0
+    if has_default:
+        stray_rows = conn.execute(
+            text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE created_at >= :lower AND created_at < :upper"),
+            {"lower": lower, "upper": upper}
+        ).scalar()
+
+    if stray_rows:
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        ))
+        conn.execute(
+            text(f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE created_at >= :lower AND created_at < :upper
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """),
+            {"lower": lower, "upper": upper}
+        )
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+        logger.info(f"Created partition {name} and moved {stray_rows} rows out of {DEFAULT_PARTITION}")
+    else:
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        ))
+        logger.info(f"Created partition {name}")
+
+
+def ensure_future_partitions(conn, months_ahead: int = EVENTS_PARTITION_PREMAKE_MONTHS) -> List[str]:
+    """
+    Make sure partitions exist for the current month and the next N months
+
+    Returns:
+        Names of partitions created
+    """
+    existing = set(list_partitions(conn))
+    created = []
+
+    current = month_start(datetime.utcnow())
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if partition_name(month) not in existing:
+            _create_partition(conn, month, DEFAULT_PARTITION in existing)
+            created.append(partition_name(month))
+
+    if DEFAULT_PARTITION not in existing:
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+
+    return created
+
+
+def archived_event_months(conn) -> Set[date]:
+    """Months of events already written to Parquet by archival.py (archive_manifest)"""
+    return set(conn.execute(
+        text("SELECT month FROM archive_manifest WHERE table_name = :table"), {"table": PARENT_TABLE}
+    ).scalars().all())
+
+
+def apply_retention(
+    conn,
+    retention_months: int = EVENTS_RETENTION_MONTHS,
+    mode: str = EVENTS_RETENTION_MODE,
+    require_archived: Optional[bool] = None
+) -> List[Dict[str, Any]]:
+    """
+    Detach partitions whose whole month is older than the retention window
+
+    Args:
+        retention_months: Months of events to keep attached (0 disables retention)
+        mode: 'archive' (detach and move to the archive schema),
+              'detach' (detach and leave in place) or 'drop'
+        require_archived: Only retire months recorded in archive_manifest, so
+              archival.py always gets to export them first (default: whenever
+              archival is enabled, i.e. ARCHIVE_HORIZON_MONTHS > 0)
+
+    Returns:
+        List of {"partition", "month", "action"} dicts
+    """
+    if retention_months <= 0:
+        return []
+    if mode not in ("archive", "detach", "drop"):
+        raise ValueError(f"Unknown retention mode: {mode}")
+    if require_archived is None:
+        from archival import ARCHIVE_HORIZON_MONTHS
+        require_archived = ARCHIVE_HORIZON_MONTHS > 0
+
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    archived = archived_event_months(conn) if require_archived else None
+    actions = []
+
+    for name in list_partitions(conn):
+        month = parse_partition_month(name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        if archived is not None and month.date() not in archived:
+            logger.info(f"Retention: keeping {name} until it is archived")
+            continue
+
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+
+        if mode == "archive":
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {EVENTS_ARCHIVE_SCHEMA}"))
+            conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {EVENTS_ARCHIVE_SCHEMA}"))
+        elif mode == "drop":
+            conn.execute(text(f"DROP TABLE {name}"))
+
+        actions.append({"partition": name, "month": month.strftime("%Y-%m"), "action": mode})
+        logger.info(f"Retention: {mode} partition {name}")
+
+    return actions
+
+
+def run_partition_maintenance(
+    months_ahead: int = EVENTS_PARTITION_PREMAKE_MONTHS,
+    retention_months: int = EVENTS_RETENTION_MONTHS,
+    mode: str = EVENTS_RETENTION_MODE
+) -> Dict[str, Any]:
+    """
+    Create upcoming partitions and apply retention in one transaction
+
+    Uses a transaction-level advisory lock so concurrent workers skip instead of racing.
+    """
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return {"skipped": True, "reason": "events table is not partitioned"}
+
+        locked = conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+        if not locked:
+            return {"skipped": True, "reason": "maintenance already running"}
+
+        created = ensure_future_partitions(conn, months_ahead)
+        retired = apply_retention(conn, retention_months, mode)
+
+    return {"skipped": False, "created": created, "retired": retired}
+
+
+async def partition_maintenance_loop(interval: int = EVENTS_PARTITION_MAINTENANCE_INTERVAL):
+    """Background loop started from the FastAPI startup hook"""
+    while True:
+        try:
+            result = await asyncio.to_thread(run_partition_maintenance)
+            if not result.get("skipped"):
+                logger.info(f"Partition maintenance: created={result['created']}, retired={len(result['retired'])}")
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+def main():
+    """Run partition maintenance once (cron / manual use)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of the events table")
+    parser.add_argument("--months-ahead", type=int, default=EVENTS_PARTITION_PREMAKE_MONTHS)
+    parser.add_argument("--retention-months", type=int, default=EVENTS_RETENTION_MONTHS)
+    parser.add_argument("--mode", choices=["archive", "detach", "drop"], default=EVENTS_RETENTION_MODE)
+    args = parser.parse_args()
+
+    result = run_partition_maintenance(args.months_ahead, args.retention_months, args.mode)
+    logger.info(f"✅ Partition maintenance finished: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Event Stream
+Publishes tracked events to a Redis stream and runs consumer-group loops over it
+"""
+import os
+import socket
+import asyncio
+from datetime import datetime
+from typing import Optional, Callable, List, Tuple, Dict
+
+from dotenv import load_dotenv
+
+from cache import get_cache
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("event_stream")
+
+# Stream settings
+EVENTS_STREAM_KEY = os.getenv("EVENTS_STREAM_KEY", "events:stream")
+EVENTS_STREAM_MAXLEN = int(os.getenv("EVENTS_STREAM_MAXLEN", "100000"))  # approximate trim
+EVENTS_STREAM_BATCH_SIZE = int(os.getenv("EVENTS_STREAM_BATCH_SIZE", "500"))
+EVENTS_STREAM_CLAIM_IDLE_MS = int(os.getenv("EVENTS_STREAM_CLAIM_IDLE_MS", "60000"))
+
+# One consumer name per worker process
+CONSUMER_NAME = f"{socket.gethostname()}-{os.getpid()}"
+
+StreamEntry = Tuple[str, Dict[str, str]]
+
+
+def publish_event(
+    campaign_id: int,
+    event_type: str,
+    creative_id: Optional[int] = None,
+    segment_id: Optional[int] = None,
+    created_at: Optional[datetime] = None
+) -> Optional[str]:
+    """
+    Append a tracked event to the stream (call after the event row is committed)
+
+    Best effort: tracking never fails because Redis is unavailable.
+
+    Returns:
+        Stream entry ID, or None if not published
+    """
+    cache = get_cache()
+    if not cache.enabled:
+        return None
+
+    fields = {
+        "campaign_id": campaign_id,
+        "event_type": event_type,
+        "creative_id": creative_id if creative_id is not None else "",
+        "segment_id": segment_id if segment_id is not None else "",
+        "ts": (created_at or datetime.utcnow()).isoformat()
+    }
+
+    try:
+        return cache.client.xadd(EVENTS_STREAM_KEY, fields, maxlen=EVENTS_STREAM_MAXLEN, approximate=True)
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to publish event to stream: {e}")
+        return None
+
+
+def last_stream_id() -> str:
+    """ID of the newest stream entry ('0-0' if the stream is empty)"""
+    cache = get_cache()
+    entries = cache.client.xrevrange(EVENTS_STREAM_KEY, count=1)
+    return entries[0][0] if entries else "0-0"
+
+
+def _ensure_group(client, group: str) -> None:
+    """Create the consumer group at the stream tail (no-op if it exists)"""
+    try:
+        client.xgroup_create(EVENTS_STREAM_KEY, group, id="$", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _read_batch(client, group: str, block_ms: int) -> List[StreamEntry]:
+    """Reclaim entries abandoned by dead consumers, else read new ones"""
+    try:
+        _, claimed, *_ = client.xautoclaim(
+            EVENTS_STREAM_KEY, group, CONSUMER_NAME,
+            min_idle_time=EVENTS_STREAM_CLAIM_IDLE_MS, start_id="0-0",
+            count=EVENTS_STREAM_BATCH_SIZE
+        )
+        claimed = [entry for entry in claimed if entry and entry[1]]
+        if claimed:
+            return claimed
+    except Exception as e:
+        logger.debug(f"XAUTOCLAIM unavailable: {e}")
+
+    response = client.xreadgroup(
+        group, CONSUMER_NAME, {EVENTS_STREAM_KEY: ">"},
+        count=EVENTS_STREAM_BATCH_SIZE, block=block_ms
+    )
+    return response[0][1] if response else []
+
+
+async def run_consumer(group: str, handler: Callable[[List[StreamEntry]], None], block_ms: int = 1000):
+    """
+    Consumer-group loop started from the FastAPI startup hook
+
+    Each group sees every event once across all workers. `handler` receives a
+    batch of (entry_id, fields) and runs in a thread; entries are acknowledged
+    after it returns, so a crashed batch is redelivered to another consumer.
+    """
+    cache = get_cache()
+    if not cache.enabled:
+        logger.warning(f"⚠️  Redis disabled, event stream consumer '{group}' not started")
+        return
+
+    while True:
+        try:
+            await asyncio.to_thread(_ensure_group, cache.client, group)
+            while True:
+                entries = await asyncio.to_thread(_read_batch, cache.client, group, block_ms)
+                if not entries:
+                    continue
+                await asyncio.to_thread(handler, entries)
+                await asyncio.to_thread(cache.client.xack, EVENTS_STREAM_KEY, group, *[entry_id for entry_id, _ in entries])
+        except Exception as e:
+            logger.error(f"Event stream consumer '{group}' failed: {e}", exc_info=True)
+            await asyncio.sleep(5)
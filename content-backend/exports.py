@@ -0,0 +1,313 @@
+"""
+Streaming Exports
+CSV / NDJSON / Parquet exports of events, gen_jobs, generated_content and metrics
+read through server-side cursors in fixed-size chunks (constant memory)
+"""
+import io
+import os
+import csv
+import sys
+import json
+from datetime import datetime, date
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, func, BigInteger, Integer, Float, Boolean, Date, DateTime, JSON
+from dotenv import load_dotenv
+
+from database import engine, Event, GenerationJob, GeneratedContent, Metric
+from event_dimensions import EVENT_DIMENSIONS
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("exports")
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "50000"))
+# generated_content rows carry whole results (image data URLs of several MB each)
+EXPORT_CONTENT_CHUNK_SIZE = int(os.getenv("EXPORT_CONTENT_CHUNK_SIZE", "100"))
+
+# dataset -> (model, time column, filterable columns besides the time range)
+EXPORT_DATASETS = {
+    "events": (Event, "created_at", ("campaign_id", "user_id")),
+    "gen_jobs": (GenerationJob, "created_at", ("user_id",)),
+    "generated_content": (GeneratedContent, "created_at", ()),
+    "metrics": (Metric, "timestamp", ("project_id",)),
+}
+
+# Rows per chunk where EXPORT_CHUNK_SIZE rows would not fit in memory
+EXPORT_CHUNK_SIZES = {
+    "generated_content": EXPORT_CONTENT_CHUNK_SIZE,
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _select_events():
+    """Events with dimension ids resolved back to strings, plus parsed user-agent fields"""
+    table = Event.__table__
+    dims = {name: model.__table__.alias(f"{name}_dim") for name, model in EVENT_DIMENSIONS.items()}
+    id_columns = {f"{name}_id" for name in EVENT_DIMENSIONS}
+
+    columns = []
+    for column in table.columns:
+        if column.name in dims:
+            # Rows written before dictionary encoding still carry the text
+            columns.append(func.coalesce(column, dims[column.name].c.value).label(column.name))
+        elif column.name not in id_columns:
+            columns.append(column)
+    user_agents = dims["user_agent"]
+    columns += [user_agents.c.device_type, user_agents.c.browser, user_agents.c.os]
+
+    joined = table
+    for name, dim in dims.items():
+        joined = joined.outerjoin(dim, dim.c.id == table.c[f"{name}_id"])
+    return select(*columns).select_from(joined)
+
+
+def export_query(
+    dataset: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    filters: Optional[Dict[str, Any]] = None
+):
+    """
+    Core SELECT of every column of a dataset (no ORM objects)
+
+    Raises:
+        ValueError: Unknown dataset or unsupported filter
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"Unknown dataset '{dataset}' (expected one of {', '.join(EXPORT_DATASETS)})")
+
+    model, time_column, filterable = EXPORT_DATASETS[dataset]
+    table = model.__table__
+    stmt = _select_events() if dataset == "events" else select(*table.columns)
+
+    if start_date:
+        stmt = stmt.where(table.c[time_column] >= start_date)
+    if end_date:
+        stmt = stmt.where(table.c[time_column] <= end_date)
+
+    for name, value in (filters or {}).items():
+        if value is None:
+            continue
+        if name not in filterable:
+            raise ValueError(f"Dataset '{dataset}' cannot be filtered by {name}")
+        stmt = stmt.where(table.c[name] == value)
+
+    # Events are partitioned by month: without ORDER BY, partitions are read in
+    # range order and rows stream out immediately instead of after a full sort
+    if dataset != "events":
+        stmt = stmt.order_by(table.c.id)
+    return stmt
+
+
+def export_chunk_size(dataset: str) -> int:
+    """Rows per server-side cursor batch (and Parquet row group) of a dataset"""
+    return EXPORT_CHUNK_SIZES.get(dataset, EXPORT_CHUNK_SIZE)
+
+
+def iter_chunks(stmt, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Sequence[Tuple]]:
+    """
+    Run a statement on a server-side cursor and yield lists of row tuples
+
+    Uses its own connection so it can outlive the request's session while a
+    StreamingResponse is still being sent.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(stmt)
+        for partition in result.partitions():
+            yield partition
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_csv(columns: List[Any], chunks: Iterator[Sequence[Tuple]]) -> Iterator[bytes]:
+    json_columns = [i for i, column in enumerate(columns) if isinstance(column.type, JSON)]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([column.name for column in columns])
+    for rows in chunks:
+        for row in rows:
+            if json_columns:
+                row = list(row)
+                for i in json_columns:
+                    if row[i] is not None:
+                        row[i] = json.dumps(row[i], ensure_ascii=False, default=_json_default)
+            writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header-only export when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(columns: List[Any], chunks: Iterator[Sequence[Tuple]]) -> Iterator[bytes]:
+    names = [column.name for column in columns]
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(names, row)), ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller instead of keeping them"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _arrow_schema(columns: List[Any]):
+    import pyarrow as pa
+
+    def arrow_type(column_type):
+        if isinstance(column_type, (BigInteger, Integer)):
+            return pa.int64()
+        if isinstance(column_type, Float):
+            return pa.float64()
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(column_type, Date):
+            return pa.date32()
+        return pa.string()  # String / Text / JSON (serialized)
+
+    return pa.schema([pa.field(column.name, arrow_type(column.type)) for column in columns])
+
+
+def _encode_parquet(columns: List[Any], chunks: Iterator[Sequence[Tuple]]) -> Iterator[bytes]:
+    """One Parquet row group per chunk, flushed to the caller as soon as it is written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(columns)
+    json_columns = {i for i, column in enumerate(columns) if isinstance(column.type, JSON)}
+    sink = _ChunkSink()
+
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in chunks:
+            arrays = []
+            for i, field in enumerate(schema):
+                values = [row[i] for row in rows]
+                if i in json_columns:
+                    values = [
+                        json.dumps(v, ensure_ascii=False, default=_json_default) if v is not None else None
+                        for v in values
+                    ]
+                arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+
+    # Footer
+    yield sink.drain()
+
+
+_ENCODERS = {
+    "csv": _encode_csv,
+    "ndjson": _encode_ndjson,
+    "parquet": _encode_parquet,
+}
+
+
+def encode_chunks(fmt: str, columns: List[Any], chunks: Iterator[Sequence[Tuple]]) -> Iterator[bytes]:
+    """Encode chunks of row tuples (matching `columns`) as csv / ndjson / parquet bytes"""
+    if fmt not in _ENCODERS:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of {', '.join(_ENCODERS)})")
+    return _ENCODERS[fmt](columns, chunks)
+
+
+def stream_export(
+    dataset: str,
+    fmt: str = "csv",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    chunk_size: Optional[int] = None
+) -> Iterator[bytes]:
+    """
+    Encoded export as an iterator of byte chunks
+
+    The query is validated eagerly; rows are only fetched when the iterator is consumed.
+    chunk_size defaults to export_chunk_size(dataset).
+
+    Raises:
+        ValueError: Unknown dataset / format or unsupported filter
+    """
+    if fmt not in _ENCODERS:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of {', '.join(_ENCODERS)})")
+
+    stmt = export_query(dataset, start_date, end_date, filters)
+    return encode_chunks(fmt, list(stmt.selected_columns), iter_chunks(stmt, chunk_size or export_chunk_size(dataset)))
+
+
+def export_filename(dataset: str, fmt: str) -> str:
+    return f"{dataset}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[fmt][1]}"
+
+
+def main():
+    """Export a dataset to a file or stdout"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream events / gen_jobs / generated_content / metrics to CSV, NDJSON or Parquet")
+    parser.add_argument("dataset", choices=list(EXPORT_DATASETS))
+    parser.add_argument("--format", dest="fmt", choices=list(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="created_at (metrics: timestamp) >= ISO date/time")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="created_at (metrics: timestamp) <= ISO date/time")
+    parser.add_argument("--campaign-id", type=int)
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--project-id", type=int)
+    parser.add_argument("--chunk-size", type=int, help="Rows per chunk (default: EXPORT_CHUNK_SIZE, generated_content: EXPORT_CONTENT_CHUNK_SIZE)")
+    args = parser.parse_args()
+
+    filters = {"campaign_id": args.campaign_id, "user_id": args.user_id, "project_id": args.project_id}
+    try:
+        chunks = stream_export(args.dataset, args.fmt, args.start, args.end, filters, args.chunk_size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+    if args.output:
+        logger.info(f"✅ Exported {args.dataset} to {args.output} ({written} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Exports API
+Streaming downloads of raw events and generation history
+"""
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+
+from exports import stream_export, export_filename, EXPORT_DATASETS, EXPORT_FORMATS
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+
+@router.get("/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    campaign_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    project_id: Optional[int] = None
+):
+    """
+    Stream a dataset as CSV, NDJSON or Parquet
+
+    **Datasets:** `events` (filters: campaign_id, user_id), `gen_jobs` (user_id),
+    `generated_content`, `metrics` (project_id); all accept a start_date/end_date range.
+
+    Rows are read with a server-side cursor in EXPORT_CHUNK_SIZE chunks
+    (generated_content: EXPORT_CONTENT_CHUNK_SIZE) and encoded chunk by chunk
+    (one Parquet row group per chunk), so the download starts immediately and
+    memory stays constant regardless of row count.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset '{dataset}'")
+
+    try:
+        chunks = stream_export(
+            dataset, format, start_date, end_date,
+            filters={"campaign_id": campaign_id, "user_id": user_id, "project_id": project_id}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format][0],
+        headers={
+            "Content-Disposition": f'attachment; filename="{export_filename(dataset, format)}"',
+            "X-Accel-Buffering": "no"
+        }
+    )
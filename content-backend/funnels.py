@@ -0,0 +1,202 @@
+"""
+Funnel & Attribution
+Session impression → click → conversion funnels and last-touch creative attribution,
+computed in Postgres (window functions) so only aggregates leave the database
+"""
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+# Per-session first impression / click / conversion; a session reaches a step when the
+# step's first event follows the previous step's first event within the window
+FUNNEL_SQL = text("""
+    WITH sessions AS (
+        SELECT session_id,
+               min(created_at) FILTER (WHERE event_type = 'impression') AS first_impression,
+               min(created_at) FILTER (WHERE event_type = 'click') AS first_click,
+               min(created_at) FILTER (WHERE event_type = 'conversion') AS first_conversion
+        FROM events
+        WHERE campaign_id = :campaign_id
+          AND created_at >= :start_date AND created_at <= :end_date
+          AND session_id IS NOT NULL
+          AND event_type IN ('impression', 'click', 'conversion')
+        GROUP BY session_id
+    ),
+    steps AS (
+        SELECT *,
+               first_impression IS NOT NULL
+                   AND first_click >= first_impression
+                   AND first_click - first_impression <= :click_seconds * interval '1 second' AS clicked,
+               EXTRACT(EPOCH FROM first_conversion - first_impression) AS seconds_to_convert
+        FROM sessions
+    )
+    SELECT
+        count(*) AS sessions,
+        count(*) FILTER (WHERE first_impression IS NOT NULL) AS impression_sessions,
+        count(*) FILTER (WHERE clicked) AS click_sessions,
+        count(*) FILTER (
+            WHERE clicked
+              AND first_conversion >= first_click
+              AND first_conversion - first_click <= :conversion_seconds * interval '1 second'
+        ) AS conversion_sessions,
+        count(*) FILTER (WHERE first_conversion IS NOT NULL) AS converting_sessions,
+        count(*) FILTER (WHERE first_click IS NOT NULL AND first_impression IS NULL) AS click_without_impression,
+        avg(seconds_to_convert) FILTER (WHERE seconds_to_convert >= 0) AS avg_seconds_to_convert,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY seconds_to_convert)
+            FILTER (WHERE seconds_to_convert >= 0) AS p50_seconds_to_convert,
+        percentile_cont(0.9) WITHIN GROUP (ORDER BY seconds_to_convert)
+            FILTER (WHERE seconds_to_convert >= 0) AS p90_seconds_to_convert
+    FROM steps
+""")
+
+# Last-touch attribution. Running counts of clicks / impressions per session split each
+# session into touch groups; first_value() over a group is the latest click / impression
+# at or before every row, so each conversion sees its last touch without a self-join.
+ATTRIBUTION_SQL = text("""
+    WITH ev AS (
+        SELECT id, session_id, creative_id, event_type, created_at
+        FROM events
+        WHERE campaign_id = :campaign_id
+          AND created_at >= :start_date AND created_at <= :end_date
+          AND session_id IS NOT NULL
+          AND event_type IN ('impression', 'click', 'conversion')
+    ),
+    grouped AS (
+        SELECT *,
+               count(*) FILTER (WHERE event_type = 'click') OVER w AS click_group,
+               count(*) FILTER (WHERE event_type = 'impression') OVER w AS impression_group
+        FROM ev
+        WINDOW w AS (PARTITION BY session_id ORDER BY created_at, id)
+    ),
+    touched AS (
+        SELECT event_type, created_at, click_group, impression_group,
+               first_value(creative_id) OVER c AS click_creative,
+               first_value(created_at) OVER c AS click_at,
+               first_value(creative_id) OVER i AS impression_creative,
+               first_value(created_at) OVER i AS impression_at
+        FROM grouped
+        WINDOW c AS (PARTITION BY session_id, click_group ORDER BY created_at, id),
+               i AS (PARTITION BY session_id, impression_group ORDER BY created_at, id)
+    ),
+    conversions AS (
+        SELECT
+            CASE
+                WHEN click_group > 0 AND created_at - click_at <= :conversion_seconds * interval '1 second' THEN 'click'
+                WHEN impression_group > 0 AND created_at - impression_at <= :view_seconds * interval '1 second' THEN 'view'
+            END AS touch,
+            CASE
+                WHEN click_group > 0 AND created_at - click_at <= :conversion_seconds * interval '1 second' THEN click_creative
+                WHEN impression_group > 0 AND created_at - impression_at <= :view_seconds * interval '1 second' THEN impression_creative
+            END AS creative_id,
+            CASE
+                WHEN click_group > 0 AND created_at - click_at <= :conversion_seconds * interval '1 second'
+                    THEN EXTRACT(EPOCH FROM created_at - click_at)
+                WHEN impression_group > 0 AND created_at - impression_at <= :view_seconds * interval '1 second'
+                    THEN EXTRACT(EPOCH FROM created_at - impression_at)
+            END AS seconds_to_convert
+        FROM touched
+        WHERE event_type = 'conversion'
+    )
+    SELECT conv.touch, conv.creative_id, c.name AS creative_name, c.variant,
+           count(*) AS conversions,
+           avg(conv.seconds_to_convert) AS avg_seconds_to_convert,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY conv.seconds_to_convert) AS p50_seconds_to_convert
+    FROM conversions conv
+    LEFT JOIN creatives c ON c.id = conv.creative_id
+    GROUP BY conv.touch, conv.creative_id, c.name, c.variant
+    ORDER BY count(*) DESC
+""")
+
+
+def _seconds(value) -> Optional[float]:
+    return round(float(value), 1) if value is not None else None
+
+
+def session_funnel(db: Session, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Session counts per funnel step with step conversion rates and time-to-convert"""
+    row = db.execute(FUNNEL_SQL, params).one()
+
+    def rate(numerator: int, denominator: int) -> float:
+        return round(numerator / denominator * 100, 2) if denominator else 0.0
+
+    return {
+        "sessions": row.sessions,
+        "steps": [
+            {"step": "impression", "sessions": row.impression_sessions, "rate": 100.0 if row.impression_sessions else 0.0},
+            {"step": "click", "sessions": row.click_sessions, "rate": rate(row.click_sessions, row.impression_sessions)},
+            {"step": "conversion", "sessions": row.conversion_sessions, "rate": rate(row.conversion_sessions, row.click_sessions)}
+        ],
+        "overall_conversion_rate": rate(row.conversion_sessions, row.impression_sessions),
+        "converting_sessions": row.converting_sessions,
+        "click_without_impression": row.click_without_impression,
+        "time_to_convert_seconds": {
+            "from": "first_impression",
+            "avg": _seconds(row.avg_seconds_to_convert),
+            "p50": _seconds(row.p50_seconds_to_convert),
+            "p90": _seconds(row.p90_seconds_to_convert)
+        }
+    }
+
+
+def last_touch_attribution(db: Session, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Conversions credited to the last click (or, failing that, impression) in their session"""
+    rows = db.execute(ATTRIBUTION_SQL, params).all()
+
+    creatives: List[Dict[str, Any]] = []
+    totals = {"click": 0, "view": 0, "unattributed": 0}
+    for row in rows:
+        if row.touch is None:
+            totals["unattributed"] += row.conversions
+            continue
+        totals[row.touch] += row.conversions
+        creatives.append({
+            "creative_id": row.creative_id,
+            "name": row.creative_name,
+            "variant": row.variant,
+            "touch": row.touch,
+            "conversions": row.conversions,
+            "avg_seconds_to_convert": _seconds(row.avg_seconds_to_convert),
+            "p50_seconds_to_convert": _seconds(row.p50_seconds_to_convert)
+        })
+
+    return {"model": "last_touch", "totals": totals, "creatives": creatives}
+
+
+def funnel_report(
+    db: Session,
+    campaign_id: int,
+    start_date: datetime,
+    end_date: datetime,
+    click_window_hours: float = 24,
+    conversion_window_hours: float = 168,
+    view_through_window_hours: float = 24
+) -> Dict[str, Any]:
+    """
+    Funnel and last-touch attribution for a campaign
+
+    Args:
+        click_window_hours: Max impression → click delay for the funnel
+        conversion_window_hours: Max click → conversion delay (funnel and click-through attribution)
+        view_through_window_hours: Max impression → conversion delay for view-through attribution
+    """
+    params = {
+        "campaign_id": campaign_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "click_seconds": click_window_hours * 3600,
+        "conversion_seconds": conversion_window_hours * 3600,
+        "view_seconds": view_through_window_hours * 3600
+    }
+
+    return {
+        "funnel": session_funnel(db, params),
+        "attribution": last_touch_attribution(db, params),
+        "windows": {
+            "click_hours": click_window_hours,
+            "conversion_hours": conversion_window_hours,
+            "view_through_hours": view_through_window_hours
+        }
+    }
@@ -0,0 +1,54 @@
+"""
+High-Performer Ranking
+Blended ranking (similarity x performance x recency decay) of filtered nearest-neighbour
+candidates, and the size of the candidate pool it reranks
+"""
+import os
+import math
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("high_performers")
+
+# Candidates fetched (and reranked) per requested result
+HIGH_PERFORMER_OVERFETCH = float(os.getenv("HIGH_PERFORMER_OVERFETCH", "3"))
+HIGH_PERFORMER_MAX_CANDIDATES = int(os.getenv("HIGH_PERFORMER_MAX_CANDIDATES", "200"))
+# Performance of a text counts half after this many days
+HIGH_PERFORMER_HALF_LIFE_DAYS = float(os.getenv("HIGH_PERFORMER_HALF_LIFE_DAYS", "30"))
+
+
+def blended_scores(
+    similarities: np.ndarray,
+    performance_scores: np.ndarray,
+    created_at: List[Optional[str]],
+    now: Optional[datetime] = None,
+    half_life_days: float = HIGH_PERFORMER_HALF_LIFE_DAYS
+) -> np.ndarray:
+    """
+    similarity x performance x 0.5 ** (age_days / half_life) for every candidate
+
+    created_at are ISO timestamps from the document metadata; candidates without
+    one are not decayed.
+    """
+    now = np.datetime64(now or datetime.utcnow(), "s")
+    stamps = np.array([value[:19] if value else "NaT" for value in created_at], dtype="datetime64[s]")
+    age_days = np.nan_to_num((now - stamps).astype("float64") / 86400.0, nan=0.0)
+    decay = np.power(0.5, np.clip(age_days, 0.0, None) / half_life_days)
+    return np.clip(similarities, 0.0, None) * performance_scores * decay
+
+
+def candidate_pool(n_results: int) -> int:
+    """
+    Candidates to fetch for `n_results` results
+
+    The score filter is applied inside the query, so a short result means fewer
+    documents match it; a bigger pool only widens the rerank, it cannot fill slots.
+    """
+    return max(n_results, min(HIGH_PERFORMER_MAX_CANDIDATES, math.ceil(n_results * HIGH_PERFORMER_OVERFETCH)))
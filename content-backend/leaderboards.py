@@ -0,0 +1,383 @@
+"""
+Creative Leaderboards
+Per-campaign and global CTR / CVR / performance_score rankings kept in Redis sorted sets
+"""
+import os
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from database import SessionLocal, Creative, Event
+from cache import get_cache
+from event_stream import StreamEntry, run_consumer
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("leaderboards")
+
+LEADERBOARD_GROUP = "leaderboards"
+LEADERBOARD_METRICS = ("ctr", "cvr", "performance_score")
+# Minimum volume before a creative is ranked (keeps 1/1 clicks off the top)
+LEADERBOARD_MIN_IMPRESSIONS = int(os.getenv("LEADERBOARD_MIN_IMPRESSIONS", "100"))
+LEADERBOARD_MIN_CLICKS = int(os.getenv("LEADERBOARD_MIN_CLICKS", "20"))
+
+# performance_score weights (same formula as /creatives/{id}/update-performance)
+CTR_WEIGHT = 0.6
+CVR_WEIGHT = 0.4
+
+REBUILD_LOCK_KEY = "lb:rebuild_lock"
+EVENT_FIELDS = {"impression": "imp", "click": "clk", "conversion": "conv"}
+
+
+def board_key(metric: str, campaign_id: Optional[int] = None) -> str:
+    """Sorted set for a metric, per campaign or global"""
+    return f"lb:{metric}:campaign:{campaign_id}" if campaign_id is not None else f"lb:{metric}:global"
+
+
+def counts_key(creative_id: int) -> str:
+    """Hash with imp/clk/conv totals and campaign_id of a creative"""
+    return f"lb:creative:{creative_id}"
+
+
+def compute_scores(impressions: int, clicks: int, conversions: int) -> Dict[str, Optional[float]]:
+    """
+    CTR, CVR and performance_score as fractions
+
+    A metric is None until the creative has enough volume to be ranked on it.
+    """
+    ctr = clicks / impressions if impressions >= LEADERBOARD_MIN_IMPRESSIONS else None
+    cvr = min(conversions / clicks, 1.0) if clicks >= LEADERBOARD_MIN_CLICKS else None
+
+    performance_score = None
+    if ctr is not None:
+        performance_score = ctr * CTR_WEIGHT + (cvr or 0.0) * CVR_WEIGHT
+
+    return {"ctr": ctr, "cvr": cvr, "performance_score": performance_score}
+
+
+def _queue_scores(pipe, creative_id: int, campaign_id: int, scores: Dict[str, Optional[float]]) -> None:
+    """Add ZADD/ZREM commands for one creative to a pipeline"""
+    for metric, score in scores.items():
+        for key in (board_key(metric, campaign_id), board_key(metric)):
+            if score is None:
+                pipe.zrem(key, creative_id)
+            else:
+                pipe.zadd(key, {creative_id: score})
+
+
+def apply_events(entries: List[StreamEntry]) -> None:
+    """Stream handler: add event counts per creative and re-rank the touched creatives"""
+    cache = get_cache()
+
+    deltas: Dict[Tuple[int, int], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for _, fields in entries:
+        field = EVENT_FIELDS.get(fields.get("event_type"))
+        if not field or not fields.get("creative_id") or not fields.get("campaign_id"):
+            continue
+        deltas[(int(fields["creative_id"]), int(fields["campaign_id"]))][field] += 1
+
+    if not deltas:
+        return
+
+    # HINCRBY returns the new totals, so scores come from the same round trip
+    pipe = cache.client.pipeline(transaction=False)
+    for (creative_id, campaign_id), counts in deltas.items():
+        key = counts_key(creative_id)
+        for field in ("imp", "clk", "conv"):
+            pipe.hincrby(key, field, counts.get(field, 0))
+        pipe.hset(key, "campaign_id", campaign_id)
+    results = pipe.execute()
+
+    pipe = cache.client.pipeline(transaction=False)
+    for i, (creative_id, campaign_id) in enumerate(deltas):
+        impressions, clicks, conversions = results[i * 4:i * 4 + 3]
+        _queue_scores(pipe, creative_id, campaign_id, compute_scores(impressions, clicks, conversions))
+    pipe.execute()
+
+
+def rebuild_leaderboards(db: Session) -> int:
+    """
+    Recompute every creative's counts and scores from one grouped query over events
+
+    Used to seed Redis and by the scheduled rollup refresh to correct any drift.
+
+    Returns:
+        Number of creatives written
+    """
+    cache = get_cache()
+    if not cache.enabled:
+        return 0
+
+    rows = db.query(
+        Event.creative_id,
+        Creative.campaign_id,
+        func.count(Event.id).filter(Event.event_type == 'impression').label("impressions"),
+        func.count(Event.id).filter(Event.event_type == 'click').label("clicks"),
+        func.count(Event.id).filter(Event.event_type == 'conversion').label("conversions")
+    ).join(
+        Creative, Creative.id == Event.creative_id
+    ).group_by(Event.creative_id, Creative.campaign_id).all()
+
+    write_leaderboards(rows)
+    return len(rows)
+
+
+def write_leaderboards(rows: List[Any]) -> None:
+    """
+    Replace all boards with scores computed from (creative_id, campaign_id,
+    impressions, clicks, conversions) rows
+
+    Boards are built under temporary keys and swapped in with RENAME, so
+    readers never see a partially written board.
+    """
+    cache = get_cache()
+
+    boards: Dict[str, Dict[int, float]] = defaultdict(dict)
+    pipe = cache.client.pipeline(transaction=False)
+    for row in rows:
+        pipe.hset(counts_key(row.creative_id), mapping={
+            "imp": row.impressions,
+            "clk": row.clicks,
+            "conv": row.conversions,
+            "campaign_id": row.campaign_id
+        })
+        for metric, score in compute_scores(row.impressions, row.clicks, row.conversions).items():
+            if score is not None:
+                boards[board_key(metric, row.campaign_id)][row.creative_id] = score
+                boards[board_key(metric)][row.creative_id] = score
+
+    for metric in LEADERBOARD_METRICS:
+        boards.setdefault(board_key(metric), {})
+
+    for key, members in boards.items():
+        if members:
+            pipe.delete(f"{key}:tmp")
+            pipe.zadd(f"{key}:tmp", members)
+            pipe.rename(f"{key}:tmp", key)
+        else:
+            pipe.delete(key)
+    pipe.execute()
+
+
+def refresh_creatives(rows: List[Any]) -> None:
+    """
+    Overwrite counts and re-rank only the given creatives (rollup refresh)
+
+    Rows are (creative_id, campaign_id, impressions, clicks, conversions) with absolute totals.
+    """
+    cache = get_cache()
+    if not cache.enabled or not rows:
+        return
+
+    pipe = cache.client.pipeline(transaction=False)
+    for row in rows:
+        pipe.hset(counts_key(row.creative_id), mapping={
+            "imp": row.impressions,
+            "clk": row.clicks,
+            "conv": row.conversions,
+            "campaign_id": row.campaign_id
+        })
+        _queue_scores(pipe, row.creative_id, row.campaign_id,
+                      compute_scores(row.impressions, row.clicks, row.conversions))
+    pipe.execute()
+
+
+def remove_creative(creative_id: int, campaign_id: int) -> None:
+    """Drop a deleted creative from every board"""
+    cache = get_cache()
+    if not cache.enabled:
+        return
+
+    try:
+        pipe = cache.client.pipeline(transaction=False)
+        for metric in LEADERBOARD_METRICS:
+            pipe.zrem(board_key(metric, campaign_id), creative_id)
+            pipe.zrem(board_key(metric), creative_id)
+        pipe.delete(counts_key(creative_id))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to remove creative {creative_id} from leaderboards: {e}")
+
+
+def top_creative_ids(metric: str, k: int = 10, campaign_id: Optional[int] = None) -> Optional[List[Tuple[int, float]]]:
+    """
+    Top-k (creative_id, score) pairs from a board, O(log n + k)
+
+    Returns None when Redis is unavailable so callers can fall back to SQL.
+    """
+    cache = get_cache()
+    if not cache.enabled:
+        return None
+
+    try:
+        entries = cache.client.zrevrange(board_key(metric, campaign_id), 0, k - 1, withscores=True)
+        return [(int(member), float(score)) for member, score in entries]
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to read leaderboard {metric}: {e}")
+        return None
+
+
+def top_creatives(
+    db: Session,
+    metric: str = "performance_score",
+    k: int = 10,
+    campaign_id: Optional[int] = None,
+    content_type: Optional[str] = None,
+    sql_fallback: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Top-k creatives with their details and counters
+
+    Ranking comes from Redis; details are one primary-key lookup for the k ids.
+    With a content_type filter the board is over-read and filtered.
+    Without Redis the ranking is aggregated in SQL unless sql_fallback is False.
+    """
+    fetch = k * 4 if content_type else k
+    ranked = top_creative_ids(metric, fetch, campaign_id)
+
+    if ranked is None:
+        return _top_creatives_sql(db, metric, k, campaign_id, content_type) if sql_fallback else []
+    if not ranked:
+        return []
+
+    ids = [creative_id for creative_id, _ in ranked]
+    query = db.query(Creative).filter(Creative.id.in_(ids))
+    if content_type:
+        query = query.filter(Creative.content_type == content_type)
+    creatives = {creative.id: creative for creative in query.all()}
+
+    pipe = get_cache().client.pipeline(transaction=False)
+    for creative_id in ids:
+        pipe.hgetall(counts_key(creative_id))
+    counters = dict(zip(ids, pipe.execute()))
+
+    results = []
+    for creative_id, score in ranked:
+        creative = creatives.get(creative_id)
+        if creative is None:
+            continue
+        counts = counters.get(creative_id) or {}
+        results.append(_creative_entry(
+            creative, score,
+            int(counts.get("imp", 0)), int(counts.get("clk", 0)), int(counts.get("conv", 0))
+        ))
+        if len(results) >= k:
+            break
+    return results
+
+
+def _creative_entry(creative: Creative, score: float, impressions: int, clicks: int, conversions: int) -> Dict[str, Any]:
+    scores = compute_scores(impressions, clicks, conversions)
+    return {
+        "creative_id": creative.id,
+        "campaign_id": creative.campaign_id,
+        "name": creative.name,
+        "content_type": creative.content_type,
+        "content": creative.content_text,
+        "asset_url": creative.asset_url,
+        "variant": creative.variant,
+        "score": round(score, 6),
+        "impressions": impressions,
+        "clicks": clicks,
+        "conversions": conversions,
+        "ctr": round(scores["ctr"] or 0.0, 6),
+        "cvr": round(scores["cvr"] or 0.0, 6),
+        "performance_score": round(scores["performance_score"] or 0.0, 6)
+    }
+
+
+def _top_creatives_sql(
+    db: Session,
+    metric: str,
+    k: int,
+    campaign_id: Optional[int],
+    content_type: Optional[str]
+) -> List[Dict[str, Any]]:
+    """Fallback when Redis is unavailable: aggregate, filter and rank in SQL"""
+    impressions = func.count(Event.id).filter(Event.event_type == 'impression')
+    clicks = func.count(Event.id).filter(Event.event_type == 'click')
+    conversions = func.count(Event.id).filter(Event.event_type == 'conversion')
+
+    ctr = clicks * 1.0 / func.nullif(impressions, 0)
+    cvr = func.least(conversions * 1.0 / func.nullif(clicks, 0), 1.0)
+    rank_by = {
+        "ctr": ctr,
+        "cvr": cvr,
+        "performance_score": ctr * CTR_WEIGHT + func.coalesce(cvr, 0.0) * CVR_WEIGHT
+    }[metric]
+
+    query = db.query(
+        Creative,
+        impressions.label("impressions"),
+        clicks.label("clicks"),
+        conversions.label("conversions"),
+        rank_by.label("score")
+    ).join(Event, Event.creative_id == Creative.id)
+
+    if campaign_id is not None:
+        query = query.filter(Creative.campaign_id == campaign_id, Event.campaign_id == campaign_id)
+    if content_type:
+        query = query.filter(Creative.content_type == content_type)
+
+    volume = clicks if metric == "cvr" else impressions
+    minimum = LEADERBOARD_MIN_CLICKS if metric == "cvr" else LEADERBOARD_MIN_IMPRESSIONS
+    rows = query.group_by(Creative.id).having(volume >= minimum).order_by(
+        rank_by.desc().nulls_last()
+    ).limit(k).all()
+
+    return [
+        _creative_entry(row.Creative, float(row.score or 0.0), row.impressions, row.clicks, row.conversions)
+        for row in rows
+    ]
+
+
+def top_text_exemplars(db: Session, k: int = 3) -> List[Dict[str, Any]]:
+    """
+    Best-performing text creatives, shaped like search_high_performing_texts() results
+
+    Leaderboard only (no SQL fallback), since this runs on every RAG-enabled generation.
+    """
+    exemplars = []
+    for entry in top_creatives(db, "performance_score", k, content_type="text", sql_fallback=False):
+        if not entry["content"]:
+            continue
+        exemplars.append({
+            "id": f"creative_{entry['creative_id']}",
+            "content": entry["content"],
+            "performance_score": entry["performance_score"],
+            "ctr": entry["ctr"],
+            "cvr": entry["cvr"],
+            "source": "leaderboard"
+        })
+    return exemplars
+
+
+def _seed_if_missing() -> None:
+    """Build the boards once (first worker to take the lock) when Redis has none"""
+    cache = get_cache()
+    if cache.client.exists(board_key("performance_score")):
+        return
+    if not cache.client.set(REBUILD_LOCK_KEY, 1, nx=True, ex=300):
+        return
+
+    db = SessionLocal()
+    try:
+        count = rebuild_leaderboards(db)
+        logger.info(f"✅ Leaderboards seeded: {count} creatives")
+    finally:
+        db.close()
+
+
+async def leaderboards_consumer():
+    """Background stream consumer started from the FastAPI startup hook"""
+    if get_cache().enabled:
+        try:
+            await asyncio.to_thread(_seed_if_missing)
+        except Exception as e:
+            logger.error(f"Leaderboard seeding failed: {e}", exc_info=True)
+    await run_consumer(LEADERBOARD_GROUP, apply_events)
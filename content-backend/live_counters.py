@@ -0,0 +1,157 @@
+"""
+Live Campaign Counters
+Per-campaign impression/click/conversion counters kept in Redis by an event stream consumer
+"""
+import os
+import json
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, AsyncIterator
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from database import SessionLocal, Event
+from cache import get_cache
+from event_stream import StreamEntry, last_stream_id, run_consumer
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("live_counters")
+
+LIVE_COUNTERS_GROUP = "live_counters"
+LIVE_COUNTERS_TTL = int(os.getenv("LIVE_COUNTERS_TTL", "86400"))  # idle campaigns expire and are reseeded
+LIVE_PUSH_INTERVAL = float(os.getenv("LIVE_PUSH_INTERVAL", "1.0"))
+EVENT_TYPES = ("impression", "click", "conversion")
+
+# Apply increments only to seeded hashes, and only for entries newer than the seed point
+# (older ones were already counted by the seeding query).
+# ARGV: event_type, ttl, entry IDs...
+_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+local seed = redis.call('HGET', KEYS[1], 'seed_id') or '0-0'
+local seed_ms, seed_seq = string.match(seed, '(%d+)-(%d+)')
+seed_ms, seed_seq = tonumber(seed_ms), tonumber(seed_seq)
+local count = 0
+for i = 3, #ARGV do
+    local ms, seq = string.match(ARGV[i], '(%d+)-(%d+)')
+    ms, seq = tonumber(ms), tonumber(seq)
+    if ms > seed_ms or (ms == seed_ms and seq > seed_seq) then
+        count = count + 1
+    end
+end
+if count > 0 then
+    redis.call('HINCRBY', KEYS[1], ARGV[1], count)
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return count
+"""
+
+_SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def counters_key(campaign_id: int) -> str:
+    """Redis hash holding a campaign's live counters"""
+    return f"live:campaign:{campaign_id}"
+
+
+def apply_events(entries: List[StreamEntry]) -> None:
+    """Stream handler: fold a batch of events into the campaign hashes"""
+    cache = get_cache()
+
+    # One script call per (campaign, event_type) in the batch
+    entry_ids = defaultdict(list)
+    for entry_id, fields in entries:
+        event_type = fields.get("event_type")
+        if event_type not in EVENT_TYPES or not fields.get("campaign_id"):
+            continue
+        entry_ids[(int(fields["campaign_id"]), event_type)].append(entry_id)
+
+    pipe = cache.client.pipeline(transaction=False)
+    for (campaign_id, event_type), ids in entry_ids.items():
+        pipe.eval(_INCR_SCRIPT, 1, counters_key(campaign_id), event_type, LIVE_COUNTERS_TTL, *ids)
+    pipe.execute()
+
+
+def seed_counters(db: Session, campaign_id: int) -> None:
+    """
+    Initialize a campaign hash from one grouped COUNT over events
+
+    Records the stream position so the consumer skips entries the query already
+    counted. Events are published after their row commits, so the position is read
+    after the query: every entry newer than it belongs to a row the COUNT could not
+    see, and nothing is counted twice. (An event committed while the COUNT runs and
+    published before it returns is missed; the opposite order double counted it.)
+    """
+    cache = get_cache()
+    if cache.client.exists(counters_key(campaign_id)):
+        return
+
+    rows = db.query(Event.event_type, func.count(Event.id)).filter(
+        Event.campaign_id == campaign_id,
+        Event.event_type.in_(EVENT_TYPES)
+    ).group_by(Event.event_type).all()
+    seed_id = last_stream_id()
+
+    counts = {event_type: 0 for event_type in EVENT_TYPES}
+    counts.update({event_type: count for event_type, count in rows})
+
+    fields = ["seed_id", seed_id]
+    for event_type, count in counts.items():
+        fields += [event_type, count]
+    cache.client.eval(_SEED_SCRIPT, 1, counters_key(campaign_id), LIVE_COUNTERS_TTL, *fields)
+
+
+def get_counters(campaign_id: int) -> Dict[str, float]:
+    """
+    Current counters and CTR/CVR for a campaign
+
+    Reading refreshes the hash TTL, so a watched campaign without events does not
+    expire; a hash that is gone anyway (TTL, Redis restart) is reseeded.
+    """
+    client = get_cache().client
+    pipe = client.pipeline(transaction=False)
+    pipe.hgetall(counters_key(campaign_id))
+    pipe.expire(counters_key(campaign_id), LIVE_COUNTERS_TTL)
+    raw, _ = pipe.execute()
+
+    if not raw:
+        db = SessionLocal()
+        try:
+            seed_counters(db, campaign_id)
+        finally:
+            db.close()
+        raw = client.hgetall(counters_key(campaign_id))
+
+    impressions = int(raw.get("impression", 0))
+    clicks = int(raw.get("click", 0))
+    conversions = int(raw.get("conversion", 0))
+
+    return {
+        "campaign_id": campaign_id,
+        "impressions": impressions,
+        "clicks": clicks,
+        "conversions": conversions,
+        "ctr": round(clicks / impressions * 100, 2) if impressions > 0 else 0.0,
+        "cvr": round(conversions / clicks * 100, 2) if clicks > 0 else 0.0
+    }
+
+
+async def stream_counters(campaign_id: int, interval: float = LIVE_PUSH_INTERVAL) -> AsyncIterator[str]:
+    """Server-Sent Events generator pushing the counters every `interval` seconds"""
+    while True:
+        counters = await asyncio.to_thread(get_counters, campaign_id)
+        yield f"event: counters\ndata: {json.dumps(counters)}\n\n"
+        await asyncio.sleep(interval)
+
+
+async def live_counters_consumer():
+    """Background stream consumer started from the FastAPI startup hook"""
+    await run_consumer(LIVE_COUNTERS_GROUP, apply_events)
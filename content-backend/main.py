@@ -2,18 +2,19 @@
 Artify Content Backend - FastAPI
 Provides AI generation, segments management, and analytics
 """
-from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
 from typing import Optional, List
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 import random
 import psutil
 import shutil
 import time
+import asyncio
 
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -34,6 +35,19 @@ from auth_api import router as auth_router
 from templates_api import router as templates_router
 from batch_generation_api import router as batch_router
 from internationalization_api import router as i18n_router
+from exports_api import router as exports_router
+from event_partitions import partition_maintenance_loop
+from live_counters import live_counters_consumer
+from bandit import bandit_consumer, bandit_sync_loop
+from leaderboards import leaderboards_consumer, top_text_exemplars
+from performance_scores import performance_score_loop, run_performance_scores
+from event_dimensions import user_agent_enrichment_loop
+from archival import archival_loop
+from monitoring_snapshot import monitoring_snapshot_loop, latest_snapshot
+from prompt_cache import prompt_cache_compaction_loop, resolve_cached_result
+from counter_service import counter_flush_loop, run_counter_flush
+from metrics_series import bucketed_series, DEFAULT_MAX_POINTS
+from cost_ledger import aggregate_job_costs, record_job_cost, record_cache_hit, cache_counters, ledger_totals, ledger_daily, reconcile_quota
 
 load_dotenv()
 
@@ -145,13 +159,14 @@ For issues and feature requests, please contact the development team.
 # Register exception handlers
 register_exception_handlers(app)
 
-# Include routers for campaigns, analytics, authentication, templates, batch generation, and i18n
+# Include routers for campaigns, analytics, authentication, templates, batch generation, i18n, and exports
 app.include_router(auth_router)
 app.include_router(campaigns_router)
 app.include_router(analytics_router)
 app.include_router(templates_router)
 app.include_router(batch_router)
 app.include_router(i18n_router)
+app.include_router(exports_router)
 
 # Rate Limiter Configuration
 limiter = Limiter(key_func=get_remote_address)
@@ -350,6 +365,25 @@ async def update_quota_cost(user_id: int, cost: float, db: Session):
     db.commit()
 
 
+# ==========================================
+# Cost Aggregation Helpers
+# ==========================================
+
+def type_breakdown(totals) -> dict:
+    """Text/image breakdown dict shared by the cost endpoints"""
+    return {
+        "text": {
+            "jobs": totals.text_jobs,
+            "cost_usd": round(totals.text_cost, 4),
+            "total_tokens": int(totals.text_tokens)
+        },
+        "image": {
+            "jobs": totals.image_jobs,
+            "cost_usd": round(totals.image_cost, 4)
+        }
+    }
+
+
 # ==========================================
 # Pydantic Models (Request/Response)
 # ==========================================
@@ -772,16 +806,28 @@ async def generate_text(
     # Check cache first
     try:
         vector_client = get_vector_client()
-        cache_hit = vector_client.search_prompt_cache(
+        cache_hit = await asyncio.to_thread(
+            vector_client.search_prompt_cache,
             query=body.prompt,
             job_type="text",
             model=selected_model,
             similarity_threshold=0.95  # 95% similarity
         )
 
-        if cache_hit:
+        # A hit whose generated_content row is gone (archived) counts as a miss
+        cached_text = resolve_cached_result(db, cache_hit)
+        if cached_text is not None:
             # Cache hit! Return cached result without calling AI API
-            cached_text = cache_hit["cached_result"]
+
+            # Cost avoided = what the cached generation actually cost
+            cache_metadata = cache_hit.get("metadata") or {}
+            cost_saved = cache_metadata.get("cost_usd")
+            if cost_saved is None:
+                cost_saved = calculate_text_cost(
+                    selected_model,
+                    cache_metadata.get("prompt_tokens", 0),
+                    cache_metadata.get("completion_tokens", 0)
+                )
 
             # Save to database with cache flag
             content_record = GeneratedContent(
@@ -793,6 +839,7 @@ async def generate_text(
                 is_cached_result=True
             )
             db.add(content_record)
+            record_cache_hit(db, "text", selected_model, cost_saved, body.user_id, body.segment_id)
             db.commit()
             db.refresh(content_record)
 
@@ -867,7 +914,8 @@ async def generate_text(
             if body.segment_id:
                 segment = db.query(Segment).filter(Segment.id == body.segment_id).first()
                 if segment and hasattr(segment, 'brand_id') and segment.brand_id:
-                    brand_context = vector_client.get_brand_context(
+                    brand_context = await asyncio.to_thread(
+                        vector_client.get_brand_context,
                         brand_id=segment.brand_id,
                         query=body.prompt,
                         n_results=2
@@ -877,12 +925,17 @@ async def generate_text(
                         rag_info["brand_guidelines_used"] = True
 
             # 2. Retrieve high-performing similar content as examples
-            similar_high_performers = vector_client.search_high_performing_texts(
+            similar_high_performers = await asyncio.to_thread(
+                vector_client.search_high_performing_texts,
                 query=body.prompt,
                 min_score=0.05,  # Performance score threshold
                 n_results=3
             )
 
+            # Fill remaining exemplar slots with the top text creatives from the leaderboard
+            if len(similar_high_performers) < 3:
+                similar_high_performers += top_text_exemplars(db, k=3 - len(similar_high_performers))
+
             if similar_high_performers:
                 examples_text = "=== 고성과 콘텐츠 예시 ===\n"
                 for i, example in enumerate(similar_high_performers, 1):
@@ -968,6 +1021,7 @@ async def generate_text(
         job.total_tokens = total_tokens
         job.estimated_cost = estimated_cost
         job.completed_at = datetime.utcnow()
+        record_job_cost(db, job)
         db.commit()
 
         # Update user quota with actual cost
@@ -1007,6 +1061,7 @@ async def generate_text(
                     result=generated_text,
                     model=selected_model,
                     job_type="text",
+                    content_id=content_record.id,
                     metadata={
                         "user_id": body.user_id,
                         "prompt_tokens": prompt_tokens,
@@ -1095,16 +1150,21 @@ async def generate_image(
     # Check cache first
     try:
         vector_client = get_vector_client()
-        cache_hit = vector_client.search_prompt_cache(
+        cache_hit = await asyncio.to_thread(
+            vector_client.search_prompt_cache,
             query=body.prompt,
             job_type="image",
             model=body.model,
             similarity_threshold=0.95  # 95% similarity
         )
 
-        if cache_hit:
+        # A hit whose generated_content row is gone (archived) counts as a miss
+        cached_url = resolve_cached_result(db, cache_hit)
+        if cached_url is not None:
             # Cache hit! Return cached result without calling AI API
-            cached_url = cache_hit["cached_result"]
+
+            # Cost avoided = what the cached generation actually cost
+            cost_saved = (cache_hit.get("metadata") or {}).get("cost_usd", estimated_cost)
 
             # Save to database with cache flag
             content_record = GeneratedContent(
@@ -1116,6 +1176,7 @@ async def generate_image(
                 is_cached_result=True
             )
             db.add(content_record)
+            record_cache_hit(db, "image", body.model, cost_saved, body.user_id)
             db.commit()
             db.refresh(content_record)
 
@@ -1133,7 +1194,7 @@ async def generate_image(
                 },
                 "usage": {
                     "estimated_cost_usd": 0.0,
-                    "cost_saved": estimated_cost
+                    "cost_saved": cost_saved
                 }
             }
     except Exception as e:
@@ -1214,6 +1275,7 @@ async def generate_image(
         # Update job with success
         job.status = "completed"
         job.completed_at = datetime.utcnow()
+        record_job_cost(db, job)
         db.commit()
 
         # Update user quota with actual cost
@@ -1252,6 +1314,7 @@ async def generate_image(
                     result=image_url,
                     model=body.model,
                     job_type="image",
+                    content_id=content_record.id,
                     metadata={
                         "user_id": body.user_id,
                         "size": body.size,
@@ -1457,7 +1520,8 @@ async def search_similar_texts(
             where["user_id"] = user_id
 
         # 유사도 검색
-        results = vector_client.search_similar_texts(
+        results = await asyncio.to_thread(
+            vector_client.search_similar_texts,
             query=query,
             n_results=n_results,
             where=where if where else None
@@ -1501,7 +1565,8 @@ async def search_similar_images(
             where["user_id"] = user_id
 
         # 유사도 검색
-        results = vector_client.search_similar_images(
+        results = await asyncio.to_thread(
+            vector_client.search_similar_images,
             query=query,
             n_results=n_results,
             where=where if where else None
@@ -1536,7 +1601,8 @@ async def recommend_high_performing(
         vector_client = get_vector_client()
 
         # 고성과 콘텐츠 검색
-        results = vector_client.search_high_performing_texts(
+        results = await asyncio.to_thread(
+            vector_client.search_high_performing_texts,
             query=query,
             min_score=min_performance,
             n_results=n_results
@@ -1554,6 +1620,21 @@ async def recommend_high_performing(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/creatives/performance/recompute")
+async def recompute_creative_performance(full: bool = False):
+    """
+    Recompute creative performance scores from events (normally runs on a schedule)
+
+    Query Parameters:
+    - full: Recompute every creative instead of only those with events since the last run
+    """
+    try:
+        result = await asyncio.to_thread(run_performance_scores, full)
+        return {"success": not result.get("skipped"), **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/creatives/{content_id}/update-performance")
 async def update_content_performance(
     content_id: int,
@@ -1578,11 +1659,14 @@ async def update_content_performance(
 
         # 메트릭 시뮬레이션 (실제로는 metrics 테이블에서 조회)
         if project_id:
-            metrics = db.query(Metric).filter(Metric.project_id == project_id).all()
-
-            impressions = sum(m.metric_value for m in metrics if m.metric_name == "views")
-            clicks = sum(m.metric_value for m in metrics if m.metric_name == "engagement") * impressions if impressions > 0 else 0
-            conversions = sum(m.metric_value for m in metrics if m.metric_name == "conversions")
+            totals = dict(db.query(Metric.metric_name, func.sum(Metric.metric_value)).filter(
+                Metric.project_id == project_id,
+                Metric.metric_name.in_(["views", "engagement", "conversions"])
+            ).group_by(Metric.metric_name).all())
+
+            impressions = totals.get("views") or 0
+            clicks = (totals.get("engagement") or 0) * impressions if impressions > 0 else 0
+            conversions = totals.get("conversions") or 0
         else:
             # 시뮬레이션 데이터
             impressions = random.randint(1000, 10000)
@@ -1703,9 +1787,8 @@ async def get_brand_guidelines(
 
         results = vector_client.search_brand_guidelines(
             brand_id=brand_id,
-            query=None,
             category=category,
-            n_results=50  # Get all guidelines
+            limit=50  # Get all guidelines
         )
 
         response = {
@@ -1762,7 +1845,8 @@ async def generate_text_with_brand(
     try:
         # 1. Retrieve brand context from Vector DB
         vector_client = get_vector_client()
-        brand_context = vector_client.get_brand_context(
+        brand_context = await asyncio.to_thread(
+            vector_client.get_brand_context,
             brand_id=request.brand_id,
             query=request.prompt,
             category=request.category,
@@ -1839,6 +1923,7 @@ Ensure the generated content aligns with the brand's voice, tone, style, and val
         job.total_tokens = total_tokens
         job.estimated_cost = estimated_cost
         job.completed_at = datetime.utcnow()
+        record_job_cost(db, job)
         db.commit()
 
         # 8. Update user quota with actual cost
@@ -1952,23 +2037,35 @@ async def simulate_metrics(
 @app.get("/metrics/history/{project_id}")
 async def get_metrics_history(
     project_id: int,
+    bucket: str = Query("hour", pattern="^(hour|day|week)$"),
+    aggregation: str = Query("avg", pattern="^(sum|avg|last)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    metric: Optional[List[str]] = Query(None, description="Metric names (default: all)"),
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=3, le=5000, description="Max points per series (chart width)"),
     db: Session = Depends(get_db)
 ):
-    """Get historical metrics for a project"""
-    metrics = db.query(Metric).filter(Metric.project_id == project_id).all()
-
-    # Group by metric name
-    grouped_metrics = {}
-    for metric in metrics:
-        if metric.metric_name not in grouped_metrics:
-            grouped_metrics[metric.metric_name] = []
-        grouped_metrics[metric.metric_name].append({
-            "value": metric.metric_value,
-            "timestamp": metric.timestamp.isoformat()
-        })
+    """
+    Get historical metrics for a project
+
+    One point per `bucket` (hour/day/week) aggregated in SQL with `aggregation`
+    (sum/avg/last); series longer than `max_points` are downsampled with LTTB,
+    so the response size follows the chart resolution rather than data volume.
+    """
+    grouped_metrics = bucketed_series(
+        db, project_id,
+        bucket=bucket,
+        aggregation=aggregation,
+        start_date=start_date,
+        end_date=end_date,
+        metric_names=metric,
+        max_points=max_points
+    )
 
     return {
         "projectId": project_id,
+        "bucket": bucket,
+        "aggregation": aggregation,
         "metrics": grouped_metrics
     }
 
@@ -2034,12 +2131,62 @@ async def startup_event():
         print(f"⚠️  Migration warning: {str(e)}")
         print("Continuing without migrations...")
 
+    # Keep future event partitions created and apply retention to old ones
+    asyncio.create_task(partition_maintenance_loop())
+    print("✓ Event partition maintenance scheduled")
+
+    # Fold tracked events from the Redis stream into live campaign counters
+    asyncio.create_task(live_counters_consumer())
+    print("✓ Live campaign counters consumer started")
+
+    # Keep bandit posteriors for /campaigns/{id}/serve in step with the event stream
+    asyncio.create_task(bandit_consumer())
+    asyncio.create_task(bandit_sync_loop())
+    print("✓ Creative bandit allocator started")
+
+    # Keep creative leaderboards (Redis sorted sets) ranked as events arrive
+    asyncio.create_task(leaderboards_consumer())
+    print("✓ Creative leaderboards consumer started")
+
+    # Recompute creative performance scores for creatives with new events
+    asyncio.create_task(performance_score_loop())
+    print("✓ Performance score recomputation scheduled")
+
+    # Parse newly seen user agents (device/browser/os) off the ingestion path
+    asyncio.create_task(user_agent_enrichment_loop())
+    print("✓ User agent enrichment scheduled")
+
+    # Move months older than ARCHIVE_HORIZON_MONTHS to Parquet files in storage
+    asyncio.create_task(archival_loop())
+    print("✓ Cold data archival scheduled")
+
+    # Monitoring dashboard snapshot refresh
+    asyncio.create_task(monitoring_snapshot_loop())
+    print("✓ Monitoring dashboard snapshot scheduled")
+
+    # Prompt cache TTL / eviction / near-duplicate compaction
+    asyncio.create_task(prompt_cache_compaction_loop())
+    print("✓ Prompt cache compaction scheduled")
+
+    # Bulk-write coalesced hit / usage counters
+    asyncio.create_task(counter_flush_loop())
+    print("✓ Counter flush scheduled")
+
     print("✓ OpenAI API configured")
     print("=" * 50)
     print("Ready to serve requests!")
     print("=" * 50)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush counter deltas held in this process before exiting"""
+    try:
+        await asyncio.to_thread(run_counter_flush)
+    except Exception as e:
+        print(f"⚠️  Warning: Counter flush on shutdown failed: {e}")
+
+
 # ==========================================
 # Cost Tracking & Statistics Endpoints
 # ==========================================
@@ -2070,43 +2217,35 @@ async def get_user_quota(user_id: int, db: Session = Depends(get_db)):
     }
 
 
+@app.post("/users/{user_id}/quota/reconcile")
+async def reconcile_user_quota(user_id: int, db: Session = Depends(get_db)):
+    """Recompute monthly cost usage from the cost ledger (fixes drift in monthly_cost_used)"""
+    quota = await get_or_create_quota(user_id, db)
+    drift = reconcile_quota(db, quota)
+
+    return {
+        "user_id": user_id,
+        "cost_used_usd": round(quota.monthly_cost_used, 4),
+        "drift_corrected_usd": round(drift, 6),
+        "since": quota.last_monthly_reset.isoformat()
+    }
+
+
 @app.get("/users/{user_id}/costs/daily")
 async def get_daily_costs(user_id: int, db: Session = Depends(get_db)):
     """Get daily cost breakdown for a user"""
     # Get today's date range
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
 
-    # Query jobs from today
-    jobs = db.query(GenerationJob).filter(
-        GenerationJob.user_id == user_id,
-        GenerationJob.created_at >= today_start,
-        GenerationJob.status == "completed"
-    ).all()
-
-    text_jobs = [j for j in jobs if j.job_type == "text"]
-    image_jobs = [j for j in jobs if j.job_type == "image"]
-
-    total_cost = sum(j.estimated_cost or 0 for j in jobs)
-    text_cost = sum(j.estimated_cost or 0 for j in text_jobs)
-    image_cost = sum(j.estimated_cost or 0 for j in image_jobs)
-    total_tokens = sum(j.total_tokens or 0 for j in text_jobs)
+    # Read today's pre-aggregated totals from the cost ledger
+    totals = ledger_totals(db, start_day=today_start.date(), user_id=user_id)
 
     return {
         "user_id": user_id,
         "date": today_start.date().isoformat(),
-        "total_cost_usd": round(total_cost, 4),
-        "total_jobs": len(jobs),
-        "breakdown": {
-            "text": {
-                "jobs": len(text_jobs),
-                "cost_usd": round(text_cost, 4),
-                "total_tokens": total_tokens
-            },
-            "image": {
-                "jobs": len(image_jobs),
-                "cost_usd": round(image_cost, 4)
-            }
-        }
+        "total_cost_usd": round(totals.cost, 4),
+        "total_jobs": totals.jobs,
+        "breakdown": type_breakdown(totals)
     }
 
 
@@ -2117,29 +2256,9 @@ async def get_monthly_costs(user_id: int, db: Session = Depends(get_db)):
     now = datetime.utcnow()
     month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    # Query jobs from this month
-    jobs = db.query(GenerationJob).filter(
-        GenerationJob.user_id == user_id,
-        GenerationJob.created_at >= month_start,
-        GenerationJob.status == "completed"
-    ).all()
-
-    # Group by day
-    daily_costs = {}
-    for job in jobs:
-        day = job.created_at.date().isoformat()
-        if day not in daily_costs:
-            daily_costs[day] = {"cost": 0, "jobs": 0}
-        daily_costs[day]["cost"] += job.estimated_cost or 0
-        daily_costs[day]["jobs"] += 1
-
-    text_jobs = [j for j in jobs if j.job_type == "text"]
-    image_jobs = [j for j in jobs if j.job_type == "image"]
-
-    total_cost = sum(j.estimated_cost or 0 for j in jobs)
-    text_cost = sum(j.estimated_cost or 0 for j in text_jobs)
-    image_cost = sum(j.estimated_cost or 0 for j in image_jobs)
-    total_tokens = sum(j.total_tokens or 0 for j in text_jobs)
+    # Month totals and per-day breakdown from the cost ledger (O(days))
+    totals = ledger_totals(db, start_day=month_start.date(), user_id=user_id)
+    daily_rows = ledger_daily(db, start_day=month_start.date(), user_id=user_id)
 
     # Get quota for cost cap
     quota = await get_or_create_quota(user_id, db)
@@ -2147,28 +2266,18 @@ async def get_monthly_costs(user_id: int, db: Session = Depends(get_db)):
     return {
         "user_id": user_id,
         "month": month_start.strftime("%Y-%m"),
-        "total_cost_usd": round(total_cost, 4),
+        "total_cost_usd": round(totals.cost, 4),
         "cost_cap_usd": quota.monthly_cost_cap,
-        "remaining_budget_usd": round(quota.monthly_cost_cap - total_cost, 4),
-        "total_jobs": len(jobs),
+        "remaining_budget_usd": round(quota.monthly_cost_cap - totals.cost, 4),
+        "total_jobs": totals.jobs,
         "daily_breakdown": {
-            day: {
-                "cost_usd": round(data["cost"], 4),
-                "jobs": data["jobs"]
+            row.day.isoformat(): {
+                "cost_usd": round(row.cost, 4),
+                "jobs": row.jobs
             }
-            for day, data in sorted(daily_costs.items())
+            for row in daily_rows
         },
-        "type_breakdown": {
-            "text": {
-                "jobs": len(text_jobs),
-                "cost_usd": round(text_cost, 4),
-                "total_tokens": total_tokens
-            },
-            "image": {
-                "jobs": len(image_jobs),
-                "cost_usd": round(image_cost, 4)
-            }
-        }
+        "type_breakdown": type_breakdown(totals)
     }
 
 
@@ -2178,42 +2287,18 @@ async def get_cost_summary(
     db: Session = Depends(get_db)
 ):
     """Get cost summary for all generation jobs"""
-    query = db.query(GenerationJob)
-
+    filters = []
     if user_id:
-        query = query.filter(GenerationJob.user_id == user_id)
+        filters.append(GenerationJob.user_id == user_id)
 
-    jobs = query.all()
-
-    total_cost = sum(job.estimated_cost or 0 for job in jobs)
-    total_jobs = len(jobs)
-    completed_jobs = len([j for j in jobs if j.status == "completed"])
-    failed_jobs = len([j for j in jobs if j.status == "failed"])
-
-    text_jobs = [j for j in jobs if j.job_type == "text"]
-    image_jobs = [j for j in jobs if j.job_type == "image"]
-
-    text_cost = sum(j.estimated_cost or 0 for j in text_jobs)
-    image_cost = sum(j.estimated_cost or 0 for j in image_jobs)
-
-    total_tokens = sum(j.total_tokens or 0 for j in text_jobs)
+    totals = aggregate_job_costs(db, *filters)
 
     return {
-        "total_cost_usd": round(total_cost, 4),
-        "total_jobs": total_jobs,
-        "completed_jobs": completed_jobs,
-        "failed_jobs": failed_jobs,
-        "breakdown": {
-            "text": {
-                "jobs": len(text_jobs),
-                "cost_usd": round(text_cost, 4),
-                "total_tokens": total_tokens
-            },
-            "image": {
-                "jobs": len(image_jobs),
-                "cost_usd": round(image_cost, 4)
-            }
-        }
+        "total_cost_usd": round(totals.cost, 4),
+        "total_jobs": totals.jobs,
+        "completed_jobs": totals.completed_jobs,
+        "failed_jobs": totals.failed_jobs,
+        "breakdown": type_breakdown(totals)
     }
 
 
@@ -2273,224 +2358,22 @@ async def flush_cache():
 
 
 @app.get("/monitoring/dashboard", tags=["monitoring"])
-async def monitoring_dashboard(db: Session = Depends(get_db)):
+async def monitoring_dashboard():
     """
     Comprehensive monitoring dashboard with system metrics and operational statistics
 
     Returns:
     - System health summary
-    - Database statistics
+    - Database statistics (table sizes are pg_class estimates)
     - Cache performance metrics
     - API usage statistics
     - Cost tracking
     - Recent activity
-    """
 
-    dashboard = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "status": "healthy",
-        "system": {},
-        "database": {},
-        "cache": {},
-        "usage": {},
-        "costs": {},
-        "activity": {}
-    }
-
-    # 1. System Health Metrics
-    try:
-        memory = psutil.virtual_memory()
-        disk = shutil.disk_usage("/")
-
-        dashboard["system"] = {
-            "memory": {
-                "total_gb": round(memory.total / (1024**3), 2),
-                "used_gb": round(memory.used / (1024**3), 2),
-                "available_gb": round(memory.available / (1024**3), 2),
-                "percent": memory.percent
-            },
-            "disk": {
-                "total_gb": round(disk.total / (1024**3), 2),
-                "used_gb": round(disk.used / (1024**3), 2),
-                "free_gb": round(disk.free / (1024**3), 2),
-                "percent": round((disk.used / disk.total) * 100, 2)
-            },
-            "uptime": "N/A"  # Could be enhanced with process start time tracking
-        }
-    except Exception as e:
-        dashboard["system"]["error"] = str(e)
-
-    # 2. Database Statistics
-    try:
-        # Count records in each table
-        segments_count = db.query(func.count(Segment.id)).scalar()
-        content_count = db.query(func.count(GeneratedContent.id)).scalar()
-        metrics_count = db.query(func.count(Metric.id)).scalar()
-        jobs_count = db.query(func.count(GenerationJob.id)).scalar()
-        quotas_count = db.query(func.count(UserQuota.user_id)).scalar()
-
-        # Recent activity (last 24 hours)
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        recent_content = db.query(func.count(GeneratedContent.id)).filter(
-            GeneratedContent.created_at >= yesterday
-        ).scalar()
-        recent_jobs = db.query(func.count(GenerationJob.id)).filter(
-            GenerationJob.created_at >= yesterday
-        ).scalar()
-
-        dashboard["database"] = {
-            "tables": {
-                "segments": segments_count,
-                "generated_content": content_count,
-                "metrics": metrics_count,
-                "generation_jobs": jobs_count,
-                "user_quotas": quotas_count
-            },
-            "recent_24h": {
-                "content_generated": recent_content,
-                "jobs_completed": recent_jobs
-            },
-            "status": "connected"
-        }
-    except Exception as e:
-        dashboard["database"]["error"] = str(e)
-        dashboard["status"] = "degraded"
-
-    # 3. Cache Performance Metrics
-    try:
-        cache = get_cache()
-        if cache.enabled:
-            cache_stats = cache.get_stats()
-            dashboard["cache"] = {
-                "status": "connected",
-                "redis_version": cache_stats.get("redis_version", "unknown"),
-                "keys": cache_stats.get("keys", 0),
-                "memory": cache_stats.get("used_memory_human", "unknown"),
-                "hits": cache_stats.get("keyspace_hits", 0),
-                "misses": cache_stats.get("keyspace_misses", 0),
-                "hit_rate": cache_stats.get("hit_rate", 0.0)
-            }
-        else:
-            dashboard["cache"] = {
-                "status": "disabled",
-                "message": "Redis not available, running without cache"
-            }
-    except Exception as e:
-        dashboard["cache"] = {
-            "status": "error",
-            "error": str(e)
-        }
-
-    # 4. API Usage Statistics (last 24 hours)
-    try:
-        yesterday = datetime.utcnow() - timedelta(days=1)
-
-        # Text generation usage
-        text_jobs = db.query(GenerationJob).filter(
-            GenerationJob.job_type == "text",
-            GenerationJob.created_at >= yesterday
-        ).all()
-
-        # Image generation usage
-        image_jobs = db.query(GenerationJob).filter(
-            GenerationJob.job_type == "image",
-            GenerationJob.created_at >= yesterday
-        ).all()
-
-        # Success/failure rates
-        text_successful = sum(1 for job in text_jobs if job.status == "completed")
-        image_successful = sum(1 for job in image_jobs if job.status == "completed")
-
-        dashboard["usage"] = {
-            "last_24h": {
-                "text_generations": {
-                    "total": len(text_jobs),
-                    "successful": text_successful,
-                    "failed": len(text_jobs) - text_successful,
-                    "success_rate": round((text_successful / len(text_jobs) * 100) if text_jobs else 0, 2)
-                },
-                "image_generations": {
-                    "total": len(image_jobs),
-                    "successful": image_successful,
-                    "failed": len(image_jobs) - image_successful,
-                    "success_rate": round((image_successful / len(image_jobs) * 100) if image_jobs else 0, 2)
-                }
-            }
-        }
-    except Exception as e:
-        dashboard["usage"]["error"] = str(e)
-
-    # 5. Cost Tracking (last 24 hours)
-    try:
-        yesterday = datetime.utcnow() - timedelta(days=1)
-
-        recent_jobs = db.query(GenerationJob).filter(
-            GenerationJob.created_at >= yesterday
-        ).all()
-
-        total_cost_24h = sum(job.estimated_cost or 0.0 for job in recent_jobs)
-        total_tokens_24h = sum(job.total_tokens or 0 for job in recent_jobs)
-
-        # This month
-        month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_jobs = db.query(GenerationJob).filter(
-            GenerationJob.created_at >= month_start
-        ).all()
-
-        total_cost_month = sum(job.estimated_cost or 0.0 for job in month_jobs)
-
-        dashboard["costs"] = {
-            "last_24h": {
-                "total_cost_usd": round(total_cost_24h, 4),
-                "total_tokens": total_tokens_24h,
-                "avg_cost_per_request": round(total_cost_24h / len(recent_jobs), 6) if recent_jobs else 0.0
-            },
-            "this_month": {
-                "total_cost_usd": round(total_cost_month, 4),
-                "requests": len(month_jobs)
-            }
-        }
-    except Exception as e:
-        dashboard["costs"]["error"] = str(e)
-
-    # 6. Recent Activity (last 10 jobs)
-    try:
-        recent_activity = db.query(GenerationJob).order_by(
-            GenerationJob.created_at.desc()
-        ).limit(10).all()
-
-        dashboard["activity"] = {
-            "recent_jobs": [
-                {
-                    "id": job.id,
-                    "type": job.job_type,
-                    "status": job.status,
-                    "cost_usd": round(job.estimated_cost or 0.0, 6),
-                    "tokens": job.total_tokens,
-                    "created_at": job.created_at.isoformat() if job.created_at else None
-                }
-                for job in recent_activity
-            ]
-        }
-    except Exception as e:
-        dashboard["activity"]["error"] = str(e)
-
-    # 7. Vector Database Statistics
-    try:
-        vector_client = get_vector_client()
-        collections = vector_client.get_collection_stats()
-
-        dashboard["vector_db"] = {
-            "status": "connected",
-            "collections": collections
-        }
-    except Exception as e:
-        dashboard["vector_db"] = {
-            "status": "error",
-            "error": str(e)
-        }
-
-    return dashboard
+    Served from the snapshot refreshed every MONITORING_SNAPSHOT_INTERVAL seconds
+    in the background; `snapshot_age_seconds` tells how old it is.
+    """
+    return await latest_snapshot()
 
 
 @app.get("/analytics/cache-savings", tags=["analytics"])
@@ -2503,7 +2386,7 @@ async def get_cache_savings(
 
     **Features:**
     - Prompt cache hit/miss rates
-    - Estimated cost savings from caching
+    - Cost savings from caching (actual cost of the generations that hits replaced)
     - Duplicate prompt detection statistics
 
     Query Parameters:
@@ -2512,43 +2395,26 @@ async def get_cache_savings(
     Returns statistics on cache hits, misses, and total cost saved
     """
     try:
-        # Get all generated content
-        query = db.query(GeneratedContent)
-        if user_id:
-            # Note: GeneratedContent doesn't have user_id, would need to add it
-            pass
-
-        all_content = query.all()
-
-        # Separate cached vs non-cached
-        cached_content = [c for c in all_content if c.is_cached_result]
-        generated_content = [c for c in all_content if not c.is_cached_result]
-
-        # Count by type
-        cached_text = [c for c in cached_content if c.content_type == "text"]
-        cached_image = [c for c in cached_content if c.content_type == "image"]
-        generated_text = [c for c in generated_content if c.content_type == "text"]
-        generated_image = [c for c in generated_content if c.content_type == "image"]
-
-        # Calculate costs saved
-        # For text: avg tokens * pricing
-        # For image: fixed pricing per image
-        avg_text_tokens = 500  # Estimate
-        text_cost_per_generation = calculate_text_cost("gpt-3.5-turbo", avg_text_tokens // 2, avg_text_tokens // 2)
-        image_cost_per_generation = calculate_image_cost("dall-e-3", "1024x1024")
-
-        text_cost_saved = len(cached_text) * text_cost_per_generation
-        image_cost_saved = len(cached_image) * image_cost_per_generation
+        # Counters are recorded per request (Redis + cost ledger); no content rows are loaded
+        counters, source = cache_counters(db, user_id)
+        text_counts = counters["text"]
+        image_counts = counters["image"]
+
+        # Cost saved = actual cost of the generations that cache hits replaced
+        text_cost_saved = text_counts["saved_usd"]
+        image_cost_saved = image_counts["saved_usd"]
         total_cost_saved = text_cost_saved + image_cost_saved
 
         # Calculate hit rates
-        total_text = len(cached_text) + len(generated_text)
-        total_image = len(cached_image) + len(generated_image)
-        total_requests = len(all_content)
+        total_hits = text_counts["hits"] + image_counts["hits"]
+        total_misses = text_counts["misses"] + image_counts["misses"]
+        total_text = text_counts["hits"] + text_counts["misses"]
+        total_image = image_counts["hits"] + image_counts["misses"]
+        total_requests = total_hits + total_misses
 
-        text_hit_rate = (len(cached_text) / total_text * 100) if total_text > 0 else 0
-        image_hit_rate = (len(cached_image) / total_image * 100) if total_image > 0 else 0
-        overall_hit_rate = (len(cached_content) / total_requests * 100) if total_requests > 0 else 0
+        text_hit_rate = (text_counts["hits"] / total_text * 100) if total_text > 0 else 0
+        image_hit_rate = (image_counts["hits"] / total_image * 100) if total_image > 0 else 0
+        overall_hit_rate = (total_hits / total_requests * 100) if total_requests > 0 else 0
 
         # Get Vector DB cache stats
         try:
@@ -2565,27 +2431,27 @@ async def get_cache_savings(
                 "overall_hit_rate_percent": round(overall_hit_rate, 2),
                 "text_hit_rate_percent": round(text_hit_rate, 2),
                 "image_hit_rate_percent": round(image_hit_rate, 2),
-                "total_cache_hits": len(cached_content),
-                "total_cache_misses": len(generated_content),
+                "total_cache_hits": total_hits,
+                "total_cache_misses": total_misses,
                 "total_requests": total_requests
             },
             "cost_savings": {
                 "total_saved_usd": round(total_cost_saved, 4),
                 "text_saved_usd": round(text_cost_saved, 4),
                 "image_saved_usd": round(image_cost_saved, 4),
-                "text_cache_hits": len(cached_text),
-                "image_cache_hits": len(cached_image)
+                "text_cache_hits": text_counts["hits"],
+                "image_cache_hits": image_counts["hits"]
             },
             "breakdown": {
                 "text": {
-                    "cache_hits": len(cached_text),
-                    "cache_misses": len(generated_text),
+                    "cache_hits": text_counts["hits"],
+                    "cache_misses": text_counts["misses"],
                     "total": total_text,
                     "hit_rate_percent": round(text_hit_rate, 2)
                 },
                 "image": {
-                    "cache_hits": len(cached_image),
-                    "cache_misses": len(generated_image),
+                    "cache_hits": image_counts["hits"],
+                    "cache_misses": image_counts["misses"],
                     "total": total_image,
                     "hit_rate_percent": round(image_hit_rate, 2)
                 }
@@ -2593,7 +2459,8 @@ async def get_cache_savings(
             "cache_collection": {
                 "size": cache_collection_size,
                 "description": "Total unique prompts cached in Vector DB"
-            }
+            },
+            "source": source
         }
 
     except Exception as e:
@@ -0,0 +1,122 @@
+"""
+Metrics Time Series
+Time-bucketed metric queries (date_trunc in SQL) with LTTB downsampling to a fixed point budget
+"""
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from sqlalchemy import func, Float
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import aggregate_order_by, ARRAY
+
+from database import Metric
+
+METRIC_BUCKETS = ("hour", "day", "week")
+METRIC_AGGREGATIONS = ("sum", "avg", "last")
+DEFAULT_MAX_POINTS = 500
+
+
+def _aggregate(aggregation: str):
+    if aggregation == "sum":
+        return func.sum(Metric.metric_value)
+    if aggregation == "avg":
+        return func.avg(Metric.metric_value)
+    # last: value of the latest row in the bucket
+    return func.array_agg(
+        aggregate_order_by(Metric.metric_value, Metric.timestamp.desc()),
+        type_=ARRAY(Float)
+    )[1]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape
+
+    The first and last points are always kept; every bucket in between keeps the point
+    forming the largest triangle with the previously kept point and the next bucket's mean.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def bucketed_series(
+    db: Session,
+    project_id: int,
+    bucket: str = "hour",
+    aggregation: str = "avg",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    metric_names: Optional[List[str]] = None,
+    max_points: int = DEFAULT_MAX_POINTS
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Metric series of a project, one aggregated point per time bucket
+
+    One grouped query served by the (project_id, metric_name, timestamp) index;
+    series longer than max_points are reduced with LTTB.
+
+    Raises:
+        ValueError: Unknown bucket or aggregation
+    """
+    if bucket not in METRIC_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(METRIC_BUCKETS)}")
+    if aggregation not in METRIC_AGGREGATIONS:
+        raise ValueError(f"aggregation must be one of {', '.join(METRIC_AGGREGATIONS)}")
+
+    bucket_start = func.date_trunc(bucket, Metric.timestamp).label("bucket")
+    query = db.query(
+        Metric.metric_name,
+        bucket_start,
+        _aggregate(aggregation).label("value")
+    ).filter(Metric.project_id == project_id)
+
+    if start_date:
+        query = query.filter(Metric.timestamp >= start_date)
+    if end_date:
+        query = query.filter(Metric.timestamp <= end_date)
+    if metric_names:
+        query = query.filter(Metric.metric_name.in_(metric_names))
+
+    rows = query.group_by(Metric.metric_name, bucket_start).order_by(Metric.metric_name, bucket_start).all()
+
+    columns: Dict[str, tuple] = {}
+    for row in rows:
+        timestamps, values = columns.setdefault(row.metric_name, ([], []))
+        timestamps.append(row.bucket)
+        values.append(float(row.value) if row.value is not None else 0.0)
+
+    series = {}
+    for name, (timestamps, values) in columns.items():
+        if len(timestamps) > max_points:
+            x = np.fromiter((t.timestamp() for t in timestamps), dtype=np.float64, count=len(timestamps))
+            keep = lttb_indices(x, np.asarray(values), max_points)
+            timestamps = [timestamps[i] for i in keep]
+            values = [values[i] for i in keep]
+        series[name] = [
+            {"value": value, "timestamp": timestamp.isoformat()}
+            for timestamp, value in zip(timestamps, values)
+        ]
+    return series
@@ -0,0 +1,292 @@
+"""
+Monitoring Dashboard Snapshot
+Background-refreshed /monitoring/dashboard payload: sections are gathered concurrently
+every MONITORING_SNAPSHOT_INTERVAL seconds, table sizes come from pg_class estimates
+"""
+import os
+import time
+import shutil
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+import psutil
+from sqlalchemy import func, text, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from dotenv import load_dotenv
+
+from database import SessionLocal, Segment, GeneratedContent, Metric, GenerationJob, UserQuota, Event
+from cost_ledger import aggregate_job_costs
+from embedding_batcher import embedding_batcher_stats
+from cache import get_cache
+from vector_client import get_vector_client
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("monitoring_snapshot")
+
+MONITORING_SNAPSHOT_INTERVAL = int(os.getenv("MONITORING_SNAPSHOT_INTERVAL", "30"))
+
+# Dashboard key -> table
+DASHBOARD_TABLES = {
+    "segments": Segment.__tablename__,
+    "generated_content": GeneratedContent.__tablename__,
+    "metrics": Metric.__tablename__,
+    "generation_jobs": GenerationJob.__tablename__,
+    "user_quotas": UserQuota.__tablename__,
+    "events": Event.__tablename__,
+}
+
+# reltuples of partitioned parents is not maintained, so sum their partitions;
+# -1 means the table was never vacuumed/analyzed
+ESTIMATED_ROWS_SQL = text("""
+    SELECT c.relname,
+           CASE WHEN c.relkind = 'p' THEN (
+               SELECT coalesce(sum(greatest(p.reltuples, 0)), 0)
+               FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhrelid
+               WHERE i.inhparent = c.oid
+           ) ELSE c.reltuples END AS estimate
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema()
+      AND c.relkind IN ('r', 'p')
+      AND c.relname = ANY(:names)
+""").bindparams(bindparam("names", type_=ARRAY(String)))
+
+# Latest snapshot of this worker and the monotonic time it was built
+_snapshot: Optional[Tuple[Dict[str, Any], float]] = None
+
+
+def estimated_row_counts(db, tables: Dict[str, str] = DASHBOARD_TABLES) -> Dict[str, int]:
+    """
+    Approximate row counts from the planner statistics (no table scans)
+
+    Tables without statistics yet fall back to an exact count(*); they are
+    empty or were just created, so the scan is cheap.
+    """
+    estimates = {
+        row.relname: row.estimate
+        for row in db.execute(ESTIMATED_ROWS_SQL, {"names": list(tables.values())})
+    }
+
+    counts = {}
+    for key, table in tables.items():
+        estimate = estimates.get(table)
+        if estimate is None or estimate < 0:
+            estimate = db.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+        counts[key] = int(estimate)
+    return counts
+
+
+def _system_section() -> Dict[str, Any]:
+    memory = psutil.virtual_memory()
+    disk = shutil.disk_usage("/")
+
+    return {
+        "memory": {
+            "total_gb": round(memory.total / (1024**3), 2),
+            "used_gb": round(memory.used / (1024**3), 2),
+            "available_gb": round(memory.available / (1024**3), 2),
+            "percent": memory.percent
+        },
+        "disk": {
+            "total_gb": round(disk.total / (1024**3), 2),
+            "used_gb": round(disk.used / (1024**3), 2),
+            "free_gb": round(disk.free / (1024**3), 2),
+            "percent": round((disk.used / disk.total) * 100, 2)
+        },
+        "uptime": "N/A"  # Could be enhanced with process start time tracking
+    }
+
+
+def _database_section() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        recent_content = db.query(func.count(GeneratedContent.id)).filter(
+            GeneratedContent.created_at >= yesterday
+        ).scalar()
+        recent_jobs = db.query(func.count(GenerationJob.id)).filter(
+            GenerationJob.created_at >= yesterday
+        ).scalar()
+
+        return {
+            "tables": estimated_row_counts(db),
+            "table_counts": "estimated",
+            "recent_24h": {
+                "content_generated": recent_content,
+                "jobs_completed": recent_jobs
+            },
+            "status": "connected"
+        }
+    finally:
+        db.close()
+
+
+def _cache_section() -> Dict[str, Any]:
+    cache = get_cache()
+    if not cache.enabled:
+        return {
+            "status": "disabled",
+            "message": "Redis not available, running without cache"
+        }
+
+    cache_stats = cache.get_stats()
+    return {
+        "status": "connected",
+        "redis_version": cache_stats.get("redis_version", "unknown"),
+        "keys": cache_stats.get("keys", 0),
+        "memory": cache_stats.get("used_memory_human", "unknown"),
+        "hits": cache_stats.get("keyspace_hits", 0),
+        "misses": cache_stats.get("keyspace_misses", 0),
+        "hit_rate": cache_stats.get("hit_rate", 0.0)
+    }
+
+
+def _usage_and_costs_sections() -> Dict[str, Dict[str, Any]]:
+    """API usage (last 24 hours) and cost tracking share the 24h aggregate"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        last_24h = aggregate_job_costs(db, GenerationJob.created_at >= now - timedelta(days=1))
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        this_month = aggregate_job_costs(db, GenerationJob.created_at >= month_start)
+    finally:
+        db.close()
+
+    def success_stats(total: int, successful: int) -> dict:
+        return {
+            "total": total,
+            "successful": successful,
+            "failed": total - successful,
+            "success_rate": round((successful / total * 100) if total else 0, 2)
+        }
+
+    return {
+        "usage": {
+            "last_24h": {
+                "text_generations": success_stats(last_24h.text_jobs, last_24h.text_completed),
+                "image_generations": success_stats(last_24h.image_jobs, last_24h.image_completed)
+            }
+        },
+        "costs": {
+            "last_24h": {
+                "total_cost_usd": round(last_24h.cost, 4),
+                "total_tokens": int(last_24h.tokens),
+                "avg_cost_per_request": round(last_24h.cost / last_24h.jobs, 6) if last_24h.jobs else 0.0
+            },
+            "this_month": {
+                "total_cost_usd": round(this_month.cost, 4),
+                "requests": this_month.jobs
+            }
+        }
+    }
+
+
+def _activity_section() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        recent_jobs = db.query(
+            GenerationJob.id, GenerationJob.job_type, GenerationJob.status,
+            GenerationJob.estimated_cost, GenerationJob.total_tokens, GenerationJob.created_at
+        ).order_by(GenerationJob.created_at.desc()).limit(10).all()
+    finally:
+        db.close()
+
+    return {
+        "recent_jobs": [
+            {
+                "id": job.id,
+                "type": job.job_type,
+                "status": job.status,
+                "cost_usd": round(job.estimated_cost or 0.0, 6),
+                "tokens": job.total_tokens,
+                "created_at": job.created_at.isoformat() if job.created_at else None
+            }
+            for job in recent_jobs
+        ]
+    }
+
+
+def _vector_db_section() -> Dict[str, Any]:
+    return {
+        "status": "connected",
+        "collections": get_vector_client().get_collection_stats()
+    }
+
+
+async def build_snapshot() -> Dict[str, Any]:
+    """
+    Compute every dashboard section concurrently (one worker thread each)
+
+    A failing section reports its error without affecting the others.
+    """
+    started = time.perf_counter()
+    system, database, cache, usage_costs, activity, vector_db = await asyncio.gather(
+        asyncio.to_thread(_system_section),
+        asyncio.to_thread(_database_section),
+        asyncio.to_thread(_cache_section),
+        asyncio.to_thread(_usage_and_costs_sections),
+        asyncio.to_thread(_activity_section),
+        asyncio.to_thread(_vector_db_section),
+        return_exceptions=True
+    )
+
+    dashboard = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "status": "healthy",
+        "system": system if not isinstance(system, Exception) else {"error": str(system)},
+        "database": database if not isinstance(database, Exception) else {"error": str(database)},
+        "cache": cache if not isinstance(cache, Exception) else {"status": "error", "error": str(cache)},
+        "usage": {},
+        "costs": {},
+        "activity": activity if not isinstance(activity, Exception) else {"error": str(activity)},
+        "vector_db": vector_db if not isinstance(vector_db, Exception) else {"status": "error", "error": str(vector_db)},
+        "embedding_batchers": embedding_batcher_stats(),
+    }
+    if isinstance(usage_costs, Exception):
+        dashboard["usage"] = {"error": str(usage_costs)}
+        dashboard["costs"] = {"error": str(usage_costs)}
+    else:
+        dashboard.update(usage_costs)
+    if isinstance(database, Exception):
+        dashboard["status"] = "degraded"
+
+    dashboard["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return dashboard
+
+
+async def refresh_snapshot() -> Dict[str, Any]:
+    """Rebuild and store the snapshot of this worker"""
+    global _snapshot
+    snapshot = await build_snapshot()
+    _snapshot = (snapshot, time.monotonic())
+    return snapshot
+
+
+async def latest_snapshot() -> Dict[str, Any]:
+    """
+    Latest snapshot with its age in seconds
+
+    Builds one synchronously only when the background loop has not produced one yet.
+    """
+    if _snapshot is None:
+        await refresh_snapshot()
+    snapshot, built_at = _snapshot
+
+    return {
+        **snapshot,
+        "snapshot_age_seconds": round(time.monotonic() - built_at, 1),
+        "refresh_interval_seconds": MONITORING_SNAPSHOT_INTERVAL
+    }
+
+
+async def monitoring_snapshot_loop(interval: int = MONITORING_SNAPSHOT_INTERVAL):
+    """Background loop started from the FastAPI startup hook"""
+    while True:
+        try:
+            await refresh_snapshot()
+        except Exception as e:
+            logger.error(f"Monitoring snapshot failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
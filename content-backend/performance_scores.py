@@ -0,0 +1,158 @@
+"""
+Creative Performance Scores
+Scheduled batch recomputation of CTR / CVR / performance_score for creatives with new events
+"""
+import os
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func, select, update, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from dotenv import load_dotenv
+
+from database import SessionLocal, Creative, Event, JobWatermark
+from leaderboards import refresh_creatives, CTR_WEIGHT, CVR_WEIGHT
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("performance_scores")
+
+JOB_NAME = "creative_performance_scores"
+PERFORMANCE_SCORE_INTERVAL = int(os.getenv("PERFORMANCE_SCORE_INTERVAL", "900"))  # 15 minutes
+PERFORMANCE_SCORE_CHUNK_SIZE = int(os.getenv("PERFORMANCE_SCORE_CHUNK_SIZE", "500"))
+# Re-scan this much before the watermark so events committed late are not missed
+PERFORMANCE_SCORE_LAG_SECONDS = int(os.getenv("PERFORMANCE_SCORE_LAG_SECONDS", "300"))
+
+# Serializes runs across workers/replicas
+ADVISORY_LOCK_KEY = 72026034
+
+
+def aggregate_changed_creatives(db: Session, since: Optional[datetime]) -> List[Any]:
+    """
+    All-time impressions/clicks/conversions of creatives that got events since `since`
+
+    One aggregate query; the changed-creative subquery only scans partitions after `since`.
+    """
+    changed = select(Event.creative_id).where(Event.creative_id.isnot(None))
+    if since is not None:
+        changed = changed.where(Event.created_at >= since)
+
+    return db.query(
+        Creative.id.label("creative_id"),
+        Creative.campaign_id,
+        Creative.content_type,
+        func.count(Event.id).filter(Event.event_type == 'impression').label("impressions"),
+        func.count(Event.id).filter(Event.event_type == 'click').label("clicks"),
+        func.count(Event.id).filter(Event.event_type == 'conversion').label("conversions")
+    ).join(
+        Event, Event.creative_id == Creative.id
+    ).filter(
+        Creative.id.in_(changed.distinct().scalar_subquery())
+    ).group_by(Creative.id, Creative.campaign_id, Creative.content_type).all()
+
+
+def score_row(row: Any) -> Dict[str, Any]:
+    """CTR, CVR and performance_score (CTR 60%, CVR 40%) for one aggregate row"""
+    ctr = row.clicks / row.impressions if row.impressions > 0 else 0.0
+    cvr = min(row.conversions / row.clicks, 1.0) if row.clicks > 0 else 0.0
+    return {
+        "performance_score": ctr * CTR_WEIGHT + cvr * CVR_WEIGHT,
+        "impressions": row.impressions,
+        "clicks": row.clicks,
+        "conversions": row.conversions,
+        "ctr": round(ctr, 4),
+        "cvr": round(cvr, 4)
+    }
+
+
+def recompute_performance_scores(db: Session, full: bool = False) -> Dict[str, Any]:
+    """
+    Recompute scores for creatives whose events changed since the last run
+
+    Args:
+        full: Ignore the watermark and recompute every creative with events
+
+    Returns:
+        Summary dict (skipped / creatives / since / watermark)
+    """
+    locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+    if not locked:
+        return {"skipped": True, "reason": "recomputation already running"}
+
+    started_at = datetime.utcnow()
+    state = db.query(JobWatermark).filter(JobWatermark.job_name == JOB_NAME).first()
+    since = None
+    if state and not full:
+        since = state.watermark - timedelta(seconds=PERFORMANCE_SCORE_LAG_SECONDS)
+
+    rows = aggregate_changed_creatives(db, since)
+    scores = {row.creative_id: score_row(row) for row in rows}
+
+    # Bulk UPDATE by primary key, in chunks
+    mappings = [
+        {"id": creative_id, "performance_score": score["performance_score"], "updated_at": started_at}
+        for creative_id, score in scores.items()
+    ]
+    for start in range(0, len(mappings), PERFORMANCE_SCORE_CHUNK_SIZE):
+        db.execute(update(Creative), mappings[start:start + PERFORMANCE_SCORE_CHUNK_SIZE])
+
+    stmt = insert(JobWatermark).values(job_name=JOB_NAME, watermark=started_at, updated_at=started_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[JobWatermark.job_name],
+        set_={"watermark": stmt.excluded.watermark, "updated_at": stmt.excluded.updated_at}
+    ))
+    db.commit()
+
+    # Creatives are not indexed in Chroma (its text_/image_ documents are generated_content
+    # rows), so there is no vector metadata to update here
+    refresh_creatives(rows)
+
+    return {
+        "skipped": False,
+        "creatives": len(rows),
+        "since": since.isoformat() if since else None,
+        "watermark": started_at.isoformat()
+    }
+
+
+def run_performance_scores(full: bool = False) -> Dict[str, Any]:
+    """Run one recomputation with its own session"""
+    db = SessionLocal()
+    try:
+        return recompute_performance_scores(db, full)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def performance_score_loop(interval: int = PERFORMANCE_SCORE_INTERVAL):
+    """Background loop started from the FastAPI startup hook"""
+    while True:
+        try:
+            result = await asyncio.to_thread(run_performance_scores)
+            if not result.get("skipped") and result["creatives"]:
+                logger.info(f"Performance scores: {result['creatives']} creatives")
+        except Exception as e:
+            logger.error(f"Performance score recomputation failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+def main():
+    """Run the recomputation once (cron / manual use)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recompute creative performance scores from events")
+    parser.add_argument("--full", action="store_true", help="Recompute every creative, ignoring the watermark")
+    args = parser.parse_args()
+
+    result = run_performance_scores(args.full)
+    logger.info(f"✅ Performance score recomputation finished: {result}")
+
+
+if __name__ == "__main__":
+    main()
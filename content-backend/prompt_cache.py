@@ -0,0 +1,403 @@
+"""
+Prompt Cache Maintenance
+Stable entry ids, per-model TTLs, result lookup by reference (generated_content rows,
+fronted by Redis), and the periodic compaction that merges near-duplicate entries, drops
+expired ones and evicts (LRU / LFU) down to the entry / byte budget
+"""
+import os
+import time
+import asyncio
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from dotenv import load_dotenv
+
+from database import SessionLocal, JobWatermark, GeneratedContent
+from cache import get_cache
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("prompt_cache")
+
+JOB_NAME = "prompt_cache_compaction"
+
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "50000"))
+PROMPT_CACHE_MAX_BYTES = int(os.getenv("PROMPT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+PROMPT_CACHE_EVICTION = os.getenv("PROMPT_CACHE_EVICTION", "lru")  # 'lru' or 'lfu'
+# Evict down to this share of the budget so every run does not evict again
+PROMPT_CACHE_EVICT_TO = float(os.getenv("PROMPT_CACHE_EVICT_TO", "0.9"))
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", str(7 * 86400)))
+# Per-model TTL overrides: "model:seconds,..." (DALL-E image URLs expire after an hour)
+PROMPT_CACHE_MODEL_TTLS = os.getenv("PROMPT_CACHE_MODEL_TTLS", "dall-e-3:3600,dall-e-2:3600")
+PROMPT_CACHE_MERGE_SIMILARITY = float(os.getenv("PROMPT_CACHE_MERGE_SIMILARITY", "0.98"))
+PROMPT_CACHE_COMPACTION_INTERVAL = int(os.getenv("PROMPT_CACHE_COMPACTION_INTERVAL", "3600"))
+PROMPT_CACHE_BATCH_SIZE = int(os.getenv("PROMPT_CACHE_BATCH_SIZE", "500"))
+
+# Cached results mirrored in Redis (small ones only; image data URLs stay in Postgres)
+PROMPT_CACHE_RESULT_TTL = int(os.getenv("PROMPT_CACHE_RESULT_TTL", "3600"))
+PROMPT_CACHE_RESULT_REDIS_MAX_BYTES = int(os.getenv("PROMPT_CACHE_RESULT_REDIS_MAX_BYTES", "65536"))
+RESULT_KEY_PREFIX = "prompt_cache:result:"
+
+MERGE_NEIGHBORS = 4
+
+# Serializes compaction across workers/replicas
+ADVISORY_LOCK_KEY = 72026045
+
+
+def _parse_model_ttls(raw: str) -> Dict[str, int]:
+    ttls = {}
+    for entry in filter(None, (part.strip() for part in raw.split(","))):
+        model, _, seconds = entry.rpartition(":")
+        try:
+            ttls[model] = int(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring malformed PROMPT_CACHE_MODEL_TTLS entry: {entry}")
+    return ttls
+
+
+MODEL_TTLS = _parse_model_ttls(PROMPT_CACHE_MODEL_TTLS)
+
+
+def cache_entry_id(job_type: str, model: str, prompt: str) -> str:
+    """Stable id of a cache entry: the same prompt for the same model maps to one entry"""
+    digest = hashlib.sha256(f"{job_type}\n{model}\n{prompt.strip()}".encode("utf-8")).hexdigest()[:32]
+    return f"cache_{job_type}_{digest}"
+
+
+def entry_ttl(model: str) -> int:
+    """TTL in seconds of entries generated by `model`"""
+    return MODEL_TTLS.get(model, PROMPT_CACHE_TTL_SECONDS)
+
+
+def entry_size(prompt: str, result: str) -> int:
+    return len(prompt.encode("utf-8")) + len(result.encode("utf-8"))
+
+
+def fetch_cached_results(db: Session, content_ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Results of generated_content rows referenced by cache entries
+
+    One Redis MGET, then one Postgres query for the misses; small results are
+    written back to Redis.
+    """
+    content_ids = list(dict.fromkeys(int(content_id) for content_id in content_ids))
+    if not content_ids:
+        return {}
+
+    results: Dict[int, str] = {}
+    cache = get_cache()
+    if cache.enabled:
+        try:
+            values = cache.client.mget([f"{RESULT_KEY_PREFIX}{content_id}" for content_id in content_ids])
+            for content_id, value in zip(content_ids, values):
+                if value is not None:
+                    results[content_id] = json.loads(value)
+        except Exception as e:
+            logger.warning(f"Prompt cache result MGET failed: {e}")
+
+    missing = [content_id for content_id in content_ids if content_id not in results]
+    if missing:
+        rows = db.query(GeneratedContent.id, GeneratedContent.result).filter(GeneratedContent.id.in_(missing)).all()
+        fetched = {row.id: row.result for row in rows}
+        results.update(fetched)
+
+        if cache.enabled and fetched:
+            try:
+                pipe = cache.client.pipeline(transaction=False)
+                for content_id, result in fetched.items():
+                    if len(result) <= PROMPT_CACHE_RESULT_REDIS_MAX_BYTES:
+                        pipe.setex(f"{RESULT_KEY_PREFIX}{content_id}", PROMPT_CACHE_RESULT_TTL, json.dumps(result))
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Prompt cache result write-back failed: {e}")
+
+    return results
+
+
+def resolve_cached_result(db: Session, cache_hit: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Result of a search_prompt_cache() hit (None when there is no hit or the row is gone)"""
+    if not cache_hit:
+        return None
+    if cache_hit.get("content_id") is None:
+        return cache_hit.get("cached_result")  # entry written before results were stored by reference
+    return fetch_cached_results(db, [cache_hit["content_id"]]).get(int(cache_hit["content_id"]))
+
+
+def _entry_bytes(metadata: Dict[str, Any]) -> int:
+    if "size_bytes" in metadata:
+        return int(metadata["size_bytes"])
+    return int(metadata.get("prompt_length", 0)) + int(metadata.get("result_length", 0))
+
+
+def _eviction_key(metadata: Dict[str, Any]) -> Tuple:
+    """Sort key, least valuable first"""
+    last_used = metadata.get("last_hit_ts") or metadata.get("cached_at_ts") or 0.0
+    if PROMPT_CACHE_EVICTION == "lfu":
+        return (metadata.get("hit_count", 0), last_used)
+    return (last_used, metadata.get("hit_count", 0))
+
+
+def _delete(collection, ids: List[str]) -> None:
+    for start in range(0, len(ids), PROMPT_CACHE_BATCH_SIZE):
+        collection.delete(ids=ids[start:start + PROMPT_CACHE_BATCH_SIZE])
+
+
+def merge_near_duplicates(collection, since_ts: float, similarity) -> Dict[str, int]:
+    """
+    Fold entries added since `since_ts` into near-identical older entries
+
+    Neighbors of every new entry are looked up in batches; pairs with the same
+    job_type / model and similarity >= PROMPT_CACHE_MERGE_SIMILARITY collapse into
+    the entry with more hits (the newer one on ties), which inherits the hit count.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}  # kept id -> metadata
+    removed = set()
+
+    offset = 0
+    while True:
+        page = collection.get(
+            where={"cached_at_ts": {"$gte": since_ts}},
+            limit=PROMPT_CACHE_BATCH_SIZE, offset=offset,
+            include=["embeddings", "metadatas"]
+        )
+        if not len(page["ids"]):
+            break
+        offset += len(page["ids"])
+
+        neighbors = collection.query(
+            query_embeddings=page["embeddings"],
+            n_results=MERGE_NEIGHBORS + 1,
+            include=["metadatas", "distances"]
+        )
+        for doc_id, metadata, ids, metadatas, distances in zip(
+            page["ids"], page["metadatas"], neighbors["ids"], neighbors["metadatas"], neighbors["distances"]
+        ):
+            if doc_id in removed:
+                continue
+            for other_id, other, distance in zip(ids, metadatas, distances):
+                if other_id == doc_id or other_id in removed or similarity(distance) < PROMPT_CACHE_MERGE_SIMILARITY:
+                    continue
+                if (other.get("job_type"), other.get("model")) != (metadata.get("job_type"), metadata.get("model")):
+                    continue
+
+                current = merged.get(doc_id, metadata)
+                other = merged.get(other_id, other)
+                keep_id, keep, drop_id, drop = doc_id, current, other_id, other
+                if (other.get("hit_count", 0), other.get("cached_at_ts", 0)) > (current.get("hit_count", 0), current.get("cached_at_ts", 0)):
+                    keep_id, keep, drop_id, drop = other_id, other, doc_id, current
+
+                keep = dict(keep)
+                keep["hit_count"] = keep.get("hit_count", 0) + drop.get("hit_count", 0)
+                keep["last_hit_ts"] = max(keep.get("last_hit_ts", 0.0), drop.get("last_hit_ts", 0.0))
+                merged[keep_id] = keep
+                merged.pop(drop_id, None)
+                removed.add(drop_id)
+                if drop_id == doc_id:
+                    break
+
+    if merged:
+        ids = list(merged)
+        for start in range(0, len(ids), PROMPT_CACHE_BATCH_SIZE):
+            chunk = ids[start:start + PROMPT_CACHE_BATCH_SIZE]
+            collection.update(ids=chunk, metadatas=[merged[doc_id] for doc_id in chunk])
+    _delete(collection, list(removed))
+    return {"merged": len(removed)}
+
+
+def expire_and_evict(collection, now_ts: float) -> Dict[str, int]:
+    """
+    Delete expired entries, then evict by policy until the cache fits its budget
+
+    Entries written before TTLs existed have no expires_at_ts and are dropped.
+    """
+    expired, live = [], []
+    offset = 0
+    while True:
+        page = collection.get(limit=PROMPT_CACHE_BATCH_SIZE, offset=offset, include=["metadatas"])
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = metadata or {}
+            if metadata.get("expires_at_ts", 0.0) <= now_ts:
+                expired.append(doc_id)
+            else:
+                live.append((doc_id, metadata))
+
+    evicted = []
+    total_bytes = sum(_entry_bytes(metadata) for _, metadata in live)
+    if len(live) > PROMPT_CACHE_MAX_ENTRIES or total_bytes > PROMPT_CACHE_MAX_BYTES:
+        max_entries = int(PROMPT_CACHE_MAX_ENTRIES * PROMPT_CACHE_EVICT_TO)
+        max_bytes = int(PROMPT_CACHE_MAX_BYTES * PROMPT_CACHE_EVICT_TO)
+        remaining = len(live)
+        for doc_id, metadata in sorted(live, key=lambda item: _eviction_key(item[1])):
+            if remaining <= max_entries and total_bytes <= max_bytes:
+                break
+            evicted.append(doc_id)
+            remaining -= 1
+            total_bytes -= _entry_bytes(metadata)
+
+    _delete(collection, expired + evicted)
+    return {"expired": len(expired), "evicted": len(evicted), "entries": len(live) - len(evicted), "bytes": total_bytes}
+
+
+def slim_prompt_cache(db: Session, vector_client) -> Dict[str, int]:
+    """
+    Replace results stored inside cache entry metadata with generated_content pointers
+
+    Each entry is matched to the generated_content row with the same prompt, model and
+    result (compared by md5); entries without one get a row inserted. The `result`
+    key is then removed from the entry metadata.
+
+    Only unexpired entries are slimmed: entries written before TTLs (no
+    expires_at_ts) never match a search and are deleted by the next compaction,
+    and expired ones are about to be, so no rows are inserted for them.
+    """
+    collection = vector_client.prompt_cache_collection
+    live = {"expires_at_ts": {"$gt": time.time()}}
+    slimmed = inserted = 0
+    offset = 0
+    while True:
+        page = collection.get(
+            where=live, limit=PROMPT_CACHE_BATCH_SIZE, offset=offset, include=["documents", "metadatas"]
+        )
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+
+        entries = [
+            (doc_id, prompt, metadata)
+            for doc_id, prompt, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+            if metadata and metadata.get("result") is not None and metadata.get("content_id") is None
+        ]
+        if not entries:
+            continue
+
+        rows = db.query(
+            GeneratedContent.id, GeneratedContent.prompt, GeneratedContent.model,
+            func.md5(GeneratedContent.result).label("result_md5")
+        ).filter(
+            GeneratedContent.prompt.in_({prompt for _, prompt, _ in entries}),
+            GeneratedContent.is_cached_result.isnot(True)
+        ).all()
+        by_content = {(row.prompt, row.model, row.result_md5): row.id for row in rows}
+
+        ids, metadatas = [], []
+        for doc_id, prompt, metadata in entries:
+            result = metadata["result"]
+            key = (prompt, metadata.get("model"), hashlib.md5(result.encode("utf-8")).hexdigest())
+            content_id = by_content.get(key)
+            if content_id is None:
+                record = GeneratedContent(
+                    content_type=metadata.get("job_type", "text"), prompt=prompt,
+                    result=result, model=metadata.get("model")
+                )
+                db.add(record)
+                db.flush()
+                content_id = by_content[key] = record.id
+                inserted += 1
+
+            ids.append(doc_id)
+            metadatas.append({"content_id": content_id, "result": None, "size_bytes": entry_size(prompt, "")})
+        db.commit()
+
+        # Metadata updates merge keys; None removes the key
+        collection.update(ids=ids, metadatas=metadatas)
+        slimmed += len(ids)
+        logger.info(f"Prompt cache: {slimmed} entries slimmed")
+
+    return {"slimmed": slimmed, "rows_inserted": inserted}
+
+
+def compact_prompt_cache(db: Session, vector_client, full: bool = False) -> Dict[str, Any]:
+    """
+    One compaction pass: merge near-duplicates added since the last run, expire, evict
+
+    Returns:
+        Summary dict (skipped / merged / expired / evicted / entries / bytes)
+    """
+    locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+    if not locked:
+        return {"skipped": True, "reason": "compaction already running"}
+
+    started_at = datetime.utcnow()
+    state = db.query(JobWatermark).filter(JobWatermark.job_name == JOB_NAME).first()
+    since_ts = 0.0 if full or not state else (state.watermark - datetime(1970, 1, 1)).total_seconds()
+
+    collection = vector_client.prompt_cache_collection
+    result = merge_near_duplicates(
+        collection, since_ts, lambda distance: vector_client._similarity(collection, distance)
+    )
+    result.update(expire_and_evict(collection, time.time()))
+
+    stmt = insert(JobWatermark).values(job_name=JOB_NAME, watermark=started_at, updated_at=started_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[JobWatermark.job_name],
+        set_={"watermark": stmt.excluded.watermark, "updated_at": stmt.excluded.updated_at}
+    ))
+    db.commit()
+
+    return {"skipped": False, **result}
+
+
+def run_prompt_cache_compaction(full: bool = False) -> Dict[str, Any]:
+    """Run one compaction with its own session"""
+    from vector_client import get_vector_client
+
+    db = SessionLocal()
+    try:
+        return compact_prompt_cache(db, get_vector_client(), full)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def prompt_cache_compaction_loop(interval: int = PROMPT_CACHE_COMPACTION_INTERVAL):
+    """Background loop started from the FastAPI startup hook"""
+    while True:
+        try:
+            result = await asyncio.to_thread(run_prompt_cache_compaction)
+            if not result.get("skipped") and (result["merged"] or result["expired"] or result["evicted"]):
+                logger.info(
+                    f"Prompt cache compaction: {result['merged']} merged, {result['expired']} expired, "
+                    f"{result['evicted']} evicted, {result['entries']} entries left"
+                )
+        except Exception as e:
+            logger.error(f"Prompt cache compaction failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+def main():
+    """Run compaction once (cron / manual use)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact the semantic prompt cache")
+    parser.add_argument("--full", action="store_true", help="Look for near-duplicates among all entries, not only new ones")
+    parser.add_argument("--slim", action="store_true", help="Move results stored in entry metadata to generated_content pointers")
+    args = parser.parse_args()
+
+    if args.slim:
+        from vector_client import get_vector_client
+
+        db = SessionLocal()
+        try:
+            result = slim_prompt_cache(db, get_vector_client())
+        finally:
+            db.close()
+        logger.info(f"✅ Prompt cache slimmed: {result}")
+        return
+
+    result = run_prompt_cache_compaction(args.full)
+    logger.info(f"✅ Prompt cache compaction finished: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,10 @@ Supabase Storage Client for managing assets (images, videos)
 Handles upload, download, URL generation, and thumbnail creation
 """
 import os
+import shutil
 import hashlib
 import mimetypes
-from typing import Optional, Tuple
+from typing import BinaryIO, Optional, Tuple, Union
 from datetime import timedelta
 from io import BytesIO
 from PIL import Image
@@ -319,6 +320,106 @@ class StorageClient:
             logger.error(f"File deletion error: {str(e)}", exc_info=True)
             return False
 
+    def put_object(
+        self,
+        file_path: str,
+        data: Union[bytes, BinaryIO],
+        content_type: str = "application/octet-stream",
+        bucket: Optional[str] = None
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Write bytes at an exact path, overwriting any existing object (no validation or renaming)
+
+        Args:
+            file_path: Path inside the bucket (or local storage directory)
+            data: Bytes, or a binary file positioned at the start (streamed, not read into memory)
+            bucket: Supabase bucket (default: STORAGE_BUCKET)
+
+        Returns:
+            Tuple of (success, error_message)
+        """
+        try:
+            if self.use_supabase:
+                url = f"{self.storage_url}/object/{bucket or self.storage_bucket}/{file_path}"
+                headers = {**self.headers, "Content-Type": content_type, "x-upsert": "true"}
+                response = requests.post(url, headers=headers, data=data)
+                if response.status_code in [200, 201]:
+                    logger.info(f"Object written to Supabase: {file_path}")
+                    return True, None
+                error_msg = f"Supabase upload failed: {response.status_code} - {response.text}"
+                logger.error(error_msg)
+                return False, error_msg
+
+            full_path = os.path.join(self.local_storage_path, file_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as f:
+                if isinstance(data, bytes):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f)
+            logger.info(f"Object written locally: {full_path}")
+            return True, None
+
+        except Exception as e:
+            error_msg = f"Object write error: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            return False, error_msg
+
+    def get_object(self, file_path: str, bucket: Optional[str] = None) -> Optional[bytes]:
+        """
+        Read an object written with put_object()
+
+        Returns:
+            Object bytes or None if missing/unreadable
+        """
+        try:
+            if self.use_supabase:
+                url = f"{self.storage_url}/object/{bucket or self.storage_bucket}/{file_path}"
+                response = requests.get(url, headers=self.headers)
+                if response.status_code == 200:
+                    return response.content
+                logger.error(f"Supabase download failed: {response.status_code}")
+                return None
+
+            full_path = os.path.join(self.local_storage_path, file_path)
+            if not os.path.exists(full_path):
+                return None
+            with open(full_path, 'rb') as f:
+                return f.read()
+
+        except Exception as e:
+            logger.error(f"Object read error: {str(e)}", exc_info=True)
+            return None
+
+    def download_object(self, file_path: str, out: BinaryIO, bucket: Optional[str] = None) -> bool:
+        """
+        Stream an object written with put_object() into a binary file (never held in memory)
+
+        Returns:
+            True if written, False if missing/unreadable
+        """
+        try:
+            if self.use_supabase:
+                url = f"{self.storage_url}/object/{bucket or self.storage_bucket}/{file_path}"
+                with requests.get(url, headers=self.headers, stream=True) as response:
+                    if response.status_code != 200:
+                        logger.error(f"Supabase download failed: {response.status_code}")
+                        return False
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        out.write(chunk)
+                return True
+
+            full_path = os.path.join(self.local_storage_path, file_path)
+            if not os.path.exists(full_path):
+                return False
+            with open(full_path, 'rb') as f:
+                shutil.copyfileobj(f, out)
+            return True
+
+        except Exception as e:
+            logger.error(f"Object read error: {str(e)}", exc_info=True)
+            return False
+
     def generate_signed_url(
         self,
         file_path: str,
@@ -15,6 +15,7 @@ from database import (
     ChannelPreset,
     Segment
 )
+from counter_service import increment, merge_pending, PROMPT_TEMPLATE_USAGE, CREATIVE_TEMPLATE_USAGE
 from logger import get_logger
 
 logger = get_logger("templates_api")
@@ -192,7 +193,7 @@ async def list_prompt_templates(
         query = query.filter(PromptTemplate.is_public == is_public)
 
     templates = query.order_by(PromptTemplate.usage_count.desc()).offset(skip).limit(limit).all()
-    return templates
+    return merge_pending(PROMPT_TEMPLATE_USAGE, templates)
 
 
 @router.get("/prompts/{template_id}", response_model=PromptTemplateResponse)
@@ -203,7 +204,7 @@ async def get_prompt_template(template_id: int, db: Session = Depends(get_db)):
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    return template
+    return merge_pending(PROMPT_TEMPLATE_USAGE, [template])[0]
 
 
 @router.post("/prompts/apply")
@@ -241,9 +242,8 @@ async def apply_prompt_template(
         placeholder = "{" + key + "}"
         result = result.replace(placeholder, value)
 
-    # Increment usage count
-    template.usage_count += 1
-    db.commit()
+    # Increment usage count (coalesced, flushed to the row periodically)
+    increment(PROMPT_TEMPLATE_USAGE, template.id)
 
     return {
         "template_id": template.id,
@@ -323,7 +323,7 @@ async def list_creative_templates(
         query = query.filter(CreativeTemplate.is_public == is_public)
 
     templates = query.order_by(CreativeTemplate.usage_count.desc()).offset(skip).limit(limit).all()
-    return templates
+    return merge_pending(CREATIVE_TEMPLATE_USAGE, templates)
 
 
 @router.get("/creatives/{template_id}", response_model=CreativeTemplateResponse)
@@ -334,7 +334,7 @@ async def get_creative_template(template_id: int, db: Session = Depends(get_db))
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    return template
+    return merge_pending(CREATIVE_TEMPLATE_USAGE, [template])[0]
 
 
 # ==========================================
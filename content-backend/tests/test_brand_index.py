@@ -0,0 +1,84 @@
+"""
+Brand guideline index tests (pure NumPy, no Chroma)
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brand_index import BrandGuidelineIndex, BrandIndexCache
+
+
+def make_index(n: int = 6, dim: int = 8) -> BrandGuidelineIndex:
+    embeddings = np.random.default_rng(0).normal(size=(n, dim))
+    return BrandGuidelineIndex(
+        ids=[f"g{i}" for i in range(n)],
+        documents=[f"guideline {i}" for i in range(n)],
+        metadatas=[{"category": "tone" if i % 2 else "style"} for i in range(n)],
+        embeddings=embeddings
+    )
+
+
+class FakeCollection:
+    def __init__(self, data):
+        self.data = data
+        self.gets = 0
+
+    def get(self, where, include):
+        self.gets += 1
+        return self.data
+
+
+def test_empty_index():
+    index = BrandGuidelineIndex(ids=[], documents=[], metadatas=[], embeddings=[])
+    assert len(index) == 0
+    assert index.top_k([0.1, 0.2], 3) == []
+    assert index.top_k([0.1, 0.2], 3, category="tone") == []
+    assert index.rows() == []
+    assert index.rows("tone", 5) == []
+
+
+def test_top_k_ranks_by_cosine():
+    index = make_index()
+    query = index.matrix[3] * 5  # scale does not matter
+    matches = index.top_k(query, 3)
+    assert len(matches) == 3
+    assert matches[0][0] == 3
+    assert abs(matches[0][1] - 1.0) < 1e-5
+    assert [score for _, score in matches] == sorted((score for _, score in matches), reverse=True)
+
+
+def test_top_k_category_filter():
+    index = make_index()
+    matches = index.top_k(index.matrix[2], 10, category="tone")
+    assert sorted(row for row, _ in matches) == [1, 3, 5]
+    assert index.top_k(index.matrix[2], 3, category="missing") == []
+
+
+def test_rows_category_and_limit():
+    index = make_index()
+    assert index.rows() == list(range(6))
+    assert index.rows("style") == [0, 2, 4]
+    assert index.rows("tone", 2) == [1, 3]
+
+
+def test_cache_keeps_empty_brand():
+    collection = FakeCollection({"ids": [], "documents": [], "metadatas": [], "embeddings": []})
+    cache = BrandIndexCache(collection)
+    assert len(cache.get(7)) == 0
+    assert len(cache.get(7)) == 0
+    assert collection.gets == 1
+
+
+def test_cache_drops_duplicate_documents():
+    collection = FakeCollection({
+        "ids": ["a", "b", "c"],
+        "documents": ["same", "same", "other"],
+        "metadatas": [{"category": "tone"}, {"category": "tone"}, None],
+        "embeddings": np.eye(3)
+    })
+    index = BrandIndexCache(collection).get(1)
+    assert index.ids == ["a", "c"]
+    assert index.metadatas[1] == {}
@@ -0,0 +1,153 @@
+"""
+Vector Index Benchmark
+Recall vs latency of HNSW settings on a collection's own vectors (or synthetic ones),
+plus prompt-cache hit agreement at a similarity threshold, to tune M / ef per collection
+"""
+import time
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("vector_benchmark")
+
+
+def load_vectors(collection_name: str, limit: int = 20000, batch_size: int = 1000) -> np.ndarray:
+    """Stored embeddings of a collection (first `limit`)"""
+    from vector_client import get_vector_client
+
+    collection = get_vector_client().client.get_collection(collection_name)
+    total = min(collection.count(), limit)
+    chunks = []
+    for offset in range(0, total, batch_size):
+        page = collection.get(limit=min(batch_size, total - offset), offset=offset, include=["embeddings"])
+        chunks.append(np.asarray(page["embeddings"], dtype=np.float32))
+    if not chunks:
+        raise ValueError(f"Collection {collection_name} is empty")
+    return np.vstack(chunks)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def make_queries(vectors: np.ndarray, n_queries: int, near_duplicates: float, noise: float, seed: int = 0):
+    """
+    Split vectors into (base, queries)
+
+    Held-out vectors act as new prompts; a `near_duplicates` share of the queries
+    are noisy copies of base vectors, i.e. rephrasings the prompt cache should hit.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    n_held_out = n_queries - int(n_queries * near_duplicates)
+    held_out, base = vectors[order[:n_held_out]], vectors[order[n_held_out:]]
+
+    picks = base[rng.integers(0, len(base), n_queries - n_held_out)]
+    duplicates = picks + rng.normal(0, noise, picks.shape).astype(np.float32)
+    return _normalize(base), _normalize(np.vstack([held_out, duplicates]))
+
+
+def run_benchmark(
+    base: np.ndarray,
+    queries: np.ndarray,
+    k: int = 5,
+    m_values: Sequence[int] = (16, 32),
+    construction_efs: Sequence[int] = (100, 200),
+    search_efs: Sequence[int] = (10, 32, 64, 128, 256),
+    threshold: float = 0.95
+) -> List[Dict[str, Any]]:
+    """
+    Recall@k, per-query latency (p50/p99) and cache hit agreement per HNSW setting
+
+    Ground truth is the exact cosine top-k (NumPy). A query is a cache hit when its
+    top-1 similarity >= threshold; `missed_hits` counts exact hits the index missed.
+    """
+    import hnswlib
+
+    k = min(k, len(base))
+    exact_sims = queries @ base.T
+    exact_top = np.argpartition(-exact_sims, k - 1, axis=1)[:, :k]
+    exact_hits = exact_sims.max(axis=1) >= threshold
+
+    results = []
+    for m in m_values:
+        for construction_ef in construction_efs:
+            index = hnswlib.Index(space="cosine", dim=base.shape[1])
+            index.init_index(max_elements=len(base), M=m, ef_construction=construction_ef)
+            started = time.perf_counter()
+            index.add_items(base, np.arange(len(base)))
+            build_seconds = time.perf_counter() - started
+
+            for search_ef in search_efs:
+                index.set_ef(max(search_ef, k))
+                latencies = np.empty(len(queries))
+                labels = np.empty((len(queries), k), dtype=np.int64)
+                distances = np.empty((len(queries), k))
+                for i, query in enumerate(queries):
+                    started = time.perf_counter()
+                    labels[i], distances[i] = index.knn_query(query, k=k)
+                    latencies[i] = (time.perf_counter() - started) * 1000
+
+                recall = np.mean([
+                    len(set(found) & set(truth)) / k for found, truth in zip(labels, exact_top)
+                ])
+                ann_hits = (1 - distances[:, 0]) >= threshold
+
+                results.append({
+                    "M": m,
+                    "construction_ef": construction_ef,
+                    "search_ef": search_ef,
+                    "build_seconds": round(build_seconds, 2),
+                    f"recall@{k}": round(float(recall), 4),
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                    "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                    "cache_hit_rate": round(float(ann_hits.mean()), 4),
+                    "exact_hit_rate": round(float(exact_hits.mean()), 4),
+                    "missed_hits": int((exact_hits & ~ann_hits).sum())
+                })
+    return results
+
+
+def main():
+    """Print a recall / latency table for the given HNSW settings"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark HNSW settings: recall vs latency and cache hit agreement")
+    parser.add_argument("--collection", default="prompt_cache")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Use N random vectors instead of a collection")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of synthetic vectors")
+    parser.add_argument("--limit", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--near-duplicates", type=float, default=0.5, help="Share of queries that are noisy copies")
+    parser.add_argument("--noise", type=float, default=0.005)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 32, 64, 128, 256])
+    parser.add_argument("--threshold", type=float, default=0.95)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = np.random.default_rng(1).normal(size=(args.synthetic, args.dim)).astype(np.float32)
+    else:
+        vectors = load_vectors(args.collection, args.limit)
+
+    base, queries = make_queries(vectors, args.queries, args.near_duplicates, args.noise)
+    logger.info(f"Benchmark: {len(base)} vectors (dim={base.shape[1]}), {len(queries)} queries, k={args.k}")
+
+    rows = run_benchmark(base, queries, args.k, args.m, args.construction_ef, args.search_ef, args.threshold)
+    columns = list(rows[0])
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(str(row[column]) for column in columns))
+    logger.info("✅ Benchmark finished")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,30 @@ ChromaDB Vector Database Client for Content Backend
 Handles semantic search and similar content recommendations
 """
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
 from typing import List, Dict, Any, Optional
 import logging
-from openai import OpenAI
-import os
+import time
+import hashlib
 from datetime import datetime
 
+from embedding_batcher import get_embedding_batcher
+from embedding_providers import EmbeddingProvider, get_embedding_provider, configured_provider
+from vector_index import hnsw_metadata, index_settings, similarity_from_distance
+from prompt_cache import cache_entry_id, entry_ttl, entry_size
+from counter_service import increment, PROMPT_CACHE_HITS
+from brand_index import BrandIndexCache
+from high_performers import blended_scores, candidate_pool
+
 logger = logging.getLogger(__name__)
 
 
+def content_hash(text: str) -> str:
+    """Digest of an embedded document; equal hashes mean the stored vector is still valid"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
 class VectorDBClient:
     """ChromaDB client for semantic content search"""
 
@@ -20,6 +34,7 @@ class VectorDBClient:
     COLLECTION_IMAGES = "generated_images"
     COLLECTION_BRAND_GUIDELINES = "brand_guidelines"
     COLLECTION_PROMPT_CACHE = "prompt_cache"
+    COLLECTIONS = (COLLECTION_TEXTS, COLLECTION_IMAGES, COLLECTION_BRAND_GUIDELINES, COLLECTION_PROMPT_CACHE)
 
     def __init__(self, persist_dir: str = "./chroma_data"):
         """Initialize ChromaDB client"""
@@ -33,33 +48,26 @@ class VectorDBClient:
                 )
             )
 
-            # OpenAI 클라이언트 초기화
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            if not openai_api_key:
-                logger.warning("OpenAI API key not found. Embeddings will fail.")
-                self.openai_client = None
-            else:
-                self.openai_client = OpenAI(api_key=openai_api_key)
+            # 컬렉션 초기화 (컬렉션별 임베딩 프로바이더)
+            self.providers: Dict[str, EmbeddingProvider] = {}
+            self.spaces: Dict[str, str] = {}
 
-            # 컬렉션 초기화
-            self.text_collection = self.client.get_or_create_collection(
-                name=self.COLLECTION_TEXTS,
-                metadata={"description": "AI generated text content"}
+            self.text_collection = self._open_collection(
+                self.COLLECTION_TEXTS, "AI generated text content"
             )
 
-            self.image_collection = self.client.get_or_create_collection(
-                name=self.COLLECTION_IMAGES,
-                metadata={"description": "AI generated image metadata"}
+            self.image_collection = self._open_collection(
+                self.COLLECTION_IMAGES, "AI generated image metadata"
             )
 
-            self.brand_guidelines_collection = self.client.get_or_create_collection(
-                name=self.COLLECTION_BRAND_GUIDELINES,
-                metadata={"description": "Brand voice and guidelines for RAG"}
+            self.brand_guidelines_collection = self._open_collection(
+                self.COLLECTION_BRAND_GUIDELINES, "Brand voice and guidelines for RAG"
             )
+            # 브랜드별 인메모리 가이드라인 행렬 (RAG 조회용)
+            self.brand_indexes = BrandIndexCache(self.brand_guidelines_collection)
 
-            self.prompt_cache_collection = self.client.get_or_create_collection(
-                name=self.COLLECTION_PROMPT_CACHE,
-                metadata={"description": "Semantic prompt cache for cost savings"}
+            self.prompt_cache_collection = self._open_collection(
+                self.COLLECTION_PROMPT_CACHE, "Semantic prompt cache for cost savings"
             )
 
             logger.info("✅ ChromaDB client initialized successfully (4 collections)")
@@ -68,22 +76,145 @@ class VectorDBClient:
             logger.error(f"❌ Failed to initialize ChromaDB: {e}")
             raise
 
-    def _get_embedding(self, text: str) -> List[float]:
-        """Generate embedding using OpenAI text-embedding-ada-002"""
-        if not self.openai_client:
-            raise ValueError("OpenAI client not initialized")
-
+    def _open_collection(self, name: str, description: str):
+        """
+        Get or create a collection and resolve the provider its vectors come from
+
+        New collections are created with the configured HNSW settings (vector_index)
+        and the configured provider, both recorded in the collection metadata.
+        Collections that predate pluggable providers hold OpenAI vectors. When the
+        configuration differs from what a collection was built with, the collection
+        keeps serving as built until it is rebuilt (vector_index.py reindex /
+        embedding_migration.py).
+        """
+        configured = configured_provider(name)
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
+            collection = self.client.get_collection(name=name)
+        except Exception:
+            provider = get_embedding_provider(configured)
+            collection = self.client.create_collection(name=name, metadata={
+                "description": description,
+                **hnsw_metadata(name),
+                "embedding_provider": provider.name,
+                "embedding_model": provider.model
+            })
+
+        metadata = dict(collection.metadata or {})
+        recorded = metadata.get("embedding_provider")
+        if recorded is None:
+            recorded = configured if collection.count() == 0 else "openai"
+            provider = get_embedding_provider(recorded)
+            metadata.pop("hnsw:space", None)  # distance function cannot be passed to modify()
+            collection.modify(metadata={**metadata, "embedding_provider": provider.name, "embedding_model": provider.model})
+        elif recorded != configured:
+            logger.warning(
+                f"Collection {name} is embedded with '{recorded}' but '{configured}' is configured; "
+                f"run `python embedding_migration.py --collection {name} --provider {configured}`"
+            )
+
+        if index_settings(collection.metadata) != hnsw_metadata(name):
+            logger.warning(
+                f"Collection {name} HNSW settings {index_settings(collection.metadata)} differ from the "
+                f"configured ones; run `python vector_index.py --collection {name}`"
             )
-            return response.data[0].embedding
 
+        self.providers[name] = get_embedding_provider(recorded)
+        self.spaces[name] = index_settings(collection.metadata)["hnsw:space"]
+        return collection
+
+    def _similarity(self, collection, distance: float) -> float:
+        """Cosine similarity from a query distance, for the space the collection was built with"""
+        return similarity_from_distance(distance, self.spaces[collection.name])
+
+    def _get_embedding(self, text: str, collection=None) -> List[float]:
+        """Embedding of one text with the collection's provider (micro-batched across threads)"""
+        provider = self.providers[(collection or self.text_collection).name]
+        return get_embedding_batcher(
+            provider.key, provider.embed, provider.batch_window_ms, model=provider.model
+        ).embed(text)
+
+    def embed_many(self, texts: List[str], collection=None) -> List[List[float]]:
+        """
+        Embed many texts with the collection's provider (default: generated texts)
+
+        The result is in the order of `texts`.
+        """
+        provider = self.providers[(collection or self.text_collection).name]
+        try:
+            return provider.embed(texts)
         except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
+            logger.error(f"Error generating embeddings ({len(texts)} texts, {provider.key}): {e}")
             raise
 
+    def _indexed(self, collection, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata of the ids already in a collection (one get per call)"""
+        existing = collection.get(ids=ids, include=["metadatas"])
+        return {doc_id: metadata or {} for doc_id, metadata in zip(existing["ids"], existing["metadatas"])}
+
+    def _upsert_documents(
+        self,
+        collection,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        chunk_size: int = 500
+    ) -> int:
+        """
+        Upsert documents, embedding only those that are new or changed
+
+        Documents whose id is indexed with the same content_hash are not embedded
+        again; only their metadata is updated, and only if it changed. Metadata of
+        replaced documents is merged over the stored one, so keys written later
+        (performance scores) survive; None values are dropped.
+
+        Returns:
+            Number of documents written or already up to date
+        """
+        hashes = [content_hash(document) for document in documents]
+        done = 0
+        for start in range(0, len(ids), chunk_size):
+            end = min(start + chunk_size, len(ids))
+            try:
+                existing = self._indexed(collection, ids[start:end])
+                merged = {
+                    i: {
+                        key: value
+                        for key, value in {**existing.get(ids[i], {}), **metadatas[i], "content_hash": hashes[i]}.items()
+                        if value is not None
+                    }
+                    for i in range(start, end)
+                }
+                pending = [i for i in range(start, end) if existing.get(ids[i], {}).get("content_hash") != hashes[i]]
+                unchanged = set(range(start, end)) - set(pending)
+                stale = [i for i in sorted(unchanged) if merged[i] != existing[ids[i]]]
+
+                if stale:
+                    # update() merges keys; None removes the ones dropped above
+                    collection.update(
+                        ids=[ids[i] for i in stale],
+                        metadatas=[
+                            {**merged[i], **{key: None for key in existing[ids[i]] if key not in merged[i]}}
+                            for i in stale
+                        ]
+                    )
+                done += len(unchanged)
+                if not pending:
+                    continue
+
+                embeddings = self.embed_many([documents[i] for i in pending], collection)
+                collection.upsert(
+                    ids=[ids[i] for i in pending],
+                    embeddings=embeddings,
+                    documents=[documents[i] for i in pending],
+                    metadatas=[merged[i] for i in pending]
+                )
+                done += len(pending)
+
+            except Exception as e:
+                logger.error(f"❌ Failed to upsert {end - start} documents into {collection.name}: {e}")
+
+        return done
+
     def add_text_content(
         self,
         content_id: int,
@@ -105,34 +236,53 @@ class VectorDBClient:
         Returns:
             True if successful
         """
-        try:
-            # 임베딩 생성
-            embedding = self._get_embedding(text)
-
-            # 메타데이터 구성
-            doc_metadata = {
-                "content_id": content_id,
-                "prompt": prompt[:500],  # 프롬프트 길이 제한
-                "model": model,
-                "created_at": datetime.utcnow().isoformat(),
-                "content_length": len(text),
-                **(metadata or {})
-            }
+        return self.add_texts([{
+            "content_id": content_id,
+            "text": text,
+            "prompt": prompt,
+            "model": model,
+            "metadata": metadata
+        }]) == 1
+
+    def add_texts(self, items: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+        """
+        Add many generated texts with batched embedding requests
 
-            # ChromaDB에 추가
-            self.text_collection.add(
-                ids=[f"text_{content_id}"],
-                embeddings=[embedding],
-                documents=[text],
-                metadatas=[doc_metadata]
-            )
+        Ids are keyed by content_id and written with upsert, so re-running a
+        backfill replaces documents instead of duplicating them; unchanged texts
+        are not re-embedded.
 
-            logger.info(f"✅ Added text content {content_id} to vector DB")
-            return True
+        Args:
+            items: Dicts with content_id, text, prompt and optional model / metadata
+            chunk_size: Documents per Chroma call
 
-        except Exception as e:
-            logger.error(f"❌ Failed to add text content {content_id}: {e}")
-            return False
+        Returns:
+            Number of documents added or already up to date
+        """
+        if not items:
+            return 0
+
+        now = datetime.utcnow().isoformat()
+        added = self._upsert_documents(
+            self.text_collection,
+            ids=[f"text_{item['content_id']}" for item in items],
+            documents=[item["text"] for item in items],
+            metadatas=[
+                {
+                    "content_id": item["content_id"],
+                    "prompt": item["prompt"][:500],  # 프롬프트 길이 제한
+                    "model": item.get("model") or "gpt-3.5-turbo",
+                    "created_at": now,
+                    "content_length": len(item["text"]),
+                    **(item.get("metadata") or {})
+                }
+                for item in items
+            ],
+            chunk_size=chunk_size
+        )
+
+        logger.info(f"✅ Added {added} text contents to vector DB")
+        return added
 
     def add_image_metadata(
         self,
@@ -155,34 +305,52 @@ class VectorDBClient:
         Returns:
             True if successful
         """
-        try:
-            # 프롬프트 임베딩 생성
-            embedding = self._get_embedding(prompt)
-
-            # 메타데이터 구성
-            doc_metadata = {
-                "content_id": content_id,
-                "image_url": image_url,
-                "model": model,
-                "created_at": datetime.utcnow().isoformat(),
-                "prompt_length": len(prompt),
-                **(metadata or {})
-            }
+        return self.add_images([{
+            "content_id": content_id,
+            "prompt": prompt,
+            "image_url": image_url,
+            "model": model,
+            "metadata": metadata
+        }]) == 1
+
+    def add_images(self, items: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+        """
+        Add many generated images' metadata with batched embedding requests
 
-            # ChromaDB에 추가
-            self.image_collection.add(
-                ids=[f"image_{content_id}"],
-                embeddings=[embedding],
-                documents=[prompt],  # 이미지는 프롬프트를 문서로 저장
-                metadatas=[doc_metadata]
-            )
+        Upserted by content_id like add_texts; unchanged prompts are not re-embedded.
 
-            logger.info(f"✅ Added image metadata {content_id} to vector DB")
-            return True
+        Args:
+            items: Dicts with content_id, prompt, image_url and optional model / metadata
+            chunk_size: Documents per Chroma call
 
-        except Exception as e:
-            logger.error(f"❌ Failed to add image metadata {content_id}: {e}")
-            return False
+        Returns:
+            Number of documents added or already up to date
+        """
+        if not items:
+            return 0
+
+        now = datetime.utcnow().isoformat()
+        # 이미지는 프롬프트를 문서로 저장
+        added = self._upsert_documents(
+            self.image_collection,
+            ids=[f"image_{item['content_id']}" for item in items],
+            documents=[item["prompt"] for item in items],
+            metadatas=[
+                {
+                    "content_id": item["content_id"],
+                    "image_url": item["image_url"],
+                    "model": item.get("model") or "dall-e-3",
+                    "created_at": now,
+                    "prompt_length": len(item["prompt"]),
+                    **(item.get("metadata") or {})
+                }
+                for item in items
+            ],
+            chunk_size=chunk_size
+        )
+
+        logger.info(f"✅ Added {added} image metadata to vector DB")
+        return added
 
     def search_similar_texts(
         self,
@@ -221,7 +389,7 @@ class VectorDBClient:
                         "id": results['ids'][0][i],
                         "content": results['documents'][0][i],
                         "metadata": results['metadatas'][0][i],
-                        "similarity": 1 - results['distances'][0][i],  # 코사인 유사도
+                        "similarity": self._similarity(self.text_collection, results['distances'][0][i]),  # 코사인 유사도
                         "distance": results['distances'][0][i]
                     })
 
@@ -251,7 +419,7 @@ class VectorDBClient:
         """
         try:
             # 쿼리 임베딩 생성
-            query_embedding = self._get_embedding(query)
+            query_embedding = self._get_embedding(query, self.image_collection)
 
             # 유사도 검색
             results = self.image_collection.query(
@@ -270,7 +438,7 @@ class VectorDBClient:
                         "prompt": results['documents'][0][i],
                         "image_url": results['metadatas'][0][i].get('image_url'),
                         "metadata": results['metadatas'][0][i],
-                        "similarity": 1 - results['distances'][0][i],
+                        "similarity": self._similarity(self.image_collection, results['distances'][0][i]),
                         "distance": results['distances'][0][i]
                     })
 
@@ -345,49 +513,59 @@ class VectorDBClient:
         """
         Search for high-performing similar text content
 
+        The performance_score >= min_score predicate is pushed into the query, and
+        the candidates are ranked by similarity x performance x recency decay
+        (high_performers.blended_scores) over a pool of
+        high_performers.candidate_pool(n_results) candidates.
+
         Args:
             query: Search query
             min_score: Minimum performance score threshold
             n_results: Number of results
 
         Returns:
-            List of high-performing similar content
+            List of high-performing similar content, best blended rank first
         """
         try:
             # 쿼리 임베딩 생성
             query_embedding = self._get_embedding(query)
 
-            # 고성과 필터 적용하여 검색
+            # 고성과 필터를 쿼리에 포함 (점수 없는 문서는 min_score <= 0일 때만 포함)
+            where = {"performance_score": {"$gte": min_score}} if min_score > 0 else None
             results = self.text_collection.query(
                 query_embeddings=[query_embedding],
-                n_results=n_results * 3,  # 필터링 위해 더 많이 가져옴
+                n_results=candidate_pool(n_results),
+                where=where,
                 include=["documents", "metadatas", "distances"]
             )
-
-            # 성과 점수로 필터링
-            filtered_results = []
-            if results['ids'][0]:
-                for i in range(len(results['ids'][0])):
-                    metadata = results['metadatas'][0][i]
-                    performance_score = metadata.get('performance_score', 0)
-
-                    if performance_score >= min_score:
-                        filtered_results.append({
-                            "id": results['ids'][0][i],
-                            "content": results['documents'][0][i],
-                            "metadata": metadata,
-                            "similarity": 1 - results['distances'][0][i],
-                            "performance_score": performance_score,
-                            "ctr": metadata.get('ctr', 0),
-                            "cvr": metadata.get('cvr', 0)
-                        })
-
-            # 성과 점수로 정렬 및 제한
-            filtered_results.sort(key=lambda x: x['performance_score'], reverse=True)
-            filtered_results = filtered_results[:n_results]
-
-            logger.info(f"✅ Found {len(filtered_results)} high-performing texts (min_score={min_score})")
-            return filtered_results
+            ids = results['ids'][0]
+            if not ids:
+                logger.info(f"✅ Found 0 high-performing texts (min_score={min_score})")
+                return []
+
+            # 유사도 x 성과 x 최신성으로 일괄 순위 계산
+            metadatas = [metadata or {} for metadata in results['metadatas'][0]]
+            similarities = np.array([
+                self._similarity(self.text_collection, distance) for distance in results['distances'][0]
+            ])
+            performance = np.array([float(metadata.get('performance_score', 0)) for metadata in metadatas])
+            ranks = blended_scores(similarities, performance, [metadata.get('created_at') for metadata in metadatas])
+
+            top_results = []
+            for i in np.argsort(-ranks, kind="stable")[:n_results]:
+                top_results.append({
+                    "id": ids[i],
+                    "content": results['documents'][0][i],
+                    "metadata": metadatas[i],
+                    "similarity": float(similarities[i]),
+                    "performance_score": metadatas[i].get('performance_score', 0),
+                    "rank_score": round(float(ranks[i]), 6),
+                    "ctr": metadatas[i].get('ctr', 0),
+                    "cvr": metadatas[i].get('cvr', 0)
+                })
+
+            logger.info(f"✅ Found {len(top_results)} high-performing texts (min_score={min_score}, {len(ids)} candidates)")
+            return top_results
 
         except Exception as e:
             logger.error(f"❌ Failed to search high-performing texts: {e}")
@@ -403,6 +581,9 @@ class VectorDBClient:
         """
         Add brand guideline to Vector DB
 
+        The id is derived from (brand_id, category, text), so re-submitting the
+        same guideline is a no-op instead of a duplicate vector.
+
         Args:
             brand_id: Brand identifier
             guideline_text: Guideline content
@@ -413,9 +594,6 @@ class VectorDBClient:
             True if successful
         """
         try:
-            # 임베딩 생성
-            embedding = self._get_embedding(guideline_text)
-
             # 메타데이터 구성
             doc_metadata = {
                 "brand_id": brand_id,
@@ -425,14 +603,13 @@ class VectorDBClient:
                 **(metadata or {})
             }
 
-            # ChromaDB에 추가
-            doc_id = f"brand_{brand_id}_{category}_{datetime.utcnow().timestamp()}"
-            self.brand_guidelines_collection.add(
-                ids=[doc_id],
-                embeddings=[embedding],
-                documents=[guideline_text],
-                metadatas=[doc_metadata]
-            )
+            # ChromaDB에 추가 (같은 가이드라인은 같은 ID)
+            doc_id = f"brand_{brand_id}_{category}_{content_hash(guideline_text)}"
+            if not self._upsert_documents(
+                self.brand_guidelines_collection, [doc_id], [guideline_text], [doc_metadata]
+            ):
+                return False
+            self.brand_indexes.invalidate(brand_id)
 
             logger.info(f"✅ Added brand guideline for brand {brand_id}, category: {category}")
             return True
@@ -445,46 +622,47 @@ class VectorDBClient:
         self,
         brand_id: int,
         query: str,
-        n_results: int = 3
+        n_results: int = 3,
+        category: Optional[str] = None
     ) -> str:
         """
         Retrieve brand guidelines as context for RAG
 
+        Ranked in memory against the brand's guideline matrix (brand_index), so
+        the only remote call is the query embedding.
+
         Args:
             brand_id: Brand identifier
             query: User query to match relevant guidelines
             n_results: Number of guidelines to retrieve
+            category: Only use guidelines of this category (optional)
 
         Returns:
             Formatted context string
         """
         try:
-            # 쿼리 임베딩 생성
-            query_embedding = self._get_embedding(query)
+            index = self.brand_indexes.get(brand_id)
+            if not len(index):
+                logger.warning(f"No brand guidelines found for brand {brand_id}")
+                return ""
 
-            # 브랜드 가이드라인 검색
-            results = self.brand_guidelines_collection.query(
-                query_embeddings=[query_embedding],
-                where={"brand_id": brand_id},
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            # 쿼리 임베딩 생성
+            query_embedding = self._get_embedding(query, self.brand_guidelines_collection)
 
-            if not results['ids'][0]:
-                logger.warning(f"No brand guidelines found for brand {brand_id}")
+            # 브랜드 가이드라인 검색 (코사인 top-k)
+            matches = index.top_k(query_embedding, n_results, category)
+            if not matches:
+                logger.warning(f"No brand guidelines found for brand {brand_id}, category: {category}")
                 return ""
 
             # 컨텍스트 포맷팅
             context_parts = []
-            for i in range(len(results['ids'][0])):
-                category = results['metadatas'][0][i].get('category', 'general')
-                document = results['documents'][0][i]
-                similarity = 1 - results['distances'][0][i]
-
-                context_parts.append(f"[{category.upper()}] (관련도: {similarity:.2f})\n{document}")
+            for row, similarity in matches:
+                category_name = index.metadatas[row].get('category', 'general')
+                context_parts.append(f"[{category_name.upper()}] (관련도: {similarity:.2f})\n{index.documents[row]}")
 
             context = "\n\n".join(context_parts)
-            logger.info(f"✅ Retrieved {len(results['ids'][0])} guidelines for brand {brand_id}")
+            logger.info(f"✅ Retrieved {len(matches)} guidelines for brand {brand_id}")
 
             return context
 
@@ -510,24 +688,16 @@ class VectorDBClient:
             List of guidelines
         """
         try:
-            where = {"brand_id": brand_id}
-            if category:
-                where["category"] = category
+            index = self.brand_indexes.get(brand_id)
 
-            results = self.brand_guidelines_collection.get(
-                where=where,
-                limit=limit,
-                include=["documents", "metadatas"]
-            )
-
-            guidelines = []
-            if results['ids']:
-                for i in range(len(results['ids'])):
-                    guidelines.append({
-                        "id": results['ids'][i],
-                        "text": results['documents'][i],
-                        "metadata": results['metadatas'][i]
-                    })
+            guidelines = [
+                {
+                    "id": index.ids[row],
+                    "text": index.documents[row],
+                    "metadata": index.metadatas[row]
+                }
+                for row in index.rows(category, limit)
+            ]
 
             logger.info(f"✅ Found {len(guidelines)} guidelines for brand {brand_id}")
             return guidelines
@@ -542,49 +712,71 @@ class VectorDBClient:
         result: str,
         model: str,
         job_type: str = "text",
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        content_id: Optional[int] = None
     ) -> str:
         """
         Add a prompt and its result to cache
 
+        The entry id is derived from (job_type, model, prompt), so regenerating the
+        same prompt replaces its entry instead of adding another one. The entry
+        expires after the model's TTL (prompt_cache.entry_ttl).
+
+        With `content_id` the entry only points at the generated_content row holding
+        the result (resolved with prompt_cache.fetch_cached_results); without it the
+        result is stored inline in the entry metadata.
+
         Args:
             prompt: The original prompt
             result: The generated result
             model: Model used (e.g., 'gpt-3.5-turbo', 'dall-e-3')
             job_type: 'text' or 'image'
             metadata: Additional metadata
+            content_id: generated_content.id of the stored result
 
         Returns:
             Document ID
         """
         try:
+            now = time.time()
             timestamp = datetime.now().isoformat()
-            doc_id = f"cache_{job_type}_{hash(prompt)}_{timestamp}"
+            doc_id = cache_entry_id(job_type, model, prompt)
 
-            # Generate embedding from prompt
-            embedding = self._get_embedding(prompt)
-
-            # Prepare metadata (store result in metadata for quick retrieval)
+            # Prepare metadata (a pointer to the stored result, or the result itself)
             cache_metadata = {
                 "job_type": job_type,
                 "model": model,
                 "prompt_length": len(prompt),
                 "result_length": len(result),
-                "result": result,  # Store the actual result for cache hits
                 "cached_at": timestamp,
-                "hit_count": 0  # Track how many times this cache is used
+                "hit_count": 0,  # Track how many times this cache is used
+                # Numeric fields for TTL filtering and LRU/LFU eviction
+                "cached_at_ts": now,
+                "last_hit_ts": now,
+                "expires_at_ts": now + entry_ttl(model)
             }
+            if content_id is not None:
+                cache_metadata.update({"content_id": content_id, "result": None})
+                cache_metadata["size_bytes"] = entry_size(prompt, "")
+            else:
+                cache_metadata.update({"result": result, "content_id": None})
+                cache_metadata["size_bytes"] = entry_size(prompt, result)
 
             if metadata:
                 cache_metadata.update(metadata)
 
-            # Add to cache collection
-            self.prompt_cache_collection.add(
-                ids=[doc_id],
-                embeddings=[embedding],
-                documents=[prompt],
-                metadatas=[cache_metadata]
-            )
+            # The id hashes the prompt: an existing entry already holds its embedding
+            if self._indexed(self.prompt_cache_collection, [doc_id]):
+                # Metadata updates merge; None values drop the other result field
+                self.prompt_cache_collection.update(ids=[doc_id], metadatas=[cache_metadata])
+            else:
+                embedding = self._get_embedding(prompt, self.prompt_cache_collection)
+                self.prompt_cache_collection.upsert(
+                    ids=[doc_id],
+                    embeddings=[embedding],
+                    documents=[prompt],
+                    metadatas=[{key: value for key, value in cache_metadata.items() if value is not None}]
+                )
 
             logger.info(f"✅ Added prompt to cache: {doc_id}")
             return doc_id
@@ -610,16 +802,19 @@ class VectorDBClient:
             similarity_threshold: Minimum similarity (0-1, default: 0.95 = 95%)
 
         Returns:
-            Cached result if found with similarity >= threshold, None otherwise
+            Cache hit if found with similarity >= threshold, None otherwise.
+            `content_id` points at the stored result; `cached_result` is only
+            set for entries that still hold their result inline.
         """
         try:
             # Generate embedding from query
-            query_embedding = self._get_embedding(query)
+            query_embedding = self._get_embedding(query, self.prompt_cache_collection)
 
-            # Build where clause
-            where = {"job_type": job_type}
+            # Build where clause (expired entries never match)
+            conditions = [{"job_type": job_type}, {"expires_at_ts": {"$gt": time.time()}}]
             if model:
-                where["model"] = model
+                conditions.append({"model": model})
+            where = {"$and": conditions}
 
             # Search cache
             results = self.prompt_cache_collection.query(
@@ -632,11 +827,9 @@ class VectorDBClient:
                 logger.info(f"❌ Cache miss: No similar prompts found")
                 return None
 
-            # Check similarity (ChromaDB returns distance, need to convert to similarity)
-            # Distance 0 = perfect match, distance 1 = orthogonal
-            # Similarity = 1 - (distance / 2)  # Cosine similarity conversion
+            # ChromaDB returns a distance; convert it to cosine similarity for the collection's space
             distance = results["distances"][0][0]
-            similarity = 1 - (distance / 2)
+            similarity = self._similarity(self.prompt_cache_collection, distance)
 
             logger.info(f"🔍 Cache search: similarity={similarity:.4f}, threshold={similarity_threshold}")
 
@@ -649,25 +842,16 @@ class VectorDBClient:
             metadata = results["metadatas"][0][0]
             cached_prompt = results["documents"][0][0]
 
-            # Increment hit count
-            try:
-                hit_count = metadata.get("hit_count", 0) + 1
-                metadata["hit_count"] = hit_count
-                metadata["last_hit_at"] = datetime.now().isoformat()
-
-                self.prompt_cache_collection.update(
-                    ids=[doc_id],
-                    metadatas=[metadata]
-                )
-            except Exception as e:
-                logger.warning(f"⚠️  Failed to update hit count: {e}")
+            # Increment hit count (coalesced and written by the counter flush)
+            hit_count = metadata.get("hit_count", 0) + increment(PROMPT_CACHE_HITS, doc_id)
 
             logger.info(f"✅ Cache HIT: {doc_id} (similarity: {similarity:.4f})")
 
             return {
                 "cache_id": doc_id,
                 "cached_prompt": cached_prompt,
-                "cached_result": metadata.get("result"),  # Retrieve cached result
+                "content_id": metadata.get("content_id"),
+                "cached_result": metadata.get("result"),  # Entries written before content_id
                 "similarity": round(similarity, 4),
                 "model": metadata.get("model"),
                 "cached_at": metadata.get("cached_at"),
@@ -705,19 +889,24 @@ class VectorDBClient:
             return {
                 "texts": {
                     "count": text_count,
-                    "collection": self.COLLECTION_TEXTS
+                    "collection": self.COLLECTION_TEXTS,
+                    "embedding": self.providers[self.COLLECTION_TEXTS].key
                 },
                 "images": {
                     "count": image_count,
-                    "collection": self.COLLECTION_IMAGES
+                    "collection": self.COLLECTION_IMAGES,
+                    "embedding": self.providers[self.COLLECTION_IMAGES].key
                 },
                 "brand_guidelines": {
                     "count": brand_count,
-                    "collection": self.COLLECTION_BRAND_GUIDELINES
+                    "collection": self.COLLECTION_BRAND_GUIDELINES,
+                    "embedding": self.providers[self.COLLECTION_BRAND_GUIDELINES].key,
+                    "brand_index": self.brand_indexes.stats()
                 },
                 "prompt_cache": {
                     "count": cache_count,
-                    "collection": self.COLLECTION_PROMPT_CACHE
+                    "collection": self.COLLECTION_PROMPT_CACHE,
+                    "embedding": self.providers[self.COLLECTION_PROMPT_CACHE].key
                 },
                 "total": text_count + image_count + brand_count + cache_count
             }
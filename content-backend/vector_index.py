@@ -0,0 +1,165 @@
+"""
+Vector Index Settings
+Per-collection HNSW parameters (space, M, construction_ef, search_ef), distance ->
+similarity conversion, and the staging-collection rebuild used by reindex / migration
+"""
+import os
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("vector_index")
+
+VECTOR_HNSW_SPACE = os.getenv("VECTOR_HNSW_SPACE", "cosine")  # 'cosine', 'l2', 'ip'
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", "16"))
+VECTOR_HNSW_CONSTRUCTION_EF = int(os.getenv("VECTOR_HNSW_CONSTRUCTION_EF", "200"))
+VECTOR_HNSW_SEARCH_EF = int(os.getenv("VECTOR_HNSW_SEARCH_EF", "64"))
+# Per-collection overrides: "collection:M:construction_ef:search_ef,..."
+VECTOR_HNSW_COLLECTIONS = os.getenv("VECTOR_HNSW_COLLECTIONS", "")
+
+STAGING_SUFFIX = "__rebuild"
+
+
+def _parse_collection_overrides(raw: str) -> Dict[str, Dict[str, int]]:
+    overrides = {}
+    for entry in filter(None, (part.strip() for part in raw.split(","))):
+        try:
+            collection, m, construction_ef, search_ef = entry.split(":")
+            overrides[collection] = {
+                "hnsw:M": int(m),
+                "hnsw:construction_ef": int(construction_ef),
+                "hnsw:search_ef": int(search_ef)
+            }
+        except ValueError:
+            logger.warning(f"Ignoring malformed VECTOR_HNSW_COLLECTIONS entry: {entry}")
+    return overrides
+
+
+COLLECTION_OVERRIDES = _parse_collection_overrides(VECTOR_HNSW_COLLECTIONS)
+
+
+def hnsw_metadata(collection_name: str) -> Dict[str, Any]:
+    """Configured HNSW collection metadata of a collection"""
+    return {
+        "hnsw:space": VECTOR_HNSW_SPACE,
+        "hnsw:M": VECTOR_HNSW_M,
+        "hnsw:construction_ef": VECTOR_HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": VECTOR_HNSW_SEARCH_EF,
+        **COLLECTION_OVERRIDES.get(collection_name, {})
+    }
+
+
+def index_settings(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """HNSW settings recorded on a collection (Chroma defaults for missing keys)"""
+    metadata = metadata or {}
+    return {
+        "hnsw:space": metadata.get("hnsw:space", "l2"),
+        "hnsw:M": metadata.get("hnsw:M", 16),
+        "hnsw:construction_ef": metadata.get("hnsw:construction_ef", 100),
+        "hnsw:search_ef": metadata.get("hnsw:search_ef", 10)
+    }
+
+
+def similarity_from_distance(distance: float, space: str) -> float:
+    """
+    Cosine similarity of a query hit from the distance Chroma returns
+
+    cosine: d = 1 - cos. ip: d = 1 - dot, which equals cos for the normalized
+    vectors every provider returns. l2: d is the squared distance = 2 - 2cos.
+    """
+    if space == "l2":
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def rebuild_collection(
+    client,
+    name: str,
+    metadata: Dict[str, Any],
+    embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    batch_size: int = 500
+) -> Dict[str, Any]:
+    """
+    Rebuild a collection with new metadata (HNSW settings / provider)
+
+    Documents and metadata are copied page by page into a staging collection
+    created with `metadata`; vectors are copied as-is, or re-computed from the
+    documents with `embed`. The staging collection replaces the source only when
+    the counts match, so writes during the run abort it (pause writers first).
+    Running workers keep their old collection handle until they are restarted.
+
+    Raises:
+        RuntimeError: Source changed during the rebuild
+    """
+    source = client.get_collection(name)
+    staging_name = f"{name}{STAGING_SUFFIX}"
+    if staging_name in [c if isinstance(c, str) else c.name for c in client.list_collections()]:
+        client.delete_collection(staging_name)  # leftover of an interrupted run
+    staging = client.create_collection(staging_name, metadata=metadata)
+
+    include = ["documents", "metadatas"] if embed else ["documents", "metadatas", "embeddings"]
+    total = source.count()
+    started = time.perf_counter()
+    copied = 0
+    for offset in range(0, total, batch_size):
+        page = source.get(limit=batch_size, offset=offset, include=include)
+        if not len(page["ids"]):
+            break
+        documents = [document or "" for document in page["documents"]]
+        staging.add(
+            ids=page["ids"],
+            embeddings=embed(documents) if embed else page["embeddings"],
+            documents=documents,
+            metadatas=page["metadatas"]
+        )
+        copied += len(page["ids"])
+        logger.info(f"{name}: {copied}/{total} copied")
+
+    if staging.count() != source.count():
+        client.delete_collection(staging_name)
+        raise RuntimeError(f"{name} changed during rebuild ({source.count()} docs, {copied} copied)")
+
+    client.delete_collection(name)
+    staging.modify(name=name)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Rebuilt {name}: {copied} documents in {elapsed:.1f}s")
+    return {"collection": name, "documents": copied, "seconds": round(elapsed, 1)}
+
+
+def reindex_collection(client, name: str, force: bool = False, batch_size: int = 500) -> Dict[str, Any]:
+    """Rebuild a collection whose HNSW settings differ from the configured ones"""
+    current = dict(client.get_collection(name).metadata or {})
+    target = hnsw_metadata(name)
+    if not force and index_settings(current) == target:
+        return {"collection": name, "skipped": True, "settings": target}
+
+    result = rebuild_collection(client, name, {**current, **target}, batch_size=batch_size)
+    return {**result, "settings": target}
+
+
+def main():
+    """Rebuild collections with the configured HNSW settings (restart the API workers afterwards)"""
+    import argparse
+    from vector_client import get_vector_client, VectorDBClient
+
+    collections = VectorDBClient.COLLECTIONS
+    parser = argparse.ArgumentParser(description="Rebuild Chroma collections with the configured HNSW settings")
+    parser.add_argument("--collection", choices=list(collections), action="append", help="Collections to rebuild (default: all)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even when the settings already match")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    client = get_vector_client().client
+    for name in args.collection or collections:
+        result = reindex_collection(client, name, args.force, args.batch_size)
+        logger.info(f"✅ {result}")
+
+
+if __name__ == "__main__":
+    main()
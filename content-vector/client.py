@@ -3,10 +3,36 @@ from chromadb.config import Settings as ChromaSettings
 from typing import List, Dict, Any, Optional
 import logging
 import openai
+from concurrent.futures import ThreadPoolExecutor
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+
+def estimate_tokens(text: str) -> int:
+    """Upper-bound token estimate without a tokenizer (UTF-8 bytes / 3)"""
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def embedding_batches(
+    texts: List[str],
+    max_inputs: int = settings.EMBEDDING_BATCH_MAX_INPUTS,
+    max_tokens: int = settings.EMBEDDING_BATCH_MAX_TOKENS
+) -> List[tuple]:
+    """Split texts into consecutive (start, end) ranges within the request limits"""
+    batches = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= max_inputs or tokens + cost > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
 class ChromaDBClient:
     """ChromaDB Vector Database Client for Content Management"""
 
@@ -65,15 +91,41 @@ class ChromaDBClient:
         Returns:
             Embedding vector
         """
+        return self.embed_many([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = openai.embeddings.create(
+            model=settings.EMBEDDING_MODEL,
+            input=texts
+        )
+        # 입력 순서대로 정렬 (index = 입력 위치)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for many texts with as few API requests as possible
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Embedding vectors in the order of texts
+        """
+        if not texts:
+            return []
+
+        batches = [texts[start:end] for start, end in embedding_batches(texts)]
         try:
-            response = openai.Embedding.create(
-                model=settings.EMBEDDING_MODEL,
-                input=text
-            )
-            embedding = response['data'][0]['embedding']
-            return embedding
+            if len(batches) == 1:
+                return self._embed_batch(batches[0])
+
+            # 배치 요청 동시 전송
+            with ThreadPoolExecutor(max_workers=min(settings.EMBEDDING_CONCURRENCY, len(batches))) as executor:
+                results = list(executor.map(self._embed_batch, batches))
+            return [embedding for batch in results for embedding in batch]
+
         except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
+            logger.error(f"Error generating embeddings ({len(texts)} texts): {e}")
             raise
 
     def add_creative(
@@ -274,23 +326,15 @@ class ChromaDBClient:
 
             collection = self.collections[collection_name]
 
-            ids = []
-            embeddings = []
-            metadatas = []
-            documents = []
-
-            for creative in creatives:
-                creative_id = str(creative['id'])
-                text = creative['text']
-                metadata = creative.get('metadata', {})
-
-                # 임베딩 생성
-                embedding = self._get_embedding(text)
+            ids = [str(creative['id']) for creative in creatives]
+            documents = [creative['text'] for creative in creatives]
+            metadatas = [
+                {**creative.get('metadata', {}), "text": creative['text']}
+                for creative in creatives
+            ]
 
-                ids.append(creative_id)
-                embeddings.append(embedding)
-                metadatas.append({**metadata, "text": text})
-                documents.append(text)
+            # 임베딩 일괄 생성
+            embeddings = self.embed_many(documents)
 
             # 배치 추가
             collection.add(
@@ -11,6 +11,11 @@ class Settings(BaseSettings):
     # Embedding Model
     EMBEDDING_MODEL: str = "text-embedding-ada-002"
 
+    # Embedding batching (one request carries at most 2048 inputs)
+    EMBEDDING_BATCH_MAX_INPUTS: int = 2048
+    EMBEDDING_BATCH_MAX_TOKENS: int = 250000
+    EMBEDDING_CONCURRENCY: int = 4
+
     # Collection Names (정의된 컬렉션)
     COLLECTION_COPY_TEXTS: str = "copy_texts"
     COLLECTION_IMAGES: str = "images"